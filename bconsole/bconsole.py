@@ -12,9 +12,50 @@ import random
 import time
 import os
 import re
+import threading
+import queue
+import zlib
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
+from operator import attrgetter, itemgetter
 from abc import abstractmethod
-from struct import pack, unpack
+from struct import pack, unpack, unpack_from
+try:
+    import lz4.block
+    HAS_LZ4 = True
+except ImportError:
+    HAS_LZ4 = False
+# parsers and features are imported by the commands which use them, so importing the module stays cheap
+from .forksafe import registerAfterFork
+from .scheduler import PRIORITY_INTERACTIVE, PRIORITY_RESTORE_CONTROL, PRIORITY_BULK
+
+# frame header flags (bsock.h), the rest of the header is the payload length
+BNET_COMPRESSED = 1 << 30
+BNET_OFFSET = 1 << 29
+BNET_IS_CMD = 1 << 28
+BNET_FLAGS_MASK = BNET_COMPRESSED | BNET_OFFSET | BNET_IS_CMD
+
+# signals (bsock.h): a finished command ends with BNET_EOD, a prompt of a dialog (get_cmd, get_yesno)
+# ends with one of PROMPT_SIGNALS; informational signals may come in between and are skipped
+BNET_EOD = -1
+BNET_HEARTBEAT = -6
+BNET_HB_RESPONSE = -7
+BNET_CMD_BEGIN = -16
+BNET_MSGS_PENDING = -17
+BNET_SELECT_INPUT = -19
+BNET_WARNING_MSG = -20
+BNET_ERROR_MSG = -21
+BNET_INFO_MSG = -22
+BNET_YESNO = -24
+BNET_SUB_PROMPT = -27
+BNET_TEXT_INPUT = -28
+
+PROMPT_SIGNALS = frozenset([BNET_SELECT_INPUT, BNET_YESNO, BNET_SUB_PROMPT, BNET_TEXT_INPUT])
+INFORMATIONAL_SIGNALS = frozenset([
+    BNET_HEARTBEAT, BNET_HB_RESPONSE, BNET_CMD_BEGIN, BNET_MSGS_PENDING,
+    BNET_WARNING_MSG, BNET_ERROR_MSG, BNET_INFO_MSG
+])
 
 DIR_AUTH_OK_MESSAGE = "1000 OK auth\n"
 DIR_AUTH_ERROR_MESSAGE = "1999 Authorization failed.\n"
@@ -60,59 +101,507 @@ class BSocketWallet:
         self.port = dir_port
         self.password = self.__encodePassword(dir_password)
 
+class BSocketTimeoutError(RuntimeError):
+    '''
+        Raised when the director doesn't answer within configured deadlines
+    '''
+    pass
+
+
+class BSocketClosedError(ConnectionError):
+    '''
+        Raised when the director closed the connection before the answer ended
+    '''
+    pass
+
+
+class BResolverCache:
+    '''
+        Keeps resolved director addresses for ttl seconds, so every connect doesn't pay a DNS lookup
+    '''
+    def __init__(self, ttl=300.0):
+        self.ttl = ttl
+        self.__entries = {}
+        self.__lock = threading.Lock()
+        registerAfterFork(self)
+
+    def _afterFork(self):
+        self.__lock = threading.Lock()
+
+    def resolve(self, host, port):
+        '''returns list of (family, sockaddr) pairs in the resolver order'''
+        key = (host, port)
+        now = time.monotonic()
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+        addresses = []
+        for family, _, _, _, sockaddr in socket.getaddrinfo(host, port, socket.AF_UNSPEC, socket.SOCK_STREAM):
+            if (family, sockaddr) not in addresses:
+                addresses.append((family, sockaddr))
+        with self.__lock:
+            self.__entries[key] = (now + self.ttl, addresses)
+        return addresses
+
+    def invalidate(self, host=None, port=None):
+        with self.__lock:
+            if host is None:
+                self.__entries.clear()
+            else:
+                self.__entries.pop((host, port), None)
+
+
+DEFAULT_RESOLVER_CACHE = BResolverCache()
+
+
+class BSocketConfig:
+    '''
+        Connection settings for BSocket. All timeouts are in seconds, None disables the limit.
+        connect_timeout - limit for establishing TCP connection (all addresses together)
+        read_timeout - limit for waiting of every single chunk of the director answer
+        total_timeout - limit for the whole cmd() call including connection and authentication
+        happy_eyeballs_delay - delay before the next address is tried while previous attempt is in progress
+        compression - None, "lz4" or "zlib": codec of compressed frames, None doesn't ask director to compress
+        buffer_size - initial size of the receive buffer, it grows for bigger frames
+        max_frame_size - limit for the decompressed size of a compressed frame
+        recorder - optional BSessionRecorder, authenticated sessions are written to it (see replay.py)
+        The config may be pickled (e.g. for process pools): resolver is replaced with the default
+        resolver cache of the other process and recorder isn't passed, it records own process only.
+    '''
+    def __init__(self, connect_timeout=10.0, read_timeout=300.0, total_timeout=None,
+                 happy_eyeballs_delay=0.25, tcp_nodelay=True, tcp_keepalive=True,
+                 keepalive_idle=60, keepalive_interval=15, keepalive_count=4, resolver=None,
+                 compression=None, buffer_size=65536, max_frame_size=4194304, recorder=None):
+        if resolver is None:
+            resolver = DEFAULT_RESOLVER_CACHE
+        if compression is not None and compression not in FRAME_CODECS:
+            raise ValueError("Unknown compression {}".format(compression))
+        if compression == 'lz4' and not HAS_LZ4:
+            raise ValueError("lz4 compression requires lz4 python package")
+        self.connectTimeout = connect_timeout
+        self.readTimeout = read_timeout
+        self.totalTimeout = total_timeout
+        self.happyEyeballsDelay = happy_eyeballs_delay
+        self.tcpNoDelay = tcp_nodelay
+        self.tcpKeepAlive = tcp_keepalive
+        self.keepAliveIdle = keepalive_idle
+        self.keepAliveInterval = keepalive_interval
+        self.keepAliveCount = keepalive_count
+        self.resolver = resolver
+        self.compression = compression
+        self.bufferSize = buffer_size
+        self.maxFrameSize = max_frame_size
+        self.recorder = recorder
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['resolver'] = None if self.resolver is DEFAULT_RESOLVER_CACHE else self.resolver
+        state['recorder'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.resolver is None:
+            self.resolver = DEFAULT_RESOLVER_CACHE
+
+
+# codecs decompress the frame payload into at most max_size bytes, size_hint is the expected size
+
+def _lz4Decompress(data, size_hint, max_size):
+    # bacula compresses every frame as a raw LZ4 block without size header, so the output size
+    # is guessed: it starts at the hint and doubles while the block doesn't fit
+    size = min(max(size_hint, len(data)), max_size)
+    while True:
+        try:
+            return lz4.block.decompress(data, uncompressed_size=size)
+        except lz4.block.LZ4BlockError:
+            if size >= max_size:
+                raise RuntimeError("Decompressed frame exceeds {} bytes or is corrupted".format(max_size))
+            size = min(size * 2, max_size)
+
+
+def _zlibDecompress(data, size_hint, max_size):
+    decompressor = zlib.decompressobj()
+    message = decompressor.decompress(data, max_size)
+    if decompressor.unconsumed_tail:
+        raise RuntimeError("Decompressed frame exceeds {} bytes".format(max_size))
+    return message
+
+
+FRAME_CODECS = {
+    'lz4': _lz4Decompress,
+    'zlib': _zlibDecompress
+}
+
+
+class BFrameReader:
+    '''
+        Buffered reader of director frames. Socket data is received with recv_into() into one reusable
+        buffer, so several small frames cost one system call and no per-frame allocation is done
+        except the returned payload. Frames with BNET_COMPRESSED flag are decompressed with the codec into
+        at most max_frame_size bytes; the output is sized by the biggest frame seen so far, not by the limit.
+        recv_into - function(memoryview) -> number of received bytes, 0 on EOF
+        EOF raises BSocketClosedError: the director ends every answer with a signal, never with EOF.
+    '''
+    def __init__(self, recv_into, compression=None, buffer_size=65536, max_frame_size=4194304):
+        self.recvInto = recv_into
+        self.compression = compression
+        self.decompress = FRAME_CODECS[compression] if compression is not None else None
+        self.maxFrameSize = max_frame_size
+        self.decompressSize = buffer_size
+        self.buffer = bytearray(buffer_size)
+        self.start = 0
+        self.end = 0
+        self.receivedBytes = 0
+        self.payloadBytes = 0
+        self.signal = None
+
+    def __fill(self, size):
+        '''makes sure size unread bytes are in the buffer'''
+        while self.end - self.start < size:
+            if self.start + size > len(self.buffer):
+                unread = self.end - self.start
+                if size > len(self.buffer):
+                    buffer = bytearray(max(size, len(self.buffer) * 2))
+                    buffer[:unread] = self.buffer[self.start:self.end]
+                    self.buffer = buffer
+                else:
+                    self.buffer[:unread] = self.buffer[self.start:self.end]
+                self.start, self.end = 0, unread
+            with memoryview(self.buffer) as view:
+                received = self.recvInto(view[self.end:])
+            if not received:
+                raise BSocketClosedError("Director closed the connection")
+            self.end += received
+            self.receivedBytes += received
+
+    def read(self):
+        '''returns payload of the next frame or None for signals (kept in self.signal)'''
+        self.signal = None
+        self.__fill(4)
+        header = unpack_from("!i", self.buffer, self.start)[0]
+        self.start += 4
+        if header <= 0:
+            self.signal = header
+            return None
+        size = header & ~BNET_FLAGS_MASK
+        self.__fill(size)
+        with memoryview(self.buffer) as view:
+            payload = view[self.start:self.start + size]
+            if header & BNET_COMPRESSED:
+                if self.decompress is None:
+                    raise RuntimeError("Director sent compressed frame, but compression isn't enabled")
+                message = self.decompress(payload, self.decompressSize, self.maxFrameSize)
+                if len(message) > self.decompressSize:
+                    self.decompressSize = len(message)
+            else:
+                message = bytes(payload)
+            payload.release()
+        self.start += size
+        if self.start == self.end:
+            self.start = self.end = 0
+        self.payloadBytes += len(message)
+        return message
+
+
+class BConnector:
+    '''
+        Establishes TCP connection to the director.
+        If the director name resolves to several addresses, connection attempts are raced
+        (happy eyeballs, RFC 8305): families are interleaved, the next attempt starts when
+        the previous one failed or didn't finish within happy_eyeballs_delay, first connected socket wins.
+    '''
+    def __init__(self, config):
+        self.config = config
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def __sortAddresses(self, addresses):
+        '''interleave address families, keeping the resolver preference for the first one'''
+        families = {}
+        for family, sockaddr in addresses:
+            families.setdefault(family, deque()).append((family, sockaddr))
+        result = []
+        while families:
+            for family in list(families):
+                result.append(families[family].popleft())
+                if not families[family]:
+                    del families[family]
+        return result
+
+    def __tune(self, sock):
+        if self.config.tcpNoDelay:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.config.tcpKeepAlive:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            for option, value in (('TCP_KEEPIDLE', self.config.keepAliveIdle),
+                                  ('TCP_KEEPINTVL', self.config.keepAliveInterval),
+                                  ('TCP_KEEPCNT', self.config.keepAliveCount)):
+                if value is not None and hasattr(socket, option):
+                    sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+    def __open(self, address, timeout):
+        family, sockaddr = address
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(timeout)
+            sock.connect(sockaddr)
+            self.__tune(sock)
+        except BaseException:
+            sock.close()
+            raise
+        return sock
+
+    def __race(self, addresses, deadline):
+        results = queue.Queue()
+        lock = threading.Lock()
+        state = {'finished': False}
+
+        def attempt(address):
+            try:
+                sock = self.__open(address, _timeLeft(deadline))
+            except OSError as e:
+                results.put((None, address, e))
+                return
+            with lock:
+                if state['finished']:
+                    sock.close()
+                else:
+                    results.put((sock, address, None))
+
+        pending = 0
+        errors = []
+        winner = None
+        addresses = deque(addresses)
+        try:
+            while winner is None and (addresses or pending):
+                wait = _timeLeft(deadline)
+                if addresses:
+                    threading.Thread(target=attempt, args=(addresses.popleft(),), daemon=True).start()
+                    pending += 1
+                    if addresses:
+                        wait = self.config.happyEyeballsDelay if wait is None else min(wait, self.config.happyEyeballsDelay)
+                try:
+                    sock, address, error = results.get(timeout=wait)
+                except queue.Empty:
+                    if addresses or not _isExpired(deadline):
+                        continue
+                    raise socket.timeout("timed out")
+                pending -= 1
+                if sock is None:
+                    self.logger.debug("connection to {} failed: {}".format(address, error))
+                    errors.append(error)
+                else:
+                    winner = sock
+        finally:
+            with lock:
+                state['finished'] = True
+            while True:
+                try:
+                    sock = results.get_nowait()[0]
+                except queue.Empty:
+                    break
+                if sock is not None:
+                    sock.close()
+        if winner is None:
+            raise errors[-1]
+        return winner
+
+    def connect(self, host, port, deadline=None):
+        '''returns connected and tuned socket; deadline is time.monotonic() based'''
+        if self.config.connectTimeout is not None:
+            connect_deadline = time.monotonic() + self.config.connectTimeout
+            deadline = connect_deadline if deadline is None else min(deadline, connect_deadline)
+        addresses = self.__sortAddresses(self.config.resolver.resolve(host, port))
+        try:
+            if len(addresses) == 1:
+                return self.__open(addresses[0], _timeLeft(deadline))
+            return self.__race(addresses, deadline)
+        except OSError:
+            self.config.resolver.invalidate(host, port)
+            raise
+
+
+def _timeLeft(deadline):
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0.0)
+
+
+def _isExpired(deadline):
+    return deadline is not None and time.monotonic() >= deadline
+
+
 class BSocket:
     DIR_HELLO_MESSAGE = "Hello {} calling\n"
+    # console protocol version is announced only when compressed frames are wanted
+    DIR_HELLO_VERSION_MESSAGE = "Hello {} calling {}\n"
+    UA_VERSION = 1
     DEFAULT_USER_AGENT = "*UserAgent*"
 
     '''
-        Class provides bacula director socket interface (with implicit authentification)
+        Class provides bacula director socket interface (with implicit authentification).
+        The session is meant to be used by one thread at a time (see BSessionPool); lock serializes
+        whole request/answer exchanges if it is shared anyway. A connection inherited through os.fork()
+        is dropped in the child without goodbye and the child connects its own session.
+        answerSignal is the signal which ended the last answer, isAtPrompt() tells whether the director
+        waits for the answer to a prompt of a dialog.
+        Connection errors drop the connection, the next command reconnects. isIdle is set by the pool
+        for sessions which waited there: the director may have closed the connection meanwhile,
+        so the first command is retried once on a new connection if the old one turns out to be closed
     '''
 
-    def __init__(self, wallet, user_agent=None):
+    def __init__(self, wallet, user_agent=None, config=None):
         if user_agent is None:
             user_agent = self.DEFAULT_USER_AGENT
+        if config is None:
+            config = BSocketConfig()
         self.wallet = wallet
+        self.config = config
         self.isSSLRequired = False
         self.isAuthenticated = False
         self.socket = None
+        self.reader = None
         self.userAgent = user_agent
+        self.deadline = None
+        self.recordSession = None
+        self.isIdle = False
+        self.answerSignal = None
+        self.lock = threading.RLock()
+        self.__pid = None
+        self.__timeout = None
         self.logger = logging.getLogger(self.__class__.__name__)
+        registerAfterFork(self)
+
+    def _afterFork(self):
+        self.lock = threading.RLock()
+        self.__reset()
 
     def __enter__(self):
         return self
 
     def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+    def close(self):
+        '''says goodbye to the director (if possible) and closes connection'''
+        with self.lock:
+            self.__checkPid()
+            if self.socket != None:
+                try:
+                    if self.isAuthenticated:
+                        self.__send("quit")
+                except OSError as e:
+                    self.logger.debug("quit failed: {}".format(e))
+                finally:
+                    self.__reset()
+
+    def abort(self):
+        '''drops connection without goodbye, e.g. in the middle of a dialog'''
+        with self.lock:
+            self.__reset()
+
+    def __checkPid(self):
+        '''drops connection inherited from the parent process, the session belongs to the parent'''
+        if self.socket is not None and self.__pid != os.getpid():
+            self.logger.debug("connection was inherited through fork, reconnecting")
+            self.__reset()
+
+    def __reset(self):
+        '''drops connection without goodbye, protocol state is unknown after errors'''
         if self.socket != None:
-            if self.isAuthenticated:
-                self.__send("quit")
             self.socket.close()
+        self.socket = None
+        self.reader = None
+        self.isAuthenticated = False
 
     def __getSocket(self):
         if self.socket == None:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.connect((self.wallet.host, self.wallet.port))
+            try:
+                self.socket = BConnector(self.config).connect(self.wallet.host, self.wallet.port, self.deadline)
+            except socket.timeout:
+                raise BSocketTimeoutError("Connection to the director {}:{} timed out".format(self.wallet.host, self.wallet.port))
+            self.__attach(self.socket)
         return self.socket
 
+    def __attach(self, sock):
+        self.socket = sock
+        self.__pid = os.getpid()
+        self.__timeout = sock.gettimeout()
+        self.reader = BFrameReader(self.__recvInto, self.config.compression, self.config.bufferSize, self.config.maxFrameSize)
+        if self.config.recorder is not None:
+            self.recordSession = self.config.recorder.newSession()
+
+    def attach(self, sock, authenticated=False):
+        '''uses already connected socket-like transport (e.g. replay.BReplaySocket) instead of connecting'''
+        with self.lock:
+            self.__reset()
+            self.__attach(sock)
+            self.isAuthenticated = authenticated
+
+    def __setTimeout(self, sock):
+        timeout = self.config.readTimeout
+        if self.deadline is not None:
+            left = _timeLeft(self.deadline)
+            if left <= 0:
+                self.__reset()
+                raise BSocketTimeoutError("Director command deadline exceeded")
+            timeout = left if timeout is None else min(timeout, left)
+        if timeout != self.__timeout:
+            sock.settimeout(timeout)
+            self.__timeout = timeout
+
+    def __recvInto(self, view):
+        sock = self.socket
+        self.__setTimeout(sock)
+        try:
+            return sock.recv_into(view)
+        except socket.timeout:
+            self.__reset()
+            raise BSocketTimeoutError("Director didn't answer in time")
+
     def __send(self, message):
         '''use socket to send request to director '''
         if isinstance(message, str): message = message.encode('utf8')
-        socket = self.__getSocket()
-        socket.send(pack("!i", len(message)) + message) # convert to network flow
+        sock = self.__getSocket()
+        self.__setTimeout(sock)
+        try:
+            sock.send(pack("!i", len(message)) + message) # convert to network flow
+        except socket.timeout:
+            self.__reset()
+            raise BSocketTimeoutError("Director didn't accept data in time")
+        except OSError:
+            self.__reset()
+            raise
+        if self.isAuthenticated and self.config.recorder is not None:
+            from .replay import DIRECTION_SEND
+            self.__record(DIRECTION_SEND, message)
         self.logger.debug("send message {}".format(message))
 
     def __receive(self): # throws RuntimeError
         '''will receive data from director '''
-        socket = self.__getSocket()
-        message = socket.recv(4) # first get the message length
-        if len(message) < 4:
-            return None # TODO: decide how to process this case
-        nbyte = unpack("!i", message)[0]
-        if nbyte <= 0:
-            return None
-        message = socket.recv(nbyte)
-        self.logger.debug("received message ({}/{}): {}".format(nbyte, len(message), message))
+        self.__getSocket()
+        try:
+            message = self.reader.read()
+        except OSError:
+            self.__reset()
+            raise
+        if self.isAuthenticated and self.config.recorder is not None:
+            from .replay import DIRECTION_RECEIVE, DIRECTION_SIGNAL
+            if message is not None:
+                self.__record(DIRECTION_RECEIVE, message)
+            else:
+                self.__record(DIRECTION_SIGNAL, signal=self.reader.signal)
+        self.logger.debug("received message: {}".format(message))
         return message
 
+    def __record(self, direction, payload=None, signal=None):
+        '''failed recording is logged, the director command goes on'''
+        try:
+            self.config.recorder.record(self.recordSession, direction, payload, signal=signal)
+        except Exception as e:
+            self.logger.warning("session recording failed: {}".format(e))
+
     def __getHMACDiggest(self, key, message):
         if isinstance(key, str): key = key.encode('utf8')
         if isinstance(message, str): message = message.encode('utf8')
@@ -129,7 +618,10 @@ class BSocket:
         socket = self.__getSocket()
 
         # authenticate on the directory
-        self.__send(self.DIR_HELLO_MESSAGE.format(self.userAgent))
+        if self.config.compression is not None:
+            self.__send(self.DIR_HELLO_VERSION_MESSAGE.format(self.userAgent, self.UA_VERSION))
+        else:
+            self.__send(self.DIR_HELLO_MESSAGE.format(self.userAgent))
         resp = self.__receive()
         (cmd, auth_type, server_challenge_string, require_ssl) = resp.split(b' ')[:4]
         if require_ssl == b'ssl=1':
@@ -156,55 +648,252 @@ class BSocket:
             raise RuntimeError("Authorization error: check your password")
 
     def send(self, message):
-        if not self.isAuthenticated:
-            self.__authenticate()
-        self.__send(message)
-
-    def receive(self, rstrip=None):
-        if not self.isAuthenticated:
-            self.__authenticate()
-        msg = self.__receive()
-        if msg == None:
+        with self.lock:
+            self.__checkPid()
+            if not self.isAuthenticated:
+                self.__authenticate()
+            self.__send(message)
+
+    def receive(self, rstrip=None, decode=True):
+        with self.lock:
+            self.__checkPid()
+            if not self.isAuthenticated:
+                self.__authenticate()
+            msg = self.__receive()
+        if msg == None or not decode:
             return msg
         if rstrip != None:
             return msg.decode('utf8').rstrip(rstrip)
         return msg.decode('utf8')
 
+    def iterCmd(self, cmd, decode=True):
+        '''
+            Sends command and yields director answer chunk by chunk as it arrives (bytes if decode=False),
+            the answer ends with BNET_EOD or with a prompt signal, informational signals are skipped.
+            The generator has to be exhausted, otherwise the rest of the answer stays in the socket.
+            The session lock is taken for every send and receive only, never between chunks (the generator
+            may be finalized in another thread), so don't share the session while the generator is alive;
+            cmd() holds the lock for the whole answer
+        '''
+        if self.config.totalTimeout is not None:
+            self.deadline = time.monotonic() + self.config.totalTimeout
+        retry, self.isIdle = self.isIdle, False
+        self.answerSignal = None
+        try:
+            try:
+                self.send(cmd)
+                msg = self.receive(decode=decode)
+            except ConnectionError as e:
+                if not retry:
+                    raise
+                self.logger.debug("idle connection was closed ({}), reconnecting".format(e))
+                self.send(cmd)
+                msg = self.receive(decode=decode)
+            while msg != None or self.reader.signal in INFORMATIONAL_SIGNALS:
+                if msg != None:
+                    yield msg
+                msg = self.receive(decode=decode)
+            self.answerSignal = self.reader.signal
+        finally:
+            self.deadline = None
+
+    def isAtPrompt(self):
+        return self.answerSignal in PROMPT_SIGNALS
+
     def cmd(self, cmd):
-        self.send(cmd)
-        result = []
-        msg = self.receive()
-        while msg != None:
-            result.append(msg)
-            msg = self.receive()
-        return "".join(result)
+        with self.lock:
+            return "".join(self.iterCmd(cmd))
+
+
+class BSessionPool:
+    '''
+        Keeps authenticated director sessions for reuse between commands.
+        Idle sessions are kept alive by TCP keepalive and dropped after max_idle_time seconds.
+        Every checkout gets a session nobody else uses, so threads never share a connection.
+        If scheduler (BCommandScheduler) is set, session() waits for admission first and the session
+        counts against max_concurrency until the block ends, also for long-held sessions
+    '''
+    def __init__(self, wallet, user_agent=None, config=None, max_size=4, max_idle_time=60.0, scheduler=None):
+        self.wallet = wallet
+        self.userAgent = user_agent
+        self.config = config
+        self.scheduler = scheduler
+        self.maxSize = max_size
+        self.maxIdleTime = max_idle_time
+        self.__idle = deque()
+        self.__lock = threading.Lock()
+        self.logger = logging.getLogger(self.__class__.__name__)
+        registerAfterFork(self)
+
+    def _afterFork(self):
+        # idle sessions are connections of the parent process
+        self.__lock = threading.Lock()
+        self.__idle = deque()
+
+    def acquire(self):
+        '''returns session without admission of the scheduler, use session() unless you count it yourself'''
+        expired = []
+        session = None
+        now = time.monotonic()
+        with self.__lock:
+            while self.__idle:
+                candidate, released_at = self.__idle.pop()
+                if self.maxIdleTime is not None and now - released_at > self.maxIdleTime:
+                    expired.append(candidate)
+                else:
+                    session = candidate
+                    break
+        for candidate in expired:
+            candidate.close()
+        if session is None:
+            session = BSocket(self.wallet, user_agent=self.userAgent, config=self.config)
+        return session
+
+    def release(self, session, discard=False):
+        if not discard and session.isAuthenticated:
+            with self.__lock:
+                if len(self.__idle) < self.maxSize:
+                    session.isIdle = True
+                    self.__idle.append((session, time.monotonic()))
+                    return
+        if discard:
+            # "quit" could be taken as an answer to a prompt
+            session.abort()
+        else:
+            session.close()
+
+    @contextmanager
+    def session(self, priority=PRIORITY_INTERACTIVE, timeout=None):
+        '''checkout session; it is dropped if the command failed because dialog state is unknown'''
+        if self.scheduler is not None:
+            with self.scheduler.admit(priority, timeout):
+                with self.__checkout() as session:
+                    yield session
+        else:
+            with self.__checkout() as session:
+                yield session
+
+    @contextmanager
+    def __checkout(self):
+        session = self.acquire()
+        try:
+            yield session
+        except BaseException:
+            self.release(session, discard=True)
+            raise
+        self.release(session)
+
+    def close(self):
+        with self.__lock:
+            idle = list(self.__idle)
+            self.__idle.clear()
+        for session, _ in idle:
+            session.close()
+
+# verbs which don't change director state, identical concurrent commands with these verbs may share one answer
+READ_ONLY_VERBS = frozenset([
+    'version', 'status', 'list', 'llist', 'show', 'time',
+    '.jobs', '.clients', '.pools', '.storage', '.filesets', '.msgs', '.status'
+])
+
+
+def normalizeCommand(cmd):
+    '''collapses whitespace and lowercases the verb: "List  jobid=5 " -> "list jobid=5"'''
+    parts = cmd.split()
+    if not parts:
+        return ''
+    parts[0] = parts[0].lower()
+    return ' '.join(parts)
+
+
+class BSingleFlight:
+    '''
+        Coalesces identical concurrent read-only commands: the first caller runs the command,
+        callers arriving while it is in flight wait and get the same (shared, don't modify it) result
+    '''
+    class Call:
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self, verbs=READ_ONLY_VERBS):
+        self.verbs = frozenset(verbs)
+        self.coalesced = 0
+        self.__calls = {}
+        self.__lock = threading.Lock()
+        registerAfterFork(self)
+
+    def _afterFork(self):
+        self.__lock = threading.Lock()
+        self.__calls = {}
+
+    def isReadOnly(self, cmd):
+        parts = cmd.split(None, 1)
+        return bool(parts) and parts[0].lower() in self.verbs
+
+    def do(self, key, function):
+        with self.__lock:
+            call = self.__calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.__calls[key] = self.Call()
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = function()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.__lock:
+                del self.__calls[key]
+            call.event.set()
+        return call.result
+
 
 class BConsoleCommand:
     '''
         Base abstract class for all command classes
     '''
     RE_OPTION = re.compile('^\s*(\d+)\s*:\s*(.+)$')
+    PRIORITY = PRIORITY_INTERACTIVE
 
-    def __init__(self, wallet, user_agent):
+    def __init__(self, wallet, user_agent, pool=None):
         self.wallet = wallet
         self.userAgent = user_agent
+        self.pool = pool
         self.logger = logging.getLogger(self.__class__.__name__)
 
-    def _parseTable(self, table_text):
-        head = []
+    def _session(self):
+        '''returns context manager with director session: pooled one if pool is set or a new one'''
+        if self.pool is not None:
+            return self.pool.session(priority=self.PRIORITY)
+        return BSocket(self.wallet, user_agent=self.userAgent)
+
+    def _parseTable(self, table_text, converters=None):
+        '''returns rows of all tables in the text as dicts'''
+        from .table import BTableParser
         data = []
-        in_table = False
-        for line in table_text.splitlines():
-            if line.startswith('+--') and in_table:
-                in_tables = True
-            elif line.startswith('|'):
-                row_data = [v.rstrip().lstrip() for v in line.split('|') if v != '']
-                if not head: # first line in the table is always header
-                    head = row_data
-                else:
-                    data.append(dict(zip(head, row_data)))
+        for table in BTableParser(converters).parse(table_text):
+            data.extend(table.records())
         return data
 
+    def getCommandText(self):
+        '''text of the single command sent by run() or None for dialogs; used as single-flight key'''
+        return None
+
+    def _parseStream(self, dir, cmd, parser):
+        '''feeds the parser with director answer while it is being received'''
+        for chunk in dir.iterCmd(cmd):
+            parser.feed(chunk)
+        return parser.close()
+
     def _parseMenuOptions(self, options_text):
         options = {}
         for line in options_text.splitlines():
@@ -224,10 +913,13 @@ class BConsoleCommand:
 class BConsoleCommandVersion(BConsoleCommand):
     RE_VERSION = re.compile('^.*?Version: (.+?) ')
 
+    def getCommandText(self):
+        return "version"
+
     def run(self):
         msg = None
-        with BSocket(self.wallet, user_agent=self.userAgent) as dir:
-            msg = dir.cmd("version")
+        with self._session() as dir:
+            msg = dir.cmd(self.getCommandText())
         mres = self.RE_VERSION.match(msg)
         version = None
         if mres is not None:
@@ -235,53 +927,352 @@ class BConsoleCommandVersion(BConsoleCommand):
         return version
 
 
-class BConsoleCommandClientStatus(BConsoleCommand):
-    MSG_CLIENT_CONNECTION_ERROR = "Failed to connect to Client"
-    MSG_CLIENT_CONNECTION_OK = "Daemon started"
+class BConsoleCommandDaemonStatus(BConsoleCommand):
+    '''
+        Returns parsed status of the bacula daemon (ClientStatus, StorageStatus or DirectorStatus)
+    '''
+    # parser class names in status module
+    PARSERS = {
+        'client': 'ClientStatusParser',
+        'storage': 'StorageStatusParser',
+        'dir': 'DirectorStatusParser'
+    }
+
+    def __init__(self, wallet, daemon, name, user_agent, pool=None):
+        super().__init__(wallet, user_agent, pool=pool)
+        self.daemon = daemon
+        self.name = name
+
+    def getCommandText(self):
+        cmd = "status {}".format(self.daemon)
+        if self.name is not None:
+            cmd = "{}={}".format(cmd, self.name)
+        return cmd
+
+    def run(self):
+        with self._session() as dir:
+            from . import status
+            return self._parseStream(dir, self.getCommandText(), getattr(status, self.PARSERS[self.daemon])())
+
 
-    def __init__(self, wallet, client_name, user_agent):
-        super().__init__(wallet, user_agent)
+class BConsoleCommandClientStatus(BConsoleCommandDaemonStatus):
+    def __init__(self, wallet, client_name, user_agent, pool=None):
+        super().__init__(wallet, 'client', client_name, user_agent, pool=pool)
         self.clientName = client_name
 
     def run(self):
-       msg = None
-       with BSocket(self.wallet, user_agent=self.userAgent) as dir:
-           msg = dir.cmd("status client={}".format(self.clientName))
-       if self.MSG_CLIENT_CONNECTION_OK in msg:
-           return {'result': True}
-       else:
-           return {'result': False}
+        return {'result': super().run().isRunning()}
 
 
 class BConsoleCommandJobStatus(BConsoleCommand):
-    def __init__(self, wallet, job_id, user_agent):
-        super().__init__(wallet, user_agent)
+    def __init__(self, wallet, job_id, user_agent, pool=None):
+        super().__init__(wallet, user_agent, pool=pool)
         self.jobId = job_id
 
+    def getCommandText(self):
+        return "list jobid={}".format(self.jobId)
+
     def run(self):
-        res = None
-        with BSocket(self.wallet, user_agent=self.userAgent) as dir:
-            res = self._parseTable(dir.cmd("list jobid={}".format(self.jobId)))
+        from .table import BTableParser
+        res = []
+        with self._session() as dir:
+            for table in self._parseStream(dir, self.getCommandText(), BTableParser()):
+                res.extend(table.records())
         return res
 
 
+class BConsoleCommandJobList(BConsoleCommand):
+    '''
+        "list jobs" with optional client, status and limit filters, returns list of BTable with
+        converted job columns (rows are tuples, JobStatus.fromTable makes jobs of them)
+    '''
+    PRIORITY = PRIORITY_BULK
+
+    def __init__(self, wallet, user_agent, client=None, status=None, limit=None, pool=None):
+        super().__init__(wallet, user_agent, pool=pool)
+        self.client = client
+        self.status = status
+        self.limit = limit
+
+    def getCommandText(self):
+        cmd = "list jobs"
+        for keyword, value in (('client', self.client), ('jobstatus', self.status), ('limit', self.limit)):
+            if value is not None:
+                cmd = "{} {}={}".format(cmd, keyword, value)
+        return cmd
+
+    def run(self):
+        from .table import BTableParser, JOB_COLUMN_CONVERTERS
+        with self._session() as dir:
+            return self._parseStream(dir, self.getCommandText(), BTableParser(JOB_COLUMN_CONVERTERS))
+
+
+class BConsoleCommandSQL(BConsoleCommand):
+    '''
+        Runs catalog query with ".sql" dot command, returns rows as lists of strings (NULL -> None).
+        The director prints every row without header, every value is followed by a tab.
+        Rows of other width than columns raise RuntimeError
+    '''
+    PRIORITY = PRIORITY_BULK
+    NULL_VALUE = '*None*'
+
+    def __init__(self, wallet, query, user_agent, columns=None, pool=None):
+        super().__init__(wallet, user_agent, pool=pool)
+        self.query = query
+        self.columns = columns
+
+    def getCommandText(self):
+        return '.sql query="{}"'.format(self.query.replace('"', '\\"'))
+
+    def run(self):
+        rows = []
+        tail = ''
+        with self._session() as dir:
+            for chunk in dir.iterCmd(self.getCommandText()):
+                lines = (tail + chunk).split('\n')
+                tail = lines.pop()
+                self.__parseLines(lines, rows)
+        self.__parseLines([tail], rows)
+        return rows
+
+    def __parseLines(self, lines, rows):
+        for line in lines:
+            if '\t' not in line:
+                continue # director messages like "Using Catalog ..."
+            if line.endswith('\t'):
+                line = line[:-1]
+            row = [None if v == self.NULL_VALUE else v for v in line.split('\t')]
+            if self.columns is not None and len(row) != self.columns:
+                raise RuntimeError("Expected {} columns, director sent {}: {!r}".format(self.columns, len(row), line))
+            rows.append(row)
+
+
+class BConsoleCommandStream(BConsoleCommand):
+    '''
+        Runs command and yields raw (bytes) answer chunks as they arrive, nothing is buffered
+    '''
+    PRIORITY = PRIORITY_BULK
+
+    def __init__(self, wallet, cmd, user_agent, pool=None):
+        super().__init__(wallet, user_agent, pool=pool)
+        self.cmd = cmd
+
+    def getCommandText(self):
+        return self.cmd
+
+    def run(self):
+        with self._session() as dir:
+            for chunk in dir.iterCmd(self.cmd, decode=False):
+                yield chunk
+
+
+class BConsoleCommandEstimate(BConsoleCommand):
+    '''
+        Runs estimate and aggregates the listing while it is received
+    '''
+    PRIORITY = PRIORITY_BULK
+
+    def __init__(self, wallet, job, user_agent, client=None, level=None, fileset=None, listing=True, top=10, depth=3, pool=None):
+        super().__init__(wallet, user_agent, pool=pool)
+        self.job = job
+        self.client = client
+        self.level = level
+        self.fileset = fileset
+        self.listing = listing
+        self.top = top
+        self.depth = depth
+
+    def getCommandText(self):
+        cmd = "estimate job={}".format(self.job)
+        for keyword, value in (('client', self.client), ('level', self.level), ('fileset', self.fileset)):
+            if value is not None:
+                cmd = "{} {}={}".format(cmd, keyword, value)
+        if self.listing:
+            cmd = "{} listing".format(cmd)
+        return cmd
+
+    def run(self):
+        from .estimate import EstimateParser
+        parser = EstimateParser(top=self.top, depth=self.depth)
+        with self._session() as dir:
+            for chunk in dir.iterCmd(self.getCommandText(), decode=False):
+                parser.feed(chunk)
+        return parser.close()
+
+
+class BConsoleCommandVolumeList(BConsoleCommand):
+    '''
+        Parses "list volumes" into columnar VolumeInventory while the answer is received
+    '''
+    PRIORITY = PRIORITY_BULK
+
+    def __init__(self, wallet, user_agent, pool_name=None, pool=None):
+        super().__init__(wallet, user_agent, pool=pool)
+        self.poolName = pool_name
+
+    def getCommandText(self):
+        if self.poolName is not None:
+            return "list volumes pool={}".format(self.poolName)
+        return "list volumes"
+
+    def run(self):
+        from .volumes import VolumeListParser
+        with self._session() as dir:
+            return self._parseStream(dir, self.getCommandText(), VolumeListParser(self.poolName))
+
+
+class BConsoleCommandVolumeOperation(BConsoleCommand):
+    '''
+        Runs autochanger dialog ("update slots", "label barcodes") and yields VolumeEvent for every slot
+        or volume line as it arrives. Confirmations are answered with "yes", the pool menu with the number
+        of pool_name; any other prompt raises RuntimeError (the session is dropped, not reused).
+        The generator has to be exhausted, the dialog occupies the session until it ends
+    '''
+    PRIORITY = PRIORITY_BULK
+    MAX_PROMPTS = 3
+    PROMPT_TAIL = 4096
+    RE_CONFIRM = re.compile(r'\((yes\|no|yes/no)\):\s*$')
+    RE_POOL_MENU = re.compile(r'Select the Pool \(\d+-\d+\):\s*$')
+    RE_PROMPT = re.compile(r'([^\n]*:)\s*$')
+
+    def __init__(self, wallet, cmd, user_agent, pool_name=None, pool=None):
+        super().__init__(wallet, user_agent, pool=pool)
+        self.cmd = cmd
+        self.poolName = pool_name
+
+    def getCommandText(self):
+        return self.cmd
+
+    def __answer(self, dir, text):
+        '''returns answer to the prompt the text ends with or None if the command finished'''
+        if self.RE_CONFIRM.search(text) is not None:
+            return "yes"
+        if self.RE_POOL_MENU.search(text) is not None:
+            options = self._parseMenuOptions(text)
+            if self.poolName not in options:
+                raise RuntimeError("Pool {} isn't offered by the director: {}".format(self.poolName, ', '.join(options)))
+            return options[self.poolName]
+        if dir.isAtPrompt() or (not text.endswith('\n') and self.RE_PROMPT.search(text) is not None):
+            raise RuntimeError("Unexpected prompt: {}".format(text.rstrip().rsplit('\n', 1)[-1]))
+        return None
+
+    def run(self):
+        from .volumes import VolumeEvent, VolumeProgressParser
+        parser = VolumeProgressParser()
+        with self._session() as dir:
+            cmd = self.cmd
+            for _ in range(self.MAX_PROMPTS + 1):
+                tail = ''
+                for chunk in dir.iterCmd(cmd):
+                    for event in parser.feed(chunk):
+                        yield event
+                    tail = (tail + chunk)[-self.PROMPT_TAIL:]
+                cmd = self.__answer(dir, tail)
+                if cmd is None:
+                    break
+                prompt = tail.rstrip().rsplit('\n', 1)[-1]
+                yield VolumeEvent('prompt', message=prompt, answer=cmd)
+            else:
+                raise RuntimeError("Too many prompts in {} dialog".format(self.cmd.split()[0]))
+        for event in parser.close():
+            yield event
+
+
+class JobControlResult:
+    def __init__(self, job_id, action, success, message, new_job_id=None):
+        self.id = job_id
+        self.action = action
+        self.success = success
+        self.message = message
+        self.newJobId = new_job_id
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'action': self.action,
+            'success': self.success,
+            'message': self.message,
+            'new_jobid': self.newJobId
+        }
+
+    def __str__(self):
+        return "id={}, action={}, success={}".format(self.id, self.action, self.success)
+
+
+class BConsoleCommandJobControl(BConsoleCommand):
+    '''
+        Sends cancel/stop/restart/rerun for every job back-to-back on one session,
+        answers confirmation prompts with "yes" and returns JobControlResult per job
+    '''
+    PRIORITY = PRIORITY_RESTORE_CONTROL
+    MAX_PROMPTS = 3
+    RE_PROMPT = re.compile(r'\((yes/mod/no|yes/no)\):\s*$')
+    RE_QUEUED = re.compile(r'Job queued\.\s+JobId=(\d+)')
+    RE_SUCCESS = {
+        'cancel': re.compile(r'marked to be cancell?ed|JobId=\d+ .*cancell?ed'),
+        'stop': re.compile(r'marked to be stopped|JobId=\d+ .*stopped'),
+        'restart': RE_QUEUED,
+        'rerun': RE_QUEUED
+    }
+
+    def __init__(self, wallet, action, job_ids, user_agent, pool=None):
+        if action not in self.RE_SUCCESS:
+            raise ValueError("Unknown job control action {}".format(action))
+        super().__init__(wallet, user_agent, pool=pool)
+        self.action = action
+        self.jobIds = list(job_ids)
+
+    def __control(self, dir, job_id):
+        output = []
+        answer = dir.cmd("{} jobid={}".format(self.action, job_id))
+        output.append(answer)
+        for _ in range(self.MAX_PROMPTS):
+            if self.RE_PROMPT.search(answer) is None:
+                break
+            answer = dir.cmd("yes")
+            output.append(answer)
+        else:
+            if self.RE_PROMPT.search(answer) is not None:
+                # don't leave the director in the middle of dialog
+                dir.cmd("no")
+        message = "".join(output).strip()
+        mres = self.RE_QUEUED.search(message)
+        new_job_id = int(mres.group(1)) if mres is not None else None
+        success = self.RE_SUCCESS[self.action].search(message) is not None
+        return JobControlResult(job_id, self.action, success, message, new_job_id)
+
+    def run(self):
+        results = []
+        try:
+            with self._session() as dir:
+                for job_id in self.jobIds:
+                    results.append(self.__control(dir, job_id))
+        except (OSError, RuntimeError) as e:
+            # the session is gone, the rest of jobs weren't processed
+            self.logger.warning("{} failed: {}".format(self.action, e))
+            for job_id in self.jobIds[len(results):]:
+                results.append(JobControlResult(job_id, self.action, False, "Not processed: {}".format(e)))
+        return results
+
+
 class BConsoleCommandRestore(BConsoleCommand):
     '''
         Class implements bacula restore command
     '''
     RE_JOBID = re.compile('.*Job queued.\s+JobId=(\d+).*')
+    PRIORITY = PRIORITY_RESTORE_CONTROL
 
-    def __init__(self, wallet, restore_from_client, restore_to_client, restore_where, files_to_restore, user_agent, exclude_from_restore=[], date=None, fileset=None):
-        super().__init__(wallet, user_agent)
+    def __init__(self, wallet, restore_from_client, restore_to_client, restore_where, files_to_restore, user_agent, exclude_from_restore=None, date=None, fileset=None, pool=None):
+        super().__init__(wallet, user_agent, pool=pool)
         self.restoreFromClient = restore_from_client
         self.restoreToClient = restore_to_client
         self.restoreWhere = restore_where
-        self.filesToRestore = files_to_restore
-        self.excludeFromRestore = exclude_from_restore
+        self.filesToRestore = list(files_to_restore or [])
+        self.excludeFromRestore = list(exclude_from_restore or [])
         self.restoreDate = date
         self.fileset = fileset
 
-    def __selectFiles(self, dir, filelist = [], action="mark"):
+    def __selectFiles(self, dir, filelist=(), action="mark"):
         '''
             Mark or unmark files. If filelist is empty and action=mark - mark all files
         '''
@@ -298,7 +1289,7 @@ class BConsoleCommandRestore(BConsoleCommand):
 
     def run(self):
         jobid = None
-        with BSocket(self.wallet, user_agent=self.userAgent) as dir:
+        with self._session() as dir:
             console_output = None
 
             option = self._parseMenuOptions(
@@ -329,21 +1320,23 @@ class BConsoleCommandRestore(BConsoleCommand):
             if 'OK to run? (yes/mod/no):' in console_output:
                 console_output = dir.cmd("yes")
             if not 'Job queued.' in console_output:
-
-                with open('/tmp/xxx.log', 'a') as f:
-                    print(console_output, file=f)
-
+                self.logger.error("restore wasn't queued, director answer: {}".format(console_output))
                 raise Exception("Can't start restore procedure. Something went wrong")
             jobid = self.RE_JOBID.match(console_output).group(1)
         return jobid
 
 
 class BConsoleCommandBackup(BConsoleCommand):
+    PRIORITY = PRIORITY_RESTORE_CONTROL
+
     def run(self):
         pass
 
 
 class JobStatus:
+    # job columns in the order of the attributes set by fromTable
+    COLUMNS = ('jobid', 'starttime', 'jobstatus', 'jobfiles', 'jobbytes', 'type', 'level')
+
     def __init__(self, job_data):
         self.id = job_data['jobid']
         self.starttime = job_data['starttime']
@@ -353,6 +1346,17 @@ class JobStatus:
         self.type = job_data['type']
         self.level = job_data['level']
 
+    @classmethod
+    def fromTable(cls, table):
+        '''returns JobStatus for every row of BTable with converted job columns, no dict per row is built'''
+        getter = itemgetter(*[table.columns.index(name) for name in cls.COLUMNS])
+        jobs = []
+        for row in table.rows:
+            job = cls.__new__(cls)
+            job.id, job.starttime, job.status, job.files, job.bytes, job.type, job.level = getter(row)
+            jobs.append(job)
+        return jobs
+
     def isFinished(self):
         if self.status == 'T' or self.status == 'E':
             return True
@@ -392,23 +1396,94 @@ class JobStatus:
 
 
 class BConsole:
-    def __init__(self, dir_addr, dir_port, dir_password, user_agent):
-        self.wallet = BSocketWallet(dir_password, dir_addr, dir_port)
+    '''
+        Director console, one instance may be shared by threads: every command checks out its own
+        session from the pool (use session() for own dialogs) and the rest of the state is locked.
+        After os.fork() the child drops inherited connections and locks, its commands open new sessions.
+        For process pools see fanout.fanOut().
+        wallet - BSocketWallet to use instead of dir_addr, dir_port and dir_password
+    '''
+    def __init__(self, dir_addr, dir_port, dir_password, user_agent, config=None, pool_size=4, scheduler=None, coalesce=True, wallet=None):
+        self.wallet = wallet if wallet is not None else BSocketWallet(dir_password, dir_addr, dir_port)
         self.userAgent = user_agent
+        self.config = config
+        self.scheduler = scheduler
+        self.singleFlight = BSingleFlight() if coalesce else None
+        self.pool = BSessionPool(self.wallet, user_agent=user_agent, config=config, max_size=pool_size, scheduler=scheduler)
+        self.catalog = None
+        self.__lock = threading.Lock()
         self.logger = logging.getLogger(self.__class__.__name__)
+        registerAfterFork(self)
+
+    def _afterFork(self):
+        self.__lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+    def close(self):
+        '''closes all idle director sessions and the catalog mirror'''
+        self.pool.close()
+        with self.__lock:
+            catalog, self.catalog = self.catalog, None
+        if catalog is not None:
+            catalog.close()
+
+    def session(self, priority=PRIORITY_INTERACTIVE, timeout=None):
+        '''context manager with a director session owned by the calling thread until the block ends'''
+        return self.pool.session(priority=priority, timeout=timeout)
+
+    def useCatalogMirror(self, path=':memory:', max_staleness=60.0):
+        '''
+            Job reads (getJobStatus, getJobs) will be answered from local SQLite mirror of the job catalog,
+            the mirror is synced incrementally when it is older than max_staleness seconds
+        '''
+        from .catalog import BJobCatalogMirror
+        catalog = BJobCatalogMirror(self, path, max_staleness=max_staleness)
+        with self.__lock:
+            previous, self.catalog = self.catalog, catalog
+        if previous is not None:
+            previous.close()
+        return catalog
+
+    def _run(self, command):
+        '''runs command, identical concurrent read-only commands share one director round trip'''
+        cmd = command.getCommandText()
+        if self.singleFlight is None or cmd is None or not self.singleFlight.isReadOnly(cmd):
+            return command.run()
+        return self.singleFlight.do((command.__class__, normalizeCommand(cmd)), command.run)
 
     def getVersion(self):
-        dir_version = BConsoleCommandVersion(self.wallet, self.userAgent).run()
+        dir_version = self._run(BConsoleCommandVersion(self.wallet, self.userAgent, pool=self.pool))
         return {'director_version': dir_version}
 
     def getClientStatus(self, client_name):
-        client_status = BConsoleCommandClientStatus(self.wallet, client_name, self.userAgent).run()
+        client_status = self._run(BConsoleCommandClientStatus(self.wallet, client_name, self.userAgent, pool=self.pool))
         return {'client_name': client_name, 'status': client_status}
 
+    def getClientStatusInfo(self, client_name):
+        '''returns ClientStatus with version, running and terminated jobs of the file daemon'''
+        return self._run(BConsoleCommandDaemonStatus(self.wallet, 'client', client_name, self.userAgent, pool=self.pool))
+
+    def getStorageStatusInfo(self, storage_name):
+        '''returns StorageStatus with version, running and terminated jobs of the storage daemon'''
+        return self._run(BConsoleCommandDaemonStatus(self.wallet, 'storage', storage_name, self.userAgent, pool=self.pool))
+
+    def getDirectorStatusInfo(self):
+        '''returns DirectorStatus with version, scheduled, running and terminated jobs'''
+        return self._run(BConsoleCommandDaemonStatus(self.wallet, 'dir', None, self.userAgent, pool=self.pool))
+
     def getJobStatus(self, job_id):
-        job_status = BConsoleCommandJobStatus(self.wallet, job_id, self.userAgent).run()
+        if self.catalog is not None:
+            job = self.catalog.getJob(int(job_id))
+            if job is not None:
+                return JobStatus(job)
+        job_status = self._run(BConsoleCommandJobStatus(self.wallet, job_id, self.userAgent, pool=self.pool))
         if len(job_status) > 0:
-            job_status = job_status[0]
+            job_status = dict(job_status[0]) # parsed table may be shared with other callers
             job_status['jobid'] = int(job_status['jobid'].replace(',', ''))
             job_status['jobbytes'] = int(job_status['jobbytes'].replace(',', ''))
             job_status['jobfiles'] = int(job_status['jobfiles'].replace(',', ''))
@@ -419,17 +1494,129 @@ class BConsole:
         else:
             return {}
 
-    def doRestore(self, restore_from_client, restore_to_client, restore_where, files_to_restore=[], exclude_from_restore=[], date=None, fileset=None):
+    def getJobs(self, client=None, status=None, since=None, limit=None):
+        '''returns list of JobStatus, newest first; since - datetime, filters by start time'''
+        if self.catalog is not None:
+            jobs = self.catalog.findJobs(client=client, status=status, since=since, limit=limit)
+            return [JobStatus(job) for job in jobs]
+        # the tables may be shared with concurrent callers (see BSingleFlight), jobs is a new list
+        jobs = []
+        for table in self._run(BConsoleCommandJobList(self.wallet, self.userAgent, client=client, status=status, pool=self.pool)):
+            jobs.extend(JobStatus.fromTable(table))
+        jobs.sort(key=attrgetter('id'), reverse=True)
+        if since is not None:
+            jobs = [job for job in jobs if job.starttime is not None and job.starttime >= since]
+        if limit is not None:
+            jobs = jobs[:limit]
+        return jobs
+
+    def cancelJobs(self, job_ids=None, client=None, status=None):
+        '''
+            Cancels jobs selected by list of JobIds or by client and/or status filter,
+            returns list of JobControlResult
+        '''
+        return self.__controlJobs('cancel', job_ids, client, status)
+
+    def stopJobs(self, job_ids=None, client=None, status=None):
+        '''stops jobs (they can be restarted later), selection is the same as for cancelJobs'''
+        return self.__controlJobs('stop', job_ids, client, status)
+
+    def restartJobs(self, job_ids=None, client=None, status=None):
+        '''restarts stopped, canceled or failed jobs, JobControlResult.newJobId is id of the new job'''
+        return self.__controlJobs('restart', job_ids, client, status)
+
+    def rerunJobs(self, job_ids=None, client=None, status=None):
+        '''runs jobs once more with the same parameters, JobControlResult.newJobId is id of the new job'''
+        return self.__controlJobs('rerun', job_ids, client, status)
+
+    def __controlJobs(self, action, job_ids, client, status):
+        if job_ids is None:
+            if client is None and status is None:
+                raise ValueError("Jobs should be selected by JobIds, client or status")
+            tables = BConsoleCommandJobList(self.wallet, self.userAgent, client=client, status=status, pool=self.pool).run()
+            job_ids = [job_id for table in tables for job_id in table.column('jobid')]
+        if not job_ids:
+            return []
+        return BConsoleCommandJobControl(self.wallet, action, job_ids, self.userAgent, pool=self.pool).run()
+
+    def estimate(self, job, client=None, listing=True, level=None, fileset=None, top=10, depth=3):
+        '''
+            Estimates backup size of the job. With listing=True file list is aggregated on the fly:
+            returns EstimateSummary with totals and top largest directories (paths cut to depth components)
+        '''
+        return BConsoleCommandEstimate(self.wallet, job, self.userAgent, client=client, level=level, fileset=fileset,
+                                       listing=listing, top=top, depth=depth, pool=self.pool).run()
+
+    def streamJobLog(self, job_id, output, compression=None):
+        '''
+            Writes "llist joblog" of the job to output (path or binary file object) while it is received,
+            compression - None, "gzip", "bz2" or "xz". Returns BLogIndex of error and warning lines
+        '''
+        return self.__streamToFile("llist joblog jobid={}".format(job_id), output, compression)
+
+    def streamMessages(self, output, compression=None):
+        '''the same as streamJobLog for the director "messages" queue (the queue is emptied)'''
+        return self.__streamToFile("messages", output, compression)
+
+    def iterJobLog(self, job_id, index=None):
+        '''yields job log lines (str) as they arrive; BLogIndexer passed as index is fed on the way'''
+        if index is None:
+            from .joblog import BLogIndexer
+            index = BLogIndexer()
+        command = BConsoleCommandStream(self.wallet, "llist joblog jobid={}".format(job_id), self.userAgent, pool=self.pool)
+        for chunk in command.run():
+            for line in index.feed(chunk):
+                yield line.decode('utf8', 'replace')
+        for line in index.close():
+            yield line.decode('utf8', 'replace')
+
+    def __streamToFile(self, cmd, output, compression):
+        from .joblog import BLogIndexer, BLogWriter
+        index = BLogIndexer()
+        command = BConsoleCommandStream(self.wallet, cmd, self.userAgent, pool=self.pool)
+        with BLogWriter(output, compression) as writer:
+            for chunk in command.run():
+                writer.write(chunk)
+                index.feed(chunk)
+        index.close()
+        return index.index
+
+    def listVolumes(self, pool=None):
+        '''returns VolumeInventory of all volumes or volumes of the pool'''
+        return self._run(BConsoleCommandVolumeList(self.wallet, self.userAgent, pool_name=pool, pool=self.pool))
+
+    def updateSlots(self, storage, slots=None, drive=0, scan=False):
+        '''
+            Updates catalog from the autochanger inventory (barcodes, or volume labels with scan=True),
+            yields VolumeEvent for every slot; slots - "1-10,12" or list of slot numbers
+        '''
+        from .volumes import formatSlots
+        cmd = "update slots storage={} drive={}".format(storage, drive)
+        if slots is not None:
+            cmd = "{} slots={}".format(cmd, formatSlots(slots))
+        if scan:
+            cmd = "{} scan".format(cmd)
+        return BConsoleCommandVolumeOperation(self.wallet, cmd, self.userAgent, pool=self.pool).run()
+
+    def labelBarcodes(self, storage, pool, slots=None, drive=0):
+        '''labels new volumes of the autochanger with their barcodes into the pool, yields VolumeEvent for every volume'''
+        from .volumes import formatSlots
+        cmd = "label barcodes storage={} pool={} drive={}".format(storage, pool, drive)
+        if slots is not None:
+            cmd = "{} slots={}".format(cmd, formatSlots(slots))
+        return BConsoleCommandVolumeOperation(self.wallet, cmd, self.userAgent, pool_name=pool, pool=self.pool).run()
+
+    def doRestore(self, restore_from_client, restore_to_client, restore_where, files_to_restore=None, exclude_from_restore=None, date=None, fileset=None):
         '''
             Restores backup.
             If date == None - restores last backup for the restore_from_client, else - will be restored backup for a specified date
         '''
-        if not date is None and not type(date) is datetime.datetime:
+        if not date is None and not isinstance(date, datetime):
             raise Exception("Wrong restore date format, should be datetime.datetime")
-        jobid = BConsoleCommandRestore(self.wallet, restore_from_client, restore_to_client, restore_where, files_to_restore, self.userAgent, exclude_from_restore=exclude_from_restore, date=date, fileset=fileset).run()
+        jobid = BConsoleCommandRestore(self.wallet, restore_from_client, restore_to_client, restore_where, files_to_restore, self.userAgent, exclude_from_restore=exclude_from_restore, date=date, fileset=fileset, pool=self.pool).run()
         self.logger.debug("jobid={}".format(jobid))
         return {'jobid': jobid, 'jobtype': 'restore'}
 
     def doBackup(self):
-        jobid = BConsoleCommandBackup(self.wallet, self.userAgent).run()
+        jobid = BConsoleCommandBackup(self.wallet, self.userAgent, pool=self.pool).run()
         return {'jobid': jobid, 'jobtype': 'backup'}
@@ -0,0 +1,157 @@
+# Local SQLite mirror of the bacula job catalog
+
+import logging
+import sqlite3
+import threading
+import time
+from .bconsole import BConsoleCommandSQL
+from .forksafe import registerAfterFork
+from .table import parseCatalogDate, CATALOG_DATE_FORMAT, CATALOG_ZERO_DATES
+
+# statuses of the jobs which won't change anymore (see TASK_STATUSES)
+FINAL_JOB_STATUSES = ('T', 'E', 'e', 'f', 'D', 'A', 'I')
+
+MIRROR_COLUMNS = ('jobid', 'job', 'name', 'client', 'type', 'level', 'jobstatus', 'starttime', 'endtime', 'jobfiles', 'jobbytes')
+
+
+class BJobCatalogMirror:
+    '''
+        Local SQLite copy of the director Job table.
+        sync() fetches only jobs newer than the last seen JobId, jobs finished after the last seen EndTime
+        and jobs which were unfinished at the previous sync. Reads sync the mirror first if it is older
+        than max_staleness seconds, so most of them don't touch the network.
+    '''
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS job (
+            jobid INTEGER PRIMARY KEY,
+            job TEXT,
+            name TEXT,
+            client TEXT,
+            type TEXT,
+            level TEXT,
+            jobstatus TEXT,
+            starttime TEXT,
+            endtime TEXT,
+            jobfiles INTEGER,
+            jobbytes INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS job_client ON job (client);
+        CREATE INDEX IF NOT EXISTS job_jobstatus ON job (jobstatus);
+        CREATE INDEX IF NOT EXISTS job_starttime ON job (starttime);
+    '''
+
+    SYNC_QUERY = (
+        "SELECT Job.JobId, Job.Job, Job.Name, Client.Name, Job.Type, Job.Level, Job.JobStatus, "
+        "Job.StartTime, Job.EndTime, Job.JobFiles, Job.JobBytes "
+        "FROM Job LEFT JOIN Client ON Client.ClientId = Job.ClientId "
+        "WHERE {} ORDER BY Job.JobId"
+    )
+
+    def __init__(self, console, path=':memory:', max_staleness=60.0, clock=time.monotonic):
+        self.console = console
+        self.path = path
+        self.maxStaleness = max_staleness
+        self.clock = clock
+        self.lastSync = None
+        self.__lock = threading.RLock()
+        self.__db = self.__connect()
+        self.logger = logging.getLogger(self.__class__.__name__)
+        registerAfterFork(self)
+
+    def __connect(self):
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.executescript(self.SCHEMA)
+        return db
+
+    def _afterFork(self):
+        # SQLite connection can't be used across fork, in-memory mirror starts empty
+        self.__lock = threading.RLock()
+        self.__db = self.__connect()
+        self.lastSync = None
+
+    def close(self):
+        with self.__lock:
+            self.__db.close()
+
+    def __syncCondition(self):
+        last_jobid, last_endtime = self.__db.execute("SELECT MAX(jobid), MAX(endtime) FROM job").fetchone()
+        conditions = ["Job.JobId > {}".format(last_jobid or 0)]
+        if last_endtime is not None:
+            conditions.append("Job.EndTime >= '{}'".format(last_endtime))
+        unfinished = [str(row[0]) for row in self.__db.execute(
+            "SELECT jobid FROM job WHERE jobstatus NOT IN ({})".format(','.join('?' * len(FINAL_JOB_STATUSES))),
+            FINAL_JOB_STATUSES
+        )]
+        if unfinished:
+            conditions.append("Job.JobId IN ({})".format(','.join(unfinished)))
+        return ' OR '.join(conditions)
+
+    def __convert(self, row):
+        row = list(row)
+        for index in (0, 9, 10):
+            row[index] = int(row[index]) if row[index] not in (None, '') else None
+        # unset dates (MySQL zero dates) are stored as NULL, so MAX(endtime) and starttime filters ignore them
+        for index in (7, 8):
+            if row[index] == '' or row[index] in CATALOG_ZERO_DATES:
+                row[index] = None
+        return row
+
+    def sync(self):
+        '''fetches changes from the director, returns number of updated jobs'''
+        with self.__lock:
+            query = self.SYNC_QUERY.format(self.__syncCondition())
+            command = BConsoleCommandSQL(self.console.wallet, query, self.console.userAgent, columns=len(MIRROR_COLUMNS), pool=self.console.pool)
+            rows = [self.__convert(row) for row in command.run()]
+            with self.__db:
+                self.__db.executemany(
+                    "INSERT OR REPLACE INTO job ({}) VALUES ({})".format(','.join(MIRROR_COLUMNS), ','.join('?' * len(MIRROR_COLUMNS))),
+                    rows
+                )
+            self.lastSync = self.clock()
+            self.logger.debug("synced {} jobs".format(len(rows)))
+            return len(rows)
+
+    def isFresh(self):
+        return self.lastSync is not None and self.clock() - self.lastSync <= self.maxStaleness
+
+    def ensureFresh(self):
+        with self.__lock:
+            if not self.isFresh():
+                self.sync()
+
+    def __record(self, row):
+        job = dict(zip(MIRROR_COLUMNS, row))
+        if job['starttime'] is not None:
+            job['starttime'] = parseCatalogDate(job['starttime'])
+        if job['endtime'] is not None:
+            job['endtime'] = parseCatalogDate(job['endtime'])
+        return job
+
+    def getJob(self, job_id):
+        '''returns job record (dict with "list jobs" keys) or None'''
+        self.ensureFresh()
+        with self.__lock:
+            row = self.__db.execute("SELECT {} FROM job WHERE jobid = ?".format(','.join(MIRROR_COLUMNS)), (job_id,)).fetchone()
+        return self.__record(row) if row is not None else None
+
+    def findJobs(self, client=None, status=None, since=None, limit=None):
+        '''returns job records, newest first; since - datetime, filters by start time'''
+        conditions = []
+        params = []
+        for column, value in (('client', client), ('jobstatus', status)):
+            if value is not None:
+                conditions.append("{} = ?".format(column))
+                params.append(value)
+        if since is not None:
+            conditions.append("starttime >= ?")
+            params.append(since.strftime(CATALOG_DATE_FORMAT))
+        query = "SELECT {} FROM job".format(','.join(MIRROR_COLUMNS))
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY jobid DESC"
+        if limit is not None:
+            query += " LIMIT {}".format(int(limit))
+        self.ensureFresh()
+        with self.__lock:
+            rows = self.__db.execute(query, params).fetchall()
+        return [self.__record(row) for row in rows]
@@ -0,0 +1,226 @@
+# Batch mode console: runs commands from a file or stdin and writes results as JSON lines
+#
+# usage: pybconsole [-c bconsole.conf] [-H host] [-p port] [-f commands.txt] [-o results.jsonl]
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import time
+from collections import deque
+from .bconsole import BSocket, BSocketConfig, BSocketWallet, READ_ONLY_VERBS, INFORMATIONAL_SIGNALS, PROMPT_SIGNALS
+
+DEFAULT_PORT = 9101
+DEFAULT_WINDOW = 16
+PASSWORD_ENV = 'BCONSOLE_PASSWORD'
+
+RE_CONF_DIRECTOR = re.compile(r'Director\s*\{(.*?)\}', re.S | re.I)
+RE_CONF_OPTION = re.compile(r'^\s*(\w+)\s*=\s*"?([^"\n]*?)"?\s*;?\s*$', re.M)
+RE_VERSION = re.compile(r'Version: (\S+)')
+
+
+def readConfig(path):
+    '''returns (address, port, password) of the first Director resource of bconsole.conf'''
+    with open(path) as f:
+        mres = RE_CONF_DIRECTOR.search(f.read())
+    if mres is None:
+        raise ValueError("No Director resource in {}".format(path))
+    options = {name.lower(): value for name, value in RE_CONF_OPTION.findall(mres.group(1))}
+    return options.get('address'), int(options.get('dirport', DEFAULT_PORT)), options.get('password')
+
+
+def readCommands(lines):
+    '''yields commands, skipping empty lines and "#" comments'''
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def jsonDefault(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError("{!r} is not JSON serializable".format(value))
+
+
+def parseAnswer(cmd, text):
+    '''returns parsed answer (dict) for commands known to the library parsers or None'''
+    words = cmd.split()
+    verb = words[0].lower()
+    if verb == 'version':
+        mres = RE_VERSION.search(text)
+        return {'version': mres.group(1) if mres is not None else None}
+    if verb == 'list' and len(words) > 1:
+        from .table import BTableParser, JOB_COLUMN_CONVERTERS
+        tables = BTableParser(JOB_COLUMN_CONVERTERS).parse(text)
+        if tables:
+            return {'tables': [{'columns': table.columns, 'rows': table.records()} for table in tables]}
+    if verb == 'status' and len(words) > 1:
+        from .status import ClientStatusParser, StorageStatusParser, DirectorStatusParser
+        parsers = {
+            'client': ClientStatusParser,
+            'storage': StorageStatusParser,
+            'dir': DirectorStatusParser,
+            'director': DirectorStatusParser
+        }
+        parser = parsers.get(words[1].split('=', 1)[0].lower())
+        if parser is not None:
+            parser = parser()
+            parser.feed(text)
+            return parser.close().as_dict()
+    return None
+
+
+class BBatchRunner:
+    '''
+        Runs commands over one director session and writes a JSON line per command.
+        Read-only commands (see READ_ONLY_VERBS) are pipelined: up to window of them are sent
+        before the answers are read, the director answers them in order. Any other command waits
+        until all answers are read and runs alone, so its prompts are answered by the following
+        lines as in bconsole batch mode. An answer which ends at a prompt is marked with "prompt": true
+        and the next line, the answer to the prompt, is never pipelined.
+        dir - BSocket; in a process with BCommandScheduler pass a session checked out with
+        BConsole.session(), so the batch is admitted and counted against max_concurrency.
+        pybconsole itself holds exactly one director connection for the whole run.
+    '''
+    def __init__(self, dir, output, window=DEFAULT_WINDOW, raw=False, stop_on_error=False):
+        self.dir = dir
+        self.output = output
+        self.window = window
+        self.raw = raw
+        self.stopOnError = stop_on_error
+        self.verbs = READ_ONLY_VERBS
+        self.failed = 0
+        self.atPrompt = False
+        self.__inflight = deque()
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def isPipelined(self, cmd):
+        return self.window > 1 and not self.atPrompt and cmd.split(None, 1)[0].lower() in self.verbs
+
+    def __write(self, result):
+        self.output.write(json.dumps(result, default=jsonDefault) + '\n')
+
+    def __fail(self, error):
+        '''reports error for every command in flight and drops the session, the next command reconnects'''
+        while self.__inflight:
+            cmd, start = self.__inflight.popleft()
+            self.__write({'command': cmd, 'error': str(error)})
+            self.failed += 1
+        self.atPrompt = False
+        self.dir.close()
+
+    def __receive(self):
+        cmd, start = self.__inflight[0]
+        chunks = []
+        msg = self.dir.receive(decode=False)
+        # BNET_EOD or a prompt signal ends the answer, informational signals are skipped
+        while msg is not None or self.dir.reader.signal in INFORMATIONAL_SIGNALS:
+            if msg is not None:
+                chunks.append(msg)
+            msg = self.dir.receive(decode=False)
+        self.__inflight.popleft()
+        self.atPrompt = self.dir.reader.signal in PROMPT_SIGNALS
+        text = b''.join(chunks).decode('utf8', 'replace')
+        result = {'command': cmd, 'elapsed': round(time.monotonic() - start, 6)}
+        if self.atPrompt:
+            result['prompt'] = True
+        data = None
+        if not self.raw:
+            try:
+                data = parseAnswer(cmd, text)
+            except Exception as e:
+                # the answer is still written as text, the rest of the batch goes on
+                self.logger.warning("can't parse answer of {}: {}".format(cmd, e))
+                result['parse_error'] = str(e)
+        if data is None:
+            result['text'] = text
+        else:
+            result['data'] = data
+        self.__write(result)
+
+    def __drain(self, keep=0):
+        while len(self.__inflight) > keep:
+            self.__receive()
+
+    def run(self, commands):
+        '''returns number of failed commands'''
+        for cmd in commands:
+            if self.stopOnError and self.failed:
+                break
+            pipelined = self.isPipelined(cmd)
+            try:
+                self.__drain(self.window - 1 if pipelined else 0)
+                self.__inflight.append((cmd, time.monotonic()))
+                self.dir.send(cmd)
+                if not pipelined:
+                    self.__drain()
+            except (OSError, RuntimeError) as e:
+                self.__fail(e)
+        try:
+            self.__drain()
+        except (OSError, RuntimeError) as e:
+            self.__fail(e)
+        return self.failed
+
+
+def parseArguments(argv):
+    parser = argparse.ArgumentParser(prog='pybconsole', description="Runs bacula console commands and writes results as JSON lines")
+    parser.add_argument('-c', '--config', help="bconsole.conf to take director address, port and password from")
+    parser.add_argument('-H', '--host', help="director address")
+    parser.add_argument('-p', '--port', type=int, help="director port (default {})".format(DEFAULT_PORT))
+    parser.add_argument('--password-file', help="file with the director password, ${} is used otherwise".format(PASSWORD_ENV))
+    parser.add_argument('-u', '--user-agent', help="console name")
+    parser.add_argument('-f', '--file', default='-', help="file with commands, one per line (default stdin)")
+    parser.add_argument('-o', '--output', default='-', help="file for results (default stdout)")
+    parser.add_argument('-w', '--window', type=int, default=DEFAULT_WINDOW, help="number of read-only commands sent ahead, 1 disables pipelining")
+    parser.add_argument('-t', '--timeout', type=float, default=300.0, help="seconds to wait for every chunk of an answer")
+    parser.add_argument('--compression', choices=('lz4', 'zlib'), help="ask the director for compressed frames")
+    parser.add_argument('--raw', action='store_true', help="write answer text without parsing")
+    parser.add_argument('--stop-on-error', action='store_true', help="stop after the first failed command")
+    parser.add_argument('--replay', help="play commands against a session recording instead of the director")
+    args = parser.parse_args(argv)
+    if args.window < 1:
+        parser.error("window should be at least 1")
+    return parser, args
+
+
+def connect(parser, args):
+    if args.replay is not None:
+        from .replay import replaySession
+        return replaySession(args.replay, user_agent=args.user_agent)
+    host, port, password = None, None, None
+    if args.config is not None:
+        host, port, password = readConfig(args.config)
+    host = args.host or host or 'localhost'
+    port = args.port or port or DEFAULT_PORT
+    if args.password_file is not None:
+        with open(args.password_file) as f:
+            password = f.read().strip()
+    password = password or os.environ.get(PASSWORD_ENV)
+    if not password:
+        parser.error("director password is required: use --config, --password-file or ${}".format(PASSWORD_ENV))
+    config = BSocketConfig(read_timeout=args.timeout, compression=args.compression)
+    return BSocket(BSocketWallet(password, host, port), user_agent=args.user_agent, config=config)
+
+
+def main(argv=None):
+    parser, args = parseArguments(argv)
+    dir = connect(parser, args)
+    source = sys.stdin if args.file == '-' else open(args.file)
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        with dir:
+            failed = BBatchRunner(dir, output, window=args.window, raw=args.raw, stop_on_error=args.stop_on_error).run(readCommands(source))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+# Streaming parser of "estimate ... listing" output
+
+import heapq
+import re
+
+
+class EstimateSummary:
+    '''
+        files, bytes - computed from the listing (bytes of regular files only, as the director counts them)
+        directorFiles, directorBytes - numbers from the final "2000 OK estimate" line
+        topDirectories - list of (path, bytes, files) of the largest directories
+    '''
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.directories = 0
+        self.directorFiles = None
+        self.directorBytes = None
+        self.topDirectories = []
+
+    def as_dict(self):
+        return {
+            'files': self.files,
+            'bytes': self.bytes,
+            'directories': self.directories,
+            'director_files': self.directorFiles,
+            'director_bytes': self.directorBytes,
+            'top_directories': [{'path': path, 'bytes': size, 'files': files} for path, size, files in self.topDirectories]
+        }
+
+
+class EstimateParser:
+    '''
+        Incremental parser of the estimate listing (fed with raw bytes as they arrive).
+        Only totals per directory truncated to depth path components are kept, so memory
+        doesn't depend on the number of listed files.
+    '''
+    RE_ENTRY = re.compile(rb'^([-dlcbpsD][-rwxsStT]{9})\s+\d+\s+\S+\s+\S+\s+(\d+)\s+\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\s\s(.+)$')
+    RE_SUMMARY = re.compile(rb'2000 OK estimate files=([\d,]+) bytes=([\d,]+)')
+
+    def __init__(self, top=10, depth=3):
+        self.top = top
+        self.depth = depth
+        self.summary = EstimateSummary()
+        self.directories = {}
+        self.__tail = b''
+
+    def feed(self, chunk):
+        lines = (self.__tail + chunk).split(b'\n')
+        self.__tail = lines.pop()
+        for line in lines:
+            self._parseLine(line)
+
+    def close(self):
+        if self.__tail:
+            self._parseLine(self.__tail)
+            self.__tail = b''
+        self.summary.topDirectories = [
+            (path.decode('utf8', 'replace'), size, files)
+            for path, (size, files) in heapq.nlargest(self.top, self.directories.items(), key=lambda item: item[1][0])
+        ]
+        return self.summary
+
+    def directoryKey(self, path):
+        '''b"/var/lib/pgsql/data/base/1" -> b"/var/lib/pgsql" for depth=3'''
+        parent = path.rstrip(b'/').rsplit(b'/', 1)[0]
+        parts = parent.split(b'/', self.depth + 1)
+        return b'/'.join(parts[:self.depth + 1]) or b'/'
+
+    def _parseLine(self, line):
+        mres = self.RE_ENTRY.match(line)
+        if mres is None:
+            mres = self.RE_SUMMARY.search(line)
+            if mres is not None:
+                self.summary.directorFiles = int(mres.group(1).replace(b',', b''))
+                self.summary.directorBytes = int(mres.group(2).replace(b',', b''))
+            return
+        mode, size, path = mres.groups()
+        summary = self.summary
+        summary.files += 1
+        if mode[:1] == b'd':
+            summary.directories += 1
+            return
+        # the director adds st_size of regular files only (S_ISREG), symlinks and devices count as files
+        size = int(size) if mode[:1] == b'-' else 0
+        summary.bytes += size
+        key = self.directoryKey(path)
+        totals = self.directories.get(key)
+        if totals is None:
+            self.directories[key] = [size, 1]
+        else:
+            totals[0] += size
+            totals[1] += 1
@@ -0,0 +1,86 @@
+# Fan-out of console calls over thread and process pools (concurrent.futures)
+
+import functools
+import types
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+class BCall:
+    '''
+        Deferred call of BConsole method: BCall("getJobStatus", 5)
+    '''
+    def __init__(self, method, *args, **kwargs):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+
+    def __repr__(self):
+        args = [repr(arg) for arg in self.args] + ["{}={!r}".format(name, value) for name, value in self.kwargs.items()]
+        return "{}({})".format(self.method, ', '.join(args))
+
+
+class BCallResult:
+    '''
+        result - return value (generators are consumed into lists), error - exception raised by the call
+    '''
+    def __init__(self, call, result=None, error=None):
+        self.call = call
+        self.result = result
+        self.error = error
+
+    def isSuccess(self):
+        return self.error is None
+
+    def __repr__(self):
+        if self.error is not None:
+            return "BCallResult({!r}, error={!r})".format(self.call, self.error)
+        return "BCallResult({!r}, result={!r})".format(self.call, self.result)
+
+
+def _invoke(console, call):
+    try:
+        result = getattr(console, call.method)(*call.args, **call.kwargs)
+        if isinstance(result, types.GeneratorType):
+            result = list(result)
+        return BCallResult(call, result)
+    except Exception as e:
+        return BCallResult(call, error=e)
+
+
+# console of the worker process, created by _initWorker
+_workerConsole = None
+
+
+def _initWorker(wallet, user_agent, config):
+    global _workerConsole
+    import multiprocessing.util
+    from .bconsole import BConsole
+    _workerConsole = BConsole(None, None, None, user_agent, config=config, pool_size=1, wallet=wallet)
+    # say goodbye to the director when the worker exits
+    multiprocessing.util.Finalize(_workerConsole, _workerConsole.close, exitpriority=10)
+
+
+def _invokeInWorker(call):
+    return _invoke(_workerConsole, call)
+
+
+def fanOut(console, calls, max_workers=4, processes=False, mp_context=None, config=None):
+    '''
+        Runs BCall list concurrently and returns BCallResult list in the order of calls.
+        Threads share the console (every call checks out own session from its pool). With processes=True
+        every worker process connects own console with the console wallet and config (console.config
+        if config is None, see BSocketConfig about pickling), results have to be picklable.
+        Keep max_workers below the director MaximumConsoleConnections.
+    '''
+    calls = list(calls)
+    if config is None:
+        config = console.config
+    if processes:
+        executor = ProcessPoolExecutor(max_workers, mp_context=mp_context, initializer=_initWorker,
+                                       initargs=(console.wallet, console.userAgent, config))
+        function = _invokeInWorker
+    else:
+        executor = ThreadPoolExecutor(max_workers)
+        function = functools.partial(_invoke, console)
+    with executor:
+        return list(executor.map(function, calls))
@@ -0,0 +1,38 @@
+# Reinitialization of locks and director connections in the child process after os.fork()
+
+import os
+import weakref
+
+_objects = weakref.WeakSet()
+
+
+def registerAfterFork(obj):
+    '''
+        obj._afterFork() will be called in the child process after os.fork(); optional obj._beforeFork()
+        is called in the parent before the fork and obj._afterForkInParent() in the parent after it
+    '''
+    _objects.add(obj)
+
+
+def _call(objects, method):
+    for obj in objects:
+        function = getattr(obj, method, None)
+        if function is not None:
+            function()
+
+
+def _beforeFork():
+    _call(list(_objects), '_beforeFork')
+
+
+def _afterForkInParent():
+    _call(list(_objects), '_afterForkInParent')
+
+
+def _afterForkInChild():
+    # locks may be held by threads which don't exist in the child, sockets belong to the parent sessions
+    _call(list(_objects), '_afterFork')
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(before=_beforeFork, after_in_parent=_afterForkInParent, after_in_child=_afterForkInChild)
@@ -0,0 +1,142 @@
+# Streamed job log and messages retrieval
+
+import json
+import re
+
+COMPRESSIONS = ('gzip', 'bz2', 'xz')
+
+
+class BLogEntry:
+    def __init__(self, offset, line_number, severity, job_id, text):
+        self.offset = offset
+        self.lineNumber = line_number
+        self.severity = severity
+        self.jobId = job_id
+        self.text = text
+
+    def as_dict(self):
+        return {
+            'offset': self.offset,
+            'line': self.lineNumber,
+            'severity': self.severity,
+            'jobid': self.jobId,
+            'text': self.text
+        }
+
+
+class BLogIndex:
+    '''
+        Index of error and warning lines: byte offsets in the uncompressed log and the line text
+    '''
+    def __init__(self):
+        self.entries = []
+        self.size = 0
+        self.lines = 0
+        self.counts = {'fatal': 0, 'error': 0, 'warning': 0}
+
+    def errors(self):
+        return [entry for entry in self.entries if entry.severity != 'warning']
+
+    def warnings(self):
+        return [entry for entry in self.entries if entry.severity == 'warning']
+
+    def as_dict(self):
+        return {
+            'size': self.size,
+            'lines': self.lines,
+            'counts': dict(self.counts),
+            'entries': [entry.as_dict() for entry in self.entries]
+        }
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f)
+
+
+class BLogIndexer:
+    '''
+        Splits log chunks into lines and indexes lines with errors and warnings on the fly.
+        Only the unfinished last line of the chunk is kept in memory.
+        max_text - indexed line text is truncated to this length
+    '''
+    # only job messages are indexed, not the summary lines like "SD Errors:  0"
+    RE_SEVERITY = re.compile(rb'JobId (\d+): (Fatal error|Error|Warning):')
+    SEVERITIES = {b'Fatal error': 'fatal', b'Error': 'error', b'Warning': 'warning'}
+
+    def __init__(self, max_text=512):
+        self.maxText = max_text
+        self.index = BLogIndex()
+        self.__tail = b''
+
+    def feed(self, chunk):
+        '''returns list of complete lines (bytes, without "\\n") of the chunk'''
+        lines = (self.__tail + chunk).split(b'\n')
+        self.__tail = lines.pop()
+        for line in lines:
+            self.__indexLine(line, len(line) + 1)
+        return lines
+
+    def close(self):
+        lines = []
+        if self.__tail:
+            lines.append(self.__tail)
+            self.__indexLine(self.__tail, len(self.__tail))
+            self.__tail = b''
+        return lines
+
+    def __indexLine(self, line, size):
+        index = self.index
+        mres = self.RE_SEVERITY.search(line)
+        if mres is not None:
+            severity = self.SEVERITIES[mres.group(2)]
+            index.entries.append(BLogEntry(
+                index.size, index.lines, severity, int(mres.group(1)),
+                line[:self.maxText].decode('utf8', 'replace').strip()
+            ))
+            index.counts[severity] += 1
+        index.size += size
+        index.lines += 1
+
+
+class BLogWriter:
+    '''
+        Writes log to a path or a binary file object, optionally compressed (gzip, bz2 or xz)
+    '''
+    def __init__(self, output, compression=None):
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError("Unknown compression {}, should be one of {}".format(compression, ', '.join(COMPRESSIONS)))
+        self.output = output
+        self.compression = compression
+        self.file = None
+        self.__owned = []
+
+    def __open(self):
+        fileobj = self.output
+        if isinstance(fileobj, str):
+            fileobj = open(fileobj, 'wb')
+            self.__owned.append(fileobj)
+        if self.compression == 'gzip':
+            import gzip
+            fileobj = gzip.GzipFile(fileobj=fileobj, mode='wb')
+        elif self.compression == 'bz2':
+            import bz2
+            fileobj = bz2.BZ2File(fileobj, mode='wb')
+        elif self.compression == 'xz':
+            import lzma
+            fileobj = lzma.LZMAFile(fileobj, mode='wb')
+        if fileobj is not self.output and fileobj not in self.__owned:
+            self.__owned.insert(0, fileobj)
+        return fileobj
+
+    def __enter__(self):
+        self.file = self.__open()
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        for fileobj in self.__owned:
+            fileobj.close()
+        self.__owned = []
+        self.file = None
+
+    def write(self, data):
+        self.file.write(data)
@@ -0,0 +1,173 @@
+# Running jobs throughput monitor
+
+import logging
+import threading
+import time
+from collections import deque
+from .status import ClientStatusParser, DirectorStatusParser
+from .scheduler import PRIORITY_BULK
+
+
+class JobThroughput:
+    '''
+        Fixed-size ring buffer of (timestamp, bytes, files) samples of one running job
+    '''
+    def __init__(self, job_id, name=None, size=30):
+        self.id = job_id
+        self.name = name
+        self.samples = deque(maxlen=size)
+        self.lastChange = None
+
+    def add(self, timestamp, bytes, files):
+        if bytes is None:
+            return
+        if not self.samples or self.samples[-1][1] != bytes or self.samples[-1][2] != files:
+            self.lastChange = timestamp
+        self.samples.append((timestamp, bytes, files or 0))
+
+    def __rate(self, index, first, last):
+        elapsed = last[0] - first[0]
+        if elapsed <= 0:
+            return None
+        return (last[index] - first[index]) / elapsed
+
+    def bytesRate(self):
+        '''average bytes/sec over the sample window'''
+        if len(self.samples) < 2:
+            return None
+        return self.__rate(1, self.samples[0], self.samples[-1])
+
+    def filesRate(self):
+        '''average files/sec over the sample window'''
+        if len(self.samples) < 2:
+            return None
+        return self.__rate(2, self.samples[0], self.samples[-1])
+
+    def lastBytesRate(self):
+        '''bytes/sec between two last samples'''
+        if len(self.samples) < 2:
+            return None
+        return self.__rate(1, self.samples[-2], self.samples[-1])
+
+    def eta(self, expected_bytes):
+        '''seconds left until the job writes expected_bytes (e.g. size of the previous run), None if unknown'''
+        rate = self.bytesRate()
+        if not rate or not self.samples:
+            return None
+        return max(expected_bytes - self.samples[-1][1], 0) / rate
+
+    def isStalled(self, stall_time, now):
+        '''job didn't move for stall_time seconds'''
+        if self.lastChange is None:
+            return False
+        return now - self.lastChange >= stall_time
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'bytes': self.samples[-1][1] if self.samples else None,
+            'files': self.samples[-1][2] if self.samples else None,
+            'bytes_rate': self.bytesRate(),
+            'files_rate': self.filesRate(),
+            'last_bytes_rate': self.lastBytesRate()
+        }
+
+
+class JobThroughputMonitor:
+    '''
+        Samples running jobs from "status dir" and "status client=X" on one director session per sample.
+        The session is checked out from the console pool (with admission of the console scheduler
+        at priority) for the sample only, between samples it waits in the pool.
+        Counters from the file daemons are more precise, so they override director numbers.
+        Director isn't queried more often than once per min_interval seconds.
+    '''
+    def __init__(self, console, clients=(), interval=10.0, min_interval=5.0, window=30, stall_time=300.0, clock=time.monotonic, priority=PRIORITY_BULK):
+        self.console = console
+        self.clients = list(clients)
+        self.interval = interval
+        self.minInterval = min_interval
+        self.window = window
+        self.stallTime = stall_time
+        self.clock = clock
+        self.priority = priority
+        self.jobs = {}
+        self.lastSample = None
+        self.__lock = threading.Lock()
+        self.__stopEvent = threading.Event()
+        self.__thread = None
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.stop()
+
+    def __status(self, session, cmd, parser):
+        for chunk in session.iterCmd(cmd):
+            parser.feed(chunk)
+        return parser.close()
+
+    def sample(self):
+        '''
+            Takes one sample of all running jobs.
+            Returns False if the previous sample is younger than min_interval and the director wasn't queried
+        '''
+        now = self.clock()
+        if self.lastSample is not None and now - self.lastSample < self.minInterval:
+            return False
+        self.lastSample = now
+        running = {}
+        with self.console.pool.session(priority=self.priority) as session:
+            for job in self.__status(session, "status dir", DirectorStatusParser()).running:
+                running[job.id] = job
+            for client in self.clients:
+                status = self.__status(session, "status client={}".format(client), ClientStatusParser())
+                for job in status.running:
+                    if job.id in running and running[job.id].name is not None:
+                        job.name = running[job.id].name
+                    running[job.id] = job
+        timestamp = self.clock()
+        with self.__lock:
+            for job_id in list(self.jobs):
+                if job_id not in running:
+                    del self.jobs[job_id]
+            for job_id, job in running.items():
+                throughput = self.jobs.get(job_id)
+                if throughput is None:
+                    throughput = self.jobs[job_id] = JobThroughput(job_id, job.name, self.window)
+                throughput.add(timestamp, job.bytes, job.files)
+        return True
+
+    def rates(self):
+        '''returns {jobid: JobThroughput} snapshot'''
+        with self.__lock:
+            return dict(self.jobs)
+
+    def stalled(self):
+        '''returns list of JobThroughput which didn't move for stall_time seconds'''
+        now = self.clock()
+        with self.__lock:
+            return [job for job in self.jobs.values() if job.isStalled(self.stallTime, now)]
+
+    def __run(self):
+        while not self.__stopEvent.is_set():
+            try:
+                self.sample()
+            except (OSError, RuntimeError) as e:
+                self.logger.warning("sampling failed: {}".format(e))
+            self.__stopEvent.wait(max(self.interval, self.minInterval))
+
+    def start(self):
+        '''starts background sampling thread'''
+        if self.__thread is None:
+            self.__stopEvent.clear()
+            self.__thread = threading.Thread(target=self.__run, name=self.__class__.__name__, daemon=True)
+            self.__thread.start()
+
+    def stop(self):
+        if self.__thread is not None:
+            self.__stopEvent.set()
+            self.__thread.join()
+            self.__thread = None
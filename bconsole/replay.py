@@ -0,0 +1,248 @@
+# Recording of director sessions and replay transport for benchmarks and regression tests
+
+import mmap
+import re
+import threading
+import time
+from collections import deque
+from struct import Struct, pack
+from .forksafe import registerAfterFork
+
+FILE_MAGIC = b'BCRP'
+FILE_VERSION = 2
+FILE_HEADER = Struct('!4sB')
+# direction, session id, seconds since the recording start, payload length (signal value for signals)
+RECORD_HEADER = Struct('!BIdi')
+# version 1 had 16-bit session ids
+RECORD_HEADERS = {1: Struct('!BHdi'), FILE_VERSION: RECORD_HEADER}
+
+DIRECTION_SEND = 0
+DIRECTION_RECEIVE = 1
+DIRECTION_SIGNAL = 2
+
+REDACTED = b'***'
+DEFAULT_REDACTIONS = (
+    re.compile(rb'((?:password|passwd|secret|key)\s*=\s*)("[^"]*"|\S+)', re.I),
+)
+
+
+def redact(payload, redactions=DEFAULT_REDACTIONS):
+    '''b"label password=secret" -> b"label password=***"'''
+    for redaction in redactions:
+        payload = redaction.sub(lambda mres: mres.group(1) + REDACTED, payload)
+    return payload
+
+
+class BReplayDivergedError(RuntimeError):
+    pass
+
+
+class BSessionRecorder:
+    '''
+        Writes timestamped frames of director sessions to a compact binary file.
+        Pass it as BSocketConfig(recorder=...); every BSocket gets own session id.
+        Only frames after successful authentication are recorded, so challenges and digests never
+        reach the file; values of password-like keywords are replaced with "***".
+        BSocket logs errors of record() and goes on, recording never breaks director commands.
+        Only sessions of the process which created the recorder are recorded: a child process
+        after os.fork() stops recording, BSocketConfig is pickled without the recorder.
+    '''
+    def __init__(self, path, redactions=DEFAULT_REDACTIONS, clock=time.monotonic):
+        self.path = path
+        self.redactions = redactions
+        self.clock = clock
+        self.start = clock()
+        self.__sessions = 0
+        self.__lock = threading.Lock()
+        self.__file = open(path, 'wb')
+        self.__file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION))
+        registerAfterFork(self)
+
+    def _beforeFork(self):
+        # the child must not inherit buffered frames, it would write them once more
+        self.__lock.acquire()
+        if self.__file is not None and not self.__file.closed:
+            self.__file.flush()
+
+    def _afterForkInParent(self):
+        self.__lock.release()
+
+    def _afterFork(self):
+        self.__lock = threading.Lock()
+        self.__file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+    def close(self):
+        with self.__lock:
+            if self.__file is not None and not self.__file.closed:
+                self.__file.close()
+
+    def newSession(self):
+        with self.__lock:
+            self.__sessions += 1
+            return self.__sessions
+
+    def record(self, session, direction, payload=None, signal=None):
+        timestamp = self.clock() - self.start
+        if direction == DIRECTION_SIGNAL:
+            data = RECORD_HEADER.pack(direction, session, timestamp, signal)
+        else:
+            payload = redact(bytes(payload), self.redactions)
+            data = RECORD_HEADER.pack(direction, session, timestamp, len(payload)) + payload
+        with self.__lock:
+            if self.__file is not None:
+                self.__file.write(data)
+
+
+class BRecord:
+    def __init__(self, direction, session, timestamp, payload, signal):
+        self.direction = direction
+        self.session = session
+        self.timestamp = timestamp
+        self.payload = payload
+        self.signal = signal
+
+
+def iterRecords(buffer):
+    '''yields BRecord from recording (bytes, mmap); payloads are memoryview slices, nothing is copied'''
+    view = memoryview(buffer)
+    magic, version = FILE_HEADER.unpack_from(view, 0)
+    if magic != FILE_MAGIC or version not in RECORD_HEADERS:
+        raise RuntimeError("Not a session recording or unsupported version")
+    header = RECORD_HEADERS[version]
+    position = FILE_HEADER.size
+    while position + header.size <= len(view):
+        direction, session, timestamp, size = header.unpack_from(view, position)
+        position += header.size
+        if direction == DIRECTION_SIGNAL:
+            yield BRecord(direction, session, timestamp, None, size)
+        else:
+            yield BRecord(direction, session, timestamp, view[position:position + size], None)
+            position += size
+
+
+class BReplaySocket:
+    '''
+        Socket-like transport which plays recorded director answers back.
+        Attach it to BSocket with replaySession(); the client frames are matched to the recorded ones
+        in order, also when the client sends several commands ahead (strict=True raises BReplayDivergedError
+        on different commands). Answers are served with the original timing divided by speed
+        (speed=None - as fast as possible).
+    '''
+    def __init__(self, path, session=None, speed=None, strict=False, redactions=DEFAULT_REDACTIONS):
+        self.path = path
+        self.speed = speed
+        self.strict = strict
+        self.redactions = redactions
+        self.timeout = None
+        self.diverged = False
+        self.__file = open(path, 'rb')
+        self.__mmap = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        records = iterRecords(self.__mmap)
+        if session is None:
+            first = next(records, None)
+            session = first.session if first is not None else None
+            self.__records = [first] if first is not None else []
+        else:
+            self.__records = []
+        self.__records.extend(record for record in records if record.session == session)
+        self.session = session
+        self.__position = 0
+        self.__sent = deque()
+        self.__pending = memoryview(b'')
+        self.__replayStart = None
+        self.__recordStart = None
+
+    def close(self):
+        self.__pending = memoryview(b'')
+        for record in self.__records:
+            if record.payload is not None:
+                record.payload.release()
+        self.__records = []
+        if not self.__mmap.closed:
+            self.__mmap.close()
+        self.__file.close()
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def gettimeout(self):
+        return self.timeout
+
+    def setsockopt(self, level, option, value):
+        pass
+
+    def __wait(self, record):
+        if not self.speed:
+            return
+        if self.__replayStart is None:
+            self.__replayStart, self.__recordStart = time.monotonic(), record.timestamp
+            return
+        delay = (record.timestamp - self.__recordStart) / self.speed - (time.monotonic() - self.__replayStart)
+        if delay > 0:
+            time.sleep(delay)
+
+    def __consumeSent(self):
+        '''matches frames sent by the client with the recorded ones, the client may send ahead (pipelining)'''
+        while self.__sent and self.__position < len(self.__records):
+            record = self.__records[self.__position]
+            if record.direction != DIRECTION_SEND:
+                return
+            payload = self.__sent.popleft()
+            if self.strict and redact(payload, self.redactions) != record.payload:
+                self.diverged = True
+                raise BReplayDivergedError("Replay diverged: sent {!r}, recorded {!r}".format(payload, bytes(record.payload)))
+            self.__wait(record)
+            self.__position += 1
+
+    def send(self, data):
+        if self.diverged:
+            raise BrokenPipeError("Replay diverged from the recording")
+        self.__sent.append(bytes(data[4:]))
+        self.__consumeSent()
+        return len(data)
+
+    def sendall(self, data):
+        self.send(data)
+
+    def __next(self):
+        self.__consumeSent()
+        if self.__position >= len(self.__records):
+            return None
+        record = self.__records[self.__position]
+        if record.direction == DIRECTION_SEND:
+            return None # the director waits for the client command
+        self.__position += 1
+        self.__wait(record)
+        if record.direction == DIRECTION_SIGNAL:
+            return memoryview(pack("!i", record.signal))
+        return memoryview(pack("!i", len(record.payload)) + record.payload)
+
+    def recv_into(self, view, nbytes=0):
+        if not self.__pending:
+            frame = self.__next()
+            if frame is None:
+                return 0
+            self.__pending = frame
+        size = min(len(view), len(self.__pending))
+        view[:size] = self.__pending[:size]
+        self.__pending = self.__pending[size:]
+        return size
+
+    def recv(self, size):
+        buffer = bytearray(size)
+        received = self.recv_into(memoryview(buffer))
+        return bytes(buffer[:received])
+
+
+def replaySession(path, session=None, speed=None, strict=False, user_agent=None, config=None):
+    '''returns BSocket connected to the replay transport, it is already authenticated (auth isn't recorded)'''
+    from .bconsole import BSocket
+    dir = BSocket(None, user_agent=user_agent, config=config)
+    dir.attach(BReplaySocket(path, session=session, speed=speed, strict=strict), authenticated=True)
+    return dir
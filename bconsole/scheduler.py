@@ -0,0 +1,189 @@
+# Client-side command scheduler: priorities and admission control for director sessions
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from .forksafe import registerAfterFork
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_RESTORE_CONTROL = 1
+PRIORITY_BULK = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: 'interactive',
+    PRIORITY_RESTORE_CONTROL: 'restore-control',
+    PRIORITY_BULK: 'bulk'
+}
+
+
+class BSchedulerQueueFullError(RuntimeError):
+    '''
+        Raised when too many commands of the priority class are already waiting
+    '''
+    pass
+
+
+class BSchedulerTimeoutError(RuntimeError):
+    '''
+        Raised when command wasn't admitted before its deadline
+    '''
+    pass
+
+
+class TokenBucket:
+    '''
+        Token bucket rate limiter: rate tokens per second, up to burst tokens stored.
+        Not thread safe, BCommandScheduler calls it under its own lock
+    '''
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self.tokens = self.burst
+        self.clock = clock
+        self.updated = clock()
+
+    def take(self):
+        '''takes one token and returns 0 or returns seconds till the next token is available'''
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class BSchedulerMetrics:
+    '''
+        Queue wait time statistics per priority class
+    '''
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__stats = {}
+        registerAfterFork(self)
+
+    def _afterFork(self):
+        self.__lock = threading.Lock()
+
+    def __get(self, priority):
+        return self.__stats.setdefault(priority, {'admitted': 0, 'rejected': 0, 'timeouts': 0, 'wait_total': 0.0, 'wait_max': 0.0})
+
+    def recordWait(self, priority, wait):
+        with self.__lock:
+            stats = self.__get(priority)
+            stats['admitted'] += 1
+            stats['wait_total'] += wait
+            stats['wait_max'] = max(stats['wait_max'], wait)
+
+    def recordRejected(self, priority):
+        with self.__lock:
+            self.__get(priority)['rejected'] += 1
+
+    def recordTimeout(self, priority):
+        with self.__lock:
+            self.__get(priority)['timeouts'] += 1
+
+    def as_dict(self):
+        with self.__lock:
+            result = {}
+            for priority, stats in self.__stats.items():
+                stats = dict(stats)
+                stats['wait_avg'] = stats['wait_total'] / stats['admitted'] if stats['admitted'] else 0.0
+                result[PRIORITY_NAMES.get(priority, priority)] = stats
+            return result
+
+
+class BCommandScheduler:
+    '''
+        Admission control for one director. Use one instance per director, it may be shared between
+        several BConsole objects (pass it as scheduler=...).
+        max_concurrency - sessions allowed to run commands at once (keep it below MaximumConsoleConnections)
+        rate, burst - token bucket limit of admitted commands per second (None disables it)
+        queue_size - maximum number of waiting commands per priority class
+        default_timeout - how long command may wait for admission if caller didn't set timeout
+        Waiting commands are admitted strictly by priority class, FIFO inside the class.
+    '''
+    def __init__(self, max_concurrency=4, rate=None, burst=None, queue_size=100, default_timeout=None, clock=time.monotonic):
+        self.maxConcurrency = max_concurrency
+        self.queueSize = queue_size
+        self.defaultTimeout = default_timeout
+        self.clock = clock
+        self.bucket = TokenBucket(rate, burst, clock=clock) if rate is not None else None
+        self.metrics = BSchedulerMetrics()
+        self.active = 0
+        self.__waiting = []
+        self.__queued = {}
+        self.__counter = itertools.count()
+        self.__cond = threading.Condition()
+        self.logger = logging.getLogger(self.__class__.__name__)
+        registerAfterFork(self)
+
+    def _afterFork(self):
+        # commands admitted or waiting in the parent don't run in the child
+        self.active = 0
+        self.__waiting = []
+        self.__queued = {}
+        self.__cond = threading.Condition()
+
+    def queued(self, priority=None):
+        '''number of waiting commands (of the priority class)'''
+        with self.__cond:
+            if priority is None:
+                return len(self.__waiting)
+            return self.__queued.get(priority, 0)
+
+    def __leaveQueue(self, ticket):
+        self.__waiting.remove(ticket)
+        heapq.heapify(self.__waiting)
+        self.__queued[ticket[0]] -= 1
+        self.__cond.notify_all()
+
+    def __acquire(self, priority, timeout):
+        start = self.clock()
+        if timeout is None:
+            timeout = self.defaultTimeout
+        deadline = None if timeout is None else start + timeout
+        with self.__cond:
+            if self.__queued.get(priority, 0) >= self.queueSize:
+                self.metrics.recordRejected(priority)
+                raise BSchedulerQueueFullError("Too many queued commands of class {}".format(PRIORITY_NAMES.get(priority, priority)))
+            ticket = (priority, next(self.__counter))
+            heapq.heappush(self.__waiting, ticket)
+            self.__queued[priority] = self.__queued.get(priority, 0) + 1
+            try:
+                while True:
+                    wait = None
+                    if self.__waiting[0] == ticket and self.active < self.maxConcurrency:
+                        wait = self.bucket.take() if self.bucket is not None else 0
+                        if wait == 0:
+                            break
+                    if deadline is not None:
+                        left = deadline - self.clock()
+                        if left <= 0:
+                            self.metrics.recordTimeout(priority)
+                            raise BSchedulerTimeoutError("Command wasn't admitted in {} seconds".format(timeout))
+                        wait = left if wait is None else min(wait, left)
+                    self.__cond.wait(wait)
+            except BaseException:
+                self.__leaveQueue(ticket)
+                raise
+            self.__leaveQueue(ticket)
+            self.active += 1
+        self.metrics.recordWait(priority, self.clock() - start)
+
+    def __release(self):
+        with self.__cond:
+            self.active -= 1
+            self.__cond.notify_all()
+
+    @contextmanager
+    def admit(self, priority=PRIORITY_INTERACTIVE, timeout=None):
+        '''waits until the command of the priority class may run'''
+        self.__acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self.__release()
@@ -0,0 +1,310 @@
+# Parsers for "status client/storage/director" output
+
+import re
+from datetime import datetime
+
+SIZE_SUFFIXES = {'': 1, 'K': 10**3, 'M': 10**6, 'G': 10**9, 'T': 10**12, 'P': 10**15, 'E': 10**18}
+
+STATUS_DATE_FORMAT = "%d-%b-%y %H:%M"
+
+
+def parseNumber(value):
+    '''"1,234" -> 1234'''
+    return int(value.replace(',', ''))
+
+
+def parseSize(value):
+    '''"123,456" -> 123456, "1.234 M" -> 1234000 (bacula uses decimal suffixes)'''
+    value = value.strip()
+    suffix = ''
+    if value and value[-1] in SIZE_SUFFIXES:
+        suffix = value[-1]
+        value = value[:-1].strip()
+    if suffix == '':
+        return parseNumber(value)
+    return int(float(value.replace(',', '')) * SIZE_SUFFIXES[suffix])
+
+
+def parseDate(value):
+    '''returns datetime or the original string if the director uses unknown date format'''
+    try:
+        return datetime.strptime(value.strip(), STATUS_DATE_FORMAT)
+    except ValueError:
+        return value
+
+
+class RunningJob:
+    def __init__(self, id, name=None):
+        self.id = id
+        self.name = name
+        self.type = None
+        self.level = None
+        self.status = None
+        self.started = None
+        self.files = None
+        self.bytes = None
+        self.rate = None
+        self.lastrate = None
+        self.errors = None
+        self.volume = None
+        self.device = None
+        self.processing = None
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+    def __eq__(self, other):
+        return self.__dict__ == other.__dict__
+
+
+class TerminatedJob:
+    def __init__(self, id, level, files, bytes, status, finished, name):
+        self.id = id
+        self.level = level
+        self.files = files
+        self.bytes = bytes
+        self.status = status
+        self.finished = finished
+        self.name = name
+
+    def isSuccess(self):
+        return self.status == 'OK'
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+    def __eq__(self, other):
+        return self.__dict__ == other.__dict__
+
+
+class ScheduledJob:
+    def __init__(self, level, type, priority, scheduled, name, volume):
+        self.level = level
+        self.type = type
+        self.priority = priority
+        self.scheduled = scheduled
+        self.name = name
+        self.volume = volume
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
+class DaemonStatus:
+    '''
+        Common part of the daemon status: version, start time and job lists
+    '''
+    def __init__(self):
+        self.name = None
+        self.version = None
+        self.releaseDate = None
+        self.started = None
+        self.jobsRun = None
+        self.jobsRunning = None
+        self.connected = True
+        self.error = None
+        self.running = []
+        self.terminated = []
+
+    def isRunning(self):
+        return self.connected and self.started is not None
+
+    def as_dict(self):
+        result = dict(self.__dict__)
+        for key in ('running', 'terminated', 'scheduled'):
+            if key in result:
+                result[key] = [job.as_dict() for job in result[key]]
+        return result
+
+
+class ClientStatus(DaemonStatus):
+    pass
+
+
+class StorageStatus(DaemonStatus):
+    pass
+
+
+class DirectorStatus(DaemonStatus):
+    def __init__(self):
+        super().__init__()
+        self.scheduled = []
+
+
+class DaemonStatusParser:
+    '''
+        Incremental parser of status output. Feed it with chunks of the director answer
+        as they arrive (chunk borders don't have to match line borders), then call close()
+    '''
+    RESULT_CLASS = DaemonStatus
+    CONNECTION_ERRORS = ("Failed to connect to",)
+
+    RE_VERSION = re.compile(r'^(\S+) Version: (\S+) \(([^)]+)\)')
+    RE_STARTED = re.compile(r'^\s*Daemon started ([^.,]+)')
+    RE_JOBS = re.compile(r'Jobs: run=(\d+),? running=(\d+)')
+    RE_TERMINATED = re.compile(
+        r'^\s*(\d+)\s+(?:(\w+)\s+)?([\d,]+)\s+([\d.,]+(?: [KMGTPE])?)\s+(.+?)\s+(\d\d-\w{3}-\d\d \d\d:\d\d)\s+(\S+)\s*$'
+    )
+    RE_COUNTERS = re.compile(r'Files=([\d,]+) Bytes=([\d,]+)(?: AveBytes/sec=([\d,]+))?(?: LastBytes/sec=([\d,]+))?(?: Errors=(\d+))?')
+    RE_PROCESSING = re.compile(r'^\s*Processing file: (.+)$')
+
+    SECTIONS = {
+        'Running Jobs:': 'running',
+        'Terminated Jobs:': 'terminated',
+    }
+
+    def __init__(self):
+        self.status = self.RESULT_CLASS()
+        self.section = None
+        self.job = None
+        self.__tail = ''
+
+    def feed(self, chunk):
+        lines = (self.__tail + chunk).split('\n')
+        self.__tail = lines.pop()
+        for line in lines:
+            self._parseLine(line)
+
+    def close(self):
+        if self.__tail:
+            self._parseLine(self.__tail)
+            self.__tail = ''
+        return self.status
+
+    def _parseLine(self, line):
+        stripped = line.strip()
+        if stripped in self.SECTIONS:
+            self.section = self.SECTIONS[stripped]
+            self.job = None
+            return
+        if stripped == '====':
+            self.section = None
+            self.job = None
+            return
+        if self.section is None:
+            self._parseHeader(line)
+        else:
+            handler = getattr(self, '_parse_' + self.section, None)
+            if handler is not None:
+                handler(line)
+
+    def _parseHeader(self, line):
+        for error in self.CONNECTION_ERRORS:
+            if error in line:
+                self.status.connected = False
+                self.status.error = line.strip()
+                return
+        mres = self.RE_VERSION.match(line)
+        if mres is not None:
+            self.status.name, self.status.version, self.status.releaseDate = mres.groups()
+            return
+        mres = self.RE_STARTED.match(line)
+        if mres is not None:
+            self.status.started = parseDate(mres.group(1))
+        mres = self.RE_JOBS.search(line)
+        if mres is not None:
+            self.status.jobsRun = int(mres.group(1))
+            self.status.jobsRunning = int(mres.group(2))
+
+    def _parseCounters(self, line):
+        if self.job is None:
+            return False
+        mres = self.RE_COUNTERS.search(line)
+        if mres is None:
+            mres = self.RE_PROCESSING.match(line)
+            if mres is not None:
+                self.job.processing = mres.group(1)
+                return True
+            return False
+        files, bytes, rate, lastrate, errors = mres.groups()
+        self.job.files = parseNumber(files)
+        self.job.bytes = parseNumber(bytes)
+        if rate is not None:
+            self.job.rate = parseNumber(rate)
+        if lastrate is not None:
+            self.job.lastrate = parseNumber(lastrate)
+        if errors is not None:
+            self.job.errors = int(errors)
+        return True
+
+    def _parse_terminated(self, line):
+        mres = self.RE_TERMINATED.match(line)
+        if mres is None:
+            return
+        id, level, files, bytes, status, finished, name = mres.groups()
+        self.status.terminated.append(
+            TerminatedJob(int(id), level, parseNumber(files), parseSize(bytes), status, parseDate(finished), name)
+        )
+
+
+class ClientStatusParser(DaemonStatusParser):
+    RESULT_CLASS = ClientStatus
+    RE_JOB = re.compile(r'^JobId (\d+) Job (\S+) is (.+?)\.?\s*$')
+    RE_JOB_STARTED = re.compile(r'^\s*(\w+) (\w+) Job started: (.+?)\s*$')
+
+    def _parse_running(self, line):
+        mres = self.RE_JOB.match(line)
+        if mres is not None:
+            self.job = RunningJob(int(mres.group(1)), mres.group(2))
+            self.job.status = mres.group(3)
+            self.status.running.append(self.job)
+            return
+        if self.job is None:
+            return
+        mres = self.RE_JOB_STARTED.match(line)
+        if mres is not None:
+            self.job.level, self.job.type = mres.group(1), mres.group(2)
+            self.job.started = parseDate(mres.group(3))
+            return
+        self._parseCounters(line)
+
+
+class StorageStatusParser(DaemonStatusParser):
+    RESULT_CLASS = StorageStatus
+    RE_JOB = re.compile(r'^(Writing|Reading): (\w+) (\w+) job (\S+) JobId=(\d+)(?: Volume="([^"]*)")?')
+    RE_DEVICE = re.compile(r'device="([^"]*)"')
+
+    def _parse_running(self, line):
+        mres = self.RE_JOB.match(line)
+        if mres is not None:
+            status, level, type, name, id, volume = mres.groups()
+            self.job = RunningJob(int(id), name)
+            self.job.status, self.job.level, self.job.type, self.job.volume = status, level, type, volume
+            self.status.running.append(self.job)
+            return
+        if self._parseCounters(line) or self.job is None:
+            return
+        mres = self.RE_DEVICE.search(line)
+        if mres is not None:
+            self.job.device = mres.group(1)
+
+
+class DirectorStatusParser(DaemonStatusParser):
+    RESULT_CLASS = DirectorStatus
+    RE_RUNNING = re.compile(
+        r'^\s*(\d+)\s+(?:(\w+)\s+(\w+)\s+([\d,]+)\s+([\d.,]+(?: [KMGTPE])?)\s+|(\w+)\s+)(\S+)\s+(.+?)\s*$'
+    )
+    RE_SCHEDULED = re.compile(r'^(\w+)\s+(\w+)\s+(\d+)\s+(\d\d-\w{3}-\d\d \d\d:\d\d)\s+(\S+)\s*(\S*)\s*$')
+
+    SECTIONS = dict(DaemonStatusParser.SECTIONS, **{'Scheduled Jobs:': 'scheduled'})
+
+    def _parse_running(self, line):
+        mres = self.RE_RUNNING.match(line)
+        if mres is None:
+            return
+        id, type, level, files, bytes, short_level, name, status = mres.groups()
+        job = RunningJob(int(id), name)
+        job.type = type
+        job.level = level if level is not None else short_level
+        job.status = status
+        if files is not None:
+            job.files = parseNumber(files)
+            job.bytes = parseSize(bytes)
+        self.status.running.append(job)
+
+    def _parse_scheduled(self, line):
+        mres = self.RE_SCHEDULED.match(line)
+        if mres is None:
+            return
+        level, type, priority, scheduled, name, volume = mres.groups()
+        self.status.scheduled.append(ScheduledJob(level, type, int(priority), parseDate(scheduled), name, volume or None))
@@ -0,0 +1,190 @@
+# Parser for director tables ("list", "llist" and ".sql" output)
+
+from datetime import datetime
+from operator import itemgetter
+from .status import parseNumber
+
+CATALOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# MySQL catalogs keep unset dates (e.g. endtime of a running job) as zero dates
+CATALOG_ZERO_DATES = ('0000-00-00 00:00:00', '0000-00-00')
+
+
+def _strptimeCatalogDate(value):
+    return datetime.strptime(value, CATALOG_DATE_FORMAT)
+
+
+# the catalog format is ISO 8601, fromisoformat (python 3.7+) parses it several times faster than strptime
+_parseDate = getattr(datetime, 'fromisoformat', _strptimeCatalogDate)
+
+
+def parseCatalogDate(value):
+    '''"2018-05-05 08:13:07" -> datetime, zero date -> None'''
+    if value in CATALOG_ZERO_DATES:
+        return None
+    return _parseDate(value)
+
+
+# converters for the usual catalog columns, pass them (or a part) to BTableParser
+JOB_COLUMN_CONVERTERS = {
+    'jobid': parseNumber,
+    'jobfiles': parseNumber,
+    'jobbytes': parseNumber,
+    'joberrors': parseNumber,
+    'priorjobid': parseNumber,
+    'starttime': parseCatalogDate,
+    'endtime': parseCatalogDate,
+    'schedtime': parseCatalogDate,
+    'realendtime': parseCatalogDate
+}
+
+
+class BTable:
+    '''
+        Parsed table: column names and rows as tuples (compact, use records() to get dicts)
+    '''
+    def __init__(self, columns):
+        self.columns = columns
+        self.rows = []
+
+    def __len__(self):
+        return len(self.rows)
+
+    def column(self, name):
+        index = self.columns.index(name)
+        return [row[index] for row in self.rows]
+
+    def records(self):
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in self.rows]
+
+
+class BTableParser:
+    '''
+        Incremental parser of director tables:
+            +-------+------------+
+            | jobid | name       |
+            +-------+------------+
+            |     5 | RestoreJob |
+            +-------+------------+
+        Column offsets are read once from the border line and every row is sliced by position,
+        so empty cells and values with "|" inside stay in their columns. Several tables in one
+        answer are returned as separate BTable objects.
+        The director pads cells by bytes, so a row with multibyte characters doesn't match the
+        border width; such rows are split by "|" instead.
+        converters - optional {column: function} applied to non-empty values, empty values become None
+    '''
+    STATE_OUTSIDE = 0
+    STATE_HEADER = 1
+    STATE_HEADER_END = 2
+    STATE_BODY = 3
+
+    def __init__(self, converters=None):
+        self.converters = converters or {}
+        self.tables = []
+        self.table = None
+        self.__state = self.STATE_OUTSIDE
+        self.__tail = ''
+        self.__width = 0
+        self.__getter = None
+        self.__convert = None
+
+    def parse(self, text):
+        '''parses the whole answer, returns list of BTable'''
+        self.feed(text)
+        return self.close()
+
+    def feed(self, chunk):
+        lines = (self.__tail + chunk).split('\n')
+        self.__tail = lines.pop()
+        self.__parseLines(lines)
+
+    def close(self):
+        if self.__tail:
+            self.__parseLines([self.__tail])
+            self.__tail = ''
+        self.__endTable()
+        return self.tables
+
+    def __compile(self, border):
+        positions = [i for i, c in enumerate(border) if c == '+']
+        slices = [slice(start + 1, end) for start, end in zip(positions, positions[1:])]
+        if len(slices) == 1:
+            cell = slices[0]
+            self.__getter = lambda line: (line[cell],)
+        else:
+            self.__getter = itemgetter(*slices)
+        self.__width = len(border)
+
+    def __split(self, line):
+        if len(line) == self.__width:
+            return tuple(map(str.strip, self.__getter(line)))
+        return tuple(v.strip() for v in line.strip()[1:-1].split('|'))
+
+    def __startTable(self, columns):
+        self.table = BTable(columns)
+        self.tables.append(self.table)
+        self.__convert = None
+        converters = [(i, self.converters[name]) for i, name in enumerate(columns) if name in self.converters]
+        if converters:
+            def convert(row):
+                row = list(row)
+                for i, converter in converters:
+                    row[i] = converter(row[i]) if row[i] != '' else None
+                return tuple(row)
+            self.__convert = convert
+
+    def __endTable(self):
+        self.table = None
+        self.__state = self.STATE_OUTSIDE
+
+    def __parseLines(self, lines):
+        lines = iter(lines)
+        for line in lines:
+            if self.__state == self.STATE_BODY:
+                line = self.__parseRows(line, lines)
+                if line is None:
+                    return
+            if self.__state == self.STATE_BODY:
+                if line.startswith('+-'):
+                    self.__endTable()
+                    continue
+                if line[:1] == '|':
+                    row = self.__split(line)
+                    if self.__convert is not None:
+                        row = self.__convert(row)
+                    self.table.rows.append(row)
+                    continue
+                self.__endTable()
+            elif self.__state == self.STATE_OUTSIDE:
+                if line.startswith('+-'):
+                    self.__compile(line.rstrip())
+                    self.__state = self.STATE_HEADER
+            elif self.__state == self.STATE_HEADER:
+                if line[:1] == '|':
+                    self.__startTable(list(self.__split(line)))
+                    self.__state = self.STATE_HEADER_END
+                else:
+                    self.__endTable()
+            elif self.__state == self.STATE_HEADER_END:
+                self.__state = self.STATE_BODY if line.startswith('+-') else self.STATE_OUTSIDE
+
+    def __parseRows(self, line, lines):
+        '''
+            hot path: consumes plain rows of the current table with everything in local variables,
+            returns the first line which isn't a plain row or None if lines are exhausted
+        '''
+        strip = str.strip
+        getter = self.__getter
+        width = self.__width
+        convert = self.__convert
+        append = self.table.rows.append
+        while True:
+            if line[:1] != '|' or len(line) != width:
+                return line
+            if convert is None:
+                append(tuple(map(strip, getter(line))))
+            else:
+                append(convert(tuple(map(strip, getter(line)))))
+            line = next(lines, None)
+            if line is None:
+                return None
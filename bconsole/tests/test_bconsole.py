@@ -3,14 +3,19 @@ import unittest
 import logging
 import socket
 import re
+import time
+import threading
+import zlib
 from datetime import datetime
 from unittest.mock import patch
 from struct import pack, unpack
-from bconsole.bconsole import BSocket, BConsole, BSocketWallet, JobStatus
+from bconsole.bconsole import BSocket, BConsole, BSocketWallet, JobStatus, BSocketConfig, BResolverCache, BConnector, BSocketTimeoutError, BSingleFlight, BConsoleCommandJobStatus, normalizeCommand, BFrameReader, BNET_COMPRESSED, BSocketClosedError
 
 #logging.basicConfig(filename='',level=logging.DEBUG)
 
 TEST_USER_AGENT = None
+TEST_DIR_HOST = '127.0.0.1'
+TEST_DIR_PORT = 9101
 DIR_TEST_PASSWORD = 'dirpassword12345'
 TEST_JOBID = '5'
 TEST_VERSION_ANSWER = '1000 OK: 102 dev-dir Version: 7.4.7 (16 March 2017)\n'
@@ -130,6 +135,70 @@ Using Catalog "DefaultCatalog"
 +-------+------------+---------------------+------+-------+----------+--------------------+-----------+
 '''
 
+CMD_CLIENTSTATUS_OUT = b'''Connecting to Client TestClient1 at 192.168.0.10:9102
+
+TestClient1-fd Version: 7.4.7 (16 March 2017)  x86_64-pc-linux-gnu redhat
+Daemon started 05-May-18 08:00. Jobs: run=1 running=0.
+No Jobs running.
+====
+
+Terminated Jobs:
+ JobId  Level    Files      Bytes   Status   Finished        Name
+===================================================================
+     3  Full          4    81.78 M  OK       05-Apr-18 05:51 TestClient1Job
+====
+'''
+
+CMD_LIST_VOLUMES_OUT = b'''Pool: Default
++---------+------------+-----------+---------+----------------+----------+--------------+---------+------+-----------+-----------+---------------------+
+| mediaid | volumename | volstatus | enabled | volbytes       | volfiles | volretention | recycle | slot | inchanger | mediatype | lastwritten         |
++---------+------------+-----------+---------+----------------+----------+--------------+---------+------+-----------+-----------+---------------------+
+|       1 | A00001L6   | Full      |       1 | 2,500,000,000  |      250 |   31,536,000 |       1 |    1 |         1 | LTO-6     | 2017-01-05 08:13:07 |
+|       2 | A00002L6   | Append    |       1 | 64,512         |        0 |   31,536,000 |       1 |    2 |         1 | LTO-6     | 2018-05-05 08:13:07 |
+|       3 | A00003L6   | Purged    |       1 | 1,000          |        1 |   31,536,000 |       1 |    0 |         0 | LTO-6     | 2018-04-05 08:13:07 |
++---------+------------+-----------+---------+----------------+----------+--------------+---------+------+-----------+-----------+---------------------+
+Pool: Scratch
++---------+------------+-----------+---------+----------------+----------+--------------+---------+------+-----------+-----------+---------------------+
+| mediaid | volumename | volstatus | enabled | volbytes       | volfiles | volretention | recycle | slot | inchanger | mediatype | lastwritten         |
++---------+------------+-----------+---------+----------------+----------+--------------+---------+------+-----------+-----------+---------------------+
+|       4 | A00004L6   | Append    |       1 | 0              |        0 |   31,536,000 |       1 |    3 |         1 | LTO-6     | 0000-00-00 00:00:00 |
++---------+------------+-----------+---------+----------------+----------+--------------+---------+------+-----------+-----------+---------------------+
+'''
+
+CMD_UPDATE_SLOTS_OUT = b'''Connecting to Storage daemon Autochanger at 192.168.0.20:9103 ...
+3306 Issuing autochanger "slots" command.
+Device "Autochanger" has 24 slots.
+Connecting to Storage daemon Autochanger at 192.168.0.20:9103 ...
+3306 Issuing autochanger "list" command.
+Catalog record for Volume "A00001L6" is up to date.
+Catalog record for Volume "A00002L6" updated to reference slot 2.
+Volume "A00009L6" not found in catalog. Slot=3 InChanger set to zero.
+'''
+
+CMD_LABEL0_OUT = b'''Connecting to Storage daemon Autochanger at 192.168.0.20:9103 ...
+3306 Issuing autochanger "list" command.
+The following Volumes will be labeled:
+Slot  Volume
+==============
+   4  A00004L6
+   5  A00005L6
+Do you want to label these Volumes? (yes|no): '''
+
+CMD_LABEL1_OUT = b'''Defined Pools:
+     1: Default
+     2: Scratch
+Select the Pool (1-2): '''
+
+CMD_LABEL2_OUT = b'''Connecting to Storage daemon Autochanger at 192.168.0.20:9103 ...
+Sending label command for Volume "A00004L6" Slot 4 ...
+3304 Issuing autochanger "load slot 4, drive 0" command.
+3000 OK label. VolBytes=64512 VolABytes=0 VolType=2 Volume="A00004L6" Device="Drive-0" (/dev/nst0)
+Catalog record for Volume "A00004L6", Slot 4 successfully created.
+Sending label command for Volume "A00005L6" Slot 5 ...
+3920 Cannot label "A00005L6" Volume because it is already labeled: "A00005L6"
+Label command failed for Volume A00005L6.
+'''
+
 STATES = {
     'AUTH0': [{
         'in': b'Hello *UserAgent* calling\n',
@@ -171,8 +240,63 @@ STATES = {
             'in': b'list jobid=5',
             'out': CMD_JOBSTATUS_OUT,
             'next': 'CMD'
+        },
+        {
+            'in': b'cancel jobid=7',
+            'out': b'Confirm cancel of 1 Job (yes/no):',
+            'next': 'CMD_CANCEL7'
+        },
+        {
+            'in': re.compile(r'^cancel jobid=[58]$'),
+            'out': b'Warning Job JobId=8 is not running.\n',
+            'next': 'CMD'
+        },
+        {
+            'in': b'rerun jobid=5',
+            'out': CMD_RESTORE2_OUT,
+            'next': 'CMD_RERUN5'
+        },
+        {
+            'in': b'list jobs client=TestClient1',
+            'out': CMD_JOBSTATUS_OUT,
+            'next': 'CMD'
+        },
+        {
+            'in': b'status client=TestClient1',
+            'out': CMD_CLIENTSTATUS_OUT,
+            'next': 'CMD'
+        },
+        {
+            'in': b'list volumes',
+            'out': CMD_LIST_VOLUMES_OUT,
+            'next': 'CMD'
+        },
+        {
+            'in': b'update slots storage=Autochanger drive=0 slots=1-3',
+            'out': CMD_UPDATE_SLOTS_OUT,
+            'next': 'CMD'
+        },
+        {
+            'in': b'label barcodes storage=Autochanger pool=Default drive=0 slots=4-5',
+            'out': CMD_LABEL0_OUT,
+            'next': 'CMD_LABEL1'
+        },
+        {
+            'in': b'label barcodes storage=Autochanger pool=Archive drive=0',
+            'out': CMD_LABEL1_OUT,
+            'next': 'CMD_LABEL2'
         }
     ],
+    'CMD_LABEL1': [{
+        'in': b'yes',
+        'out': CMD_LABEL1_OUT,
+        'next': 'CMD_LABEL2'
+    }],
+    'CMD_LABEL2': [{
+        'in': b'1',
+        'out': CMD_LABEL2_OUT,
+        'next': 'CMD'
+    }],
     'CMD_RESTORE1': [{
         'in': b'5',
         'out': CMD_RESTORE1_OUT,
@@ -225,6 +349,16 @@ STATES = {
         'out': b'Job queued. JobId=5',
         'next': 'CMD'
     }],
+    'CMD_CANCEL7': [{
+        'in': b'yes',
+        'out': b'3000 JobId=7 Job="BackupClient1.2018-05-05_08.13.05_07" marked to be canceled.\n',
+        'next': 'CMD'
+    }],
+    'CMD_RERUN5': [{
+        'in': b'yes',
+        'out': b'Job queued. JobId=9\n',
+        'next': 'CMD'
+    }],
     'END': [{
         'in': '',
         'out': '',
@@ -255,7 +389,7 @@ class FakeBaculaStateMachine:
         if type(condition_in) is str or type(condition_in) is bytes:
             if input == condition['in']:
                 return True
-        elif type(condition_in) is re._pattern_type:
+        elif isinstance(condition_in, re.Pattern):
             if condition['in'].match(self.__ensureString(input)):
                 return True
         else:
@@ -290,12 +424,24 @@ class FakeBaculaStateMachine:
         return self.next()
 
 
+def answerSignal(statem):
+    '''
+        after authentication the director ends a prompt of a dialog with BNET_SUB_PROMPT
+        and sends BNET_EOD only when the command is finished
+    '''
+    if statem.currentStateCondition['next'] in ('CMD', 'END'):
+        return -1
+    return -27
+
+
 class FakeBaculaServerSocket:
     """
         Mock object class which emulates bacula server answers via socket
     """
     def __init__(self, *args, **kwargs):
         self.isConnected = False
+        self.timeout = None
+        self.options = {}
         self.wallet = BSocketWallet(DIR_TEST_PASSWORD)
         self.recv_bytes = 0
         self.answer = None
@@ -313,6 +459,20 @@ class FakeBaculaServerSocket:
     def connect(self, conn_data):
         self.isConnected = True
 
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def gettimeout(self):
+        return self.timeout
+
+    def setsockopt(self, level, option, value):
+        self.options[(level, option)] = value
+
+    def recv_into(self, buffer, nbytes=0):
+        data = self.recv(nbytes or len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
     def close(self):
         self.isConnected = False
         self.isAuthenticated = False
@@ -339,6 +499,8 @@ class FakeBaculaServerSocket:
 
         state_answer = self.statem.output()
         answer = pack("!i", len(state_answer)) + state_answer
+        if not self.statem.currentState.startswith('AUTH'):
+            answer += pack("!i", answerSignal(self.statem))
         if size > 0:
             answer = answer[self.recv_bytes:(size + self.recv_bytes)]
             self.recv_bytes += size
@@ -356,7 +518,7 @@ def getFakeChallengeString(cls):
 class TestBSocket(unittest.TestCase):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.console = BConsole(None, None, DIR_TEST_PASSWORD, TEST_USER_AGENT)
+        self.console = BConsole(TEST_DIR_HOST, TEST_DIR_PORT, DIR_TEST_PASSWORD, TEST_USER_AGENT)
 
     def test_connection(self):
         self.assertEqual(self.console.getVersion()['director_version'], TEST_VERSION)
@@ -374,5 +536,334 @@ class TestBSocket(unittest.TestCase):
     def test_jobstatus(self):
         self.assertEqual(self.console.getJobStatus(TEST_JOBID), JobStatus(TEST_JOB_STATUS))
 
+    def test_jobs(self):
+        self.assertEqual(self.console.getJobs(client='TestClient1'), [JobStatus(TEST_JOB_STATUS)])
+
+    def test_cancel_jobs(self):
+        results = self.console.cancelJobs([7, 8])
+        self.assertEqual([(r.id, r.success) for r in results], [(7, True), (8, False)])
+        self.assertIn('not running', results[1].message)
+
+    def test_cancel_by_client(self):
+        results = self.console.cancelJobs(client='TestClient1')
+        self.assertEqual([(r.id, r.action) for r in results], [(5, 'cancel')])
+        self.assertFalse(results[0].success)
+        with self.assertRaises(ValueError):
+            self.console.cancelJobs()
+
+    def test_prompt_signal(self):
+        dir = BSocket(BSocketWallet(DIR_TEST_PASSWORD, TEST_DIR_HOST, TEST_DIR_PORT))
+        self.assertEqual(dir.cmd('cancel jobid=7'), 'Confirm cancel of 1 Job (yes/no):')
+        self.assertEqual(dir.answerSignal, -27)
+        self.assertTrue(dir.isAtPrompt())
+        self.assertIn('marked to be canceled', dir.cmd('yes'))
+        self.assertFalse(dir.isAtPrompt())
+
+    def test_rerun_jobs(self):
+        results = self.console.rerunJobs([5])
+        self.assertTrue(results[0].success)
+        self.assertEqual(results[0].newJobId, 9)
+
+    def test_client_status(self):
+        self.assertEqual(self.console.getClientStatus('TestClient1'), {'client_name': 'TestClient1', 'status': {'result': True}})
+        status = self.console.getClientStatusInfo('TestClient1')
+        self.assertEqual(status.version, TEST_VERSION)
+        self.assertEqual([(job.id, job.bytes) for job in status.terminated], [(3, 81780000)])
+
     def test_backup(self):
         pass
+
+
+class FakeStaticResolver:
+    def __init__(self, addresses):
+        self.addresses = addresses
+        self.invalidated = 0
+
+    def resolve(self, host, port):
+        return self.addresses
+
+    def invalidate(self, host=None, port=None):
+        self.invalidated += 1
+
+
+class FakeRacingSocket:
+    """
+        Socket which connects to ::1 slowly and refuses 10.0.0.1
+    """
+    instances = []
+
+    def __init__(self, family, type):
+        self.family = family
+        self.options = {}
+        self.closed = False
+        FakeRacingSocket.instances.append(self)
+
+    def settimeout(self, timeout):
+        pass
+
+    def setsockopt(self, level, option, value):
+        self.options[(level, option)] = value
+
+    def connect(self, sockaddr):
+        self.sockaddr = sockaddr
+        if sockaddr[0] == '::1':
+            time.sleep(0.5)
+        elif sockaddr[0] == '10.0.0.1':
+            raise ConnectionRefusedError()
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSilentSocket(FakeBaculaServerSocket):
+    def recv(self, size = 0):
+        raise socket.timeout("timed out")
+
+
+class TestBConnector(unittest.TestCase):
+    def setUp(self):
+        FakeRacingSocket.instances = []
+
+    def test_resolver_cache(self):
+        answer = [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', 9101))]
+        with patch('socket.getaddrinfo', return_value=answer) as getaddrinfo:
+            cache = BResolverCache(ttl=60)
+            self.assertEqual(cache.resolve('dir', 9101), [(socket.AF_INET, ('127.0.0.1', 9101))])
+            cache.resolve('dir', 9101)
+            self.assertEqual(getaddrinfo.call_count, 1)
+            cache.invalidate('dir', 9101)
+            cache.resolve('dir', 9101)
+            self.assertEqual(getaddrinfo.call_count, 2)
+
+    @patch('socket.socket', new=FakeRacingSocket)
+    def test_happy_eyeballs(self):
+        resolver = FakeStaticResolver([(socket.AF_INET6, ('::1', 9101, 0, 0)), (socket.AF_INET6, ('::2', 9101, 0, 0)), (socket.AF_INET, ('127.0.0.1', 9101))])
+        config = BSocketConfig(happy_eyeballs_delay=0.05, resolver=resolver)
+        sock = BConnector(config).connect('dir', 9101)
+        # families are interleaved, so IPv4 address is the second attempt
+        self.assertEqual(sock.sockaddr, ('127.0.0.1', 9101))
+        self.assertEqual(len(FakeRacingSocket.instances), 2)
+        self.assertEqual(sock.options[(socket.IPPROTO_TCP, socket.TCP_NODELAY)], 1)
+        self.assertEqual(sock.options[(socket.SOL_SOCKET, socket.SO_KEEPALIVE)], 1)
+
+    @patch('socket.socket', new=FakeRacingSocket)
+    def test_failed_attempt_starts_next(self):
+        resolver = FakeStaticResolver([(socket.AF_INET, ('10.0.0.1', 9101)), (socket.AF_INET6, ('::1', 9101, 0, 0))])
+        config = BSocketConfig(happy_eyeballs_delay=10, connect_timeout=0.1, resolver=resolver)
+        start = time.monotonic()
+        with self.assertRaises(OSError):
+            BConnector(config).connect('dir', 9101)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(resolver.invalidated, 1)
+
+    @patch.object(BSocket, '_BSocket__getChallengeString', getFakeChallengeString)
+    @patch('socket.socket', new=FakeSilentSocket)
+    def test_read_timeout(self):
+        dir = BSocket(BSocketWallet(DIR_TEST_PASSWORD, TEST_DIR_HOST, TEST_DIR_PORT))
+        with self.assertRaises(BSocketTimeoutError):
+            dir.cmd("version")
+        self.assertIsNone(dir.socket)
+        self.assertFalse(dir.isAuthenticated)
+
+    @patch.object(BSocket, '_BSocket__getChallengeString', getFakeChallengeString)
+    @patch('socket.socket', new=FakeBaculaServerSocket)
+    def test_pooled_session_reuse(self):
+        console = BConsole(TEST_DIR_HOST, TEST_DIR_PORT, DIR_TEST_PASSWORD, TEST_USER_AGENT)
+        with patch.object(BSocket, '_BSocket__authenticate', autospec=True, side_effect=BSocket._BSocket__authenticate) as authenticate:
+            self.assertEqual(console.getVersion()['director_version'], TEST_VERSION)
+            self.assertEqual(console.getVersion()['director_version'], TEST_VERSION)
+            self.assertEqual(authenticate.call_count, 1)
+        console.close()
+
+
+class TestBSingleFlight(unittest.TestCase):
+    def test_normalize(self):
+        self.assertEqual(normalizeCommand(" List   jobid=5 "), "list jobid=5")
+        flight = BSingleFlight()
+        self.assertTrue(flight.isReadOnly("status client=TestClient1"))
+        self.assertTrue(flight.isReadOnly("LIST jobs"))
+        self.assertFalse(flight.isReadOnly("cancel jobid=5"))
+        self.assertFalse(flight.isReadOnly("messages"))
+
+    def runConcurrently(self, flight, function, count=5):
+        results = []
+        errors = []
+
+        def worker():
+            try:
+                results.append(flight.do('key', function))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads, results, errors
+
+    def test_coalescing(self):
+        flight = BSingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def function():
+            calls.append(1)
+            release.wait()
+            return {'result': True}
+
+        threads, results, errors = self.runConcurrently(flight, function)
+        while flight.coalesced < 4:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(result is results[0] for result in results))
+        # finished call isn't cached
+        self.assertEqual(flight.do('key', lambda: 'new'), 'new')
+
+    def test_error_fan_out(self):
+        flight = BSingleFlight()
+        release = threading.Event()
+
+        def function():
+            release.wait()
+            raise RuntimeError("director is gone")
+
+        threads, results, errors = self.runConcurrently(flight, function, count=3)
+        while flight.coalesced < 2:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(errors), 3)
+
+    def test_console_jobstatus(self):
+        console = BConsole(TEST_DIR_HOST, TEST_DIR_PORT, DIR_TEST_PASSWORD, TEST_USER_AGENT)
+        calls = []
+        parsed = BConsoleCommandJobStatus(None, None, None)._parseTable(CMD_JOBSTATUS_OUT.decode('utf8'))
+
+        def run(command):
+            calls.append(command.getCommandText())
+            time.sleep(0.1)
+            return parsed
+
+        results = []
+        with patch.object(BConsoleCommandJobStatus, 'run', run):
+            threads = [threading.Thread(target=lambda: results.append(console.getJobStatus(TEST_JOBID))) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(calls, ['list jobid=5'])
+        self.assertTrue(all(result == JobStatus(TEST_JOB_STATUS) for result in results))
+        self.assertEqual(len(results), 5)
+
+
+class FakeStream:
+    def __init__(self, data, chunk_size):
+        self.data = data
+        self.chunkSize = chunk_size
+        self.calls = 0
+
+    def recv_into(self, view):
+        self.calls += 1
+        chunk = self.data[:min(self.chunkSize, len(view))]
+        self.data = self.data[len(chunk):]
+        view[:len(chunk)] = chunk
+        return len(chunk)
+
+
+class TestBFrameReader(unittest.TestCase):
+    def frames(self, *payloads, compressed=False):
+        data = b''
+        for payload in payloads:
+            if compressed:
+                payload = zlib.compress(payload)
+                data += pack("!i", len(payload) | BNET_COMPRESSED) + payload
+            else:
+                data += pack("!i", len(payload)) + payload
+        return data + pack("!i", -1)
+
+    def readAll(self, reader):
+        result = []
+        msg = reader.read()
+        while msg is not None:
+            result.append(msg)
+            msg = reader.read()
+        return result
+
+    def test_buffered_frames(self):
+        stream = FakeStream(self.frames(b'first', b'second', b'x' * 1000), 7)
+        reader = BFrameReader(stream.recv_into, buffer_size=16)
+        self.assertEqual(self.readAll(reader), [b'first', b'second', b'x' * 1000])
+        self.assertGreaterEqual(len(reader.buffer), 1000)
+
+    def test_small_frames_share_recv(self):
+        stream = FakeStream(self.frames(*[b'row'] * 100), 65536)
+        reader = BFrameReader(stream.recv_into)
+        self.assertEqual(len(self.readAll(reader)), 100)
+        self.assertEqual(stream.calls, 1)
+
+    def test_compressed_frames(self):
+        payload = b'| 1 | BackupClient1 |\n' * 1000
+        stream = FakeStream(self.frames(payload, b'tail', compressed=True), 1024)
+        reader = BFrameReader(stream.recv_into, compression='zlib')
+        self.assertEqual(self.readAll(reader), [payload, b'tail'])
+        self.assertLess(reader.receivedBytes, reader.payloadBytes / 10)
+
+    def test_decompression_limit(self):
+        stream = FakeStream(self.frames(b'x' * 100000, compressed=True), 65536)
+        reader = BFrameReader(stream.recv_into, compression='zlib', buffer_size=1024, max_frame_size=65536)
+        with self.assertRaises(RuntimeError):
+            reader.read()
+        # the output of the next frame is expected to be as big as the biggest one so far
+        reader = BFrameReader(FakeStream(self.frames(b'x' * 100000, compressed=True), 65536).recv_into, compression='zlib', buffer_size=1024)
+        self.assertEqual(len(reader.read()), 100000)
+        self.assertEqual(reader.decompressSize, 100000)
+
+    def test_eof(self):
+        # EOF at the frame header and inside the frame isn't the end of the answer
+        for data in (self.frames(b'first')[:-4], self.frames(b'first')[:6]):
+            reader = BFrameReader(FakeStream(data, 1024).recv_into)
+            with self.assertRaises(BSocketClosedError):
+                self.readAll(reader)
+
+    def test_compressed_frame_without_codec(self):
+        stream = FakeStream(self.frames(b'data', compressed=True), 1024)
+        with self.assertRaises(RuntimeError):
+            BFrameReader(stream.recv_into).read()
+
+    def test_config(self):
+        with self.assertRaises(ValueError):
+            BSocketConfig(compression='brotli')
+
+
+class TestBSocketSignals(unittest.TestCase):
+    def setUp(self):
+        self.server, client = socket.socketpair()
+        self.dir = BSocket(BSocketWallet(DIR_TEST_PASSWORD, TEST_DIR_HOST, TEST_DIR_PORT), config=BSocketConfig(read_timeout=5))
+        self.dir.attach(client, authenticated=True)
+
+    def tearDown(self):
+        self.server.close()
+        self.dir.close()
+
+    def answer(self, *frames):
+        self.server.sendall(b''.join(pack("!i", len(f)) + f if isinstance(f, bytes) else pack("!i", f) for f in frames))
+
+    def test_prompt_ends_answer(self):
+        # the director waits for "yes" here and sends BNET_EOD only after the whole command
+        self.answer(b'JobId 7: Job "Backup1" is running\n', b'Confirm cancel of 1 Job (yes/no): ', -27)
+        start = time.monotonic()
+        self.assertTrue(self.dir.cmd('cancel jobid=7').endswith('(yes/no): '))
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertTrue(self.dir.isAtPrompt())
+        self.answer(b'JobId 7: Job marked to be canceled.\n', -1)
+        self.assertEqual(self.dir.cmd('yes'), 'JobId 7: Job marked to be canceled.\n')
+        self.assertFalse(self.dir.isAtPrompt())
+
+    def test_informational_signals_skipped(self):
+        self.answer(-17, b'first\n', -6, b'second\n', -1)
+        self.assertEqual(self.dir.cmd('messages'), 'first\nsecond\n')
+        self.assertEqual(self.dir.answerSignal, -1)
@@ -0,0 +1,105 @@
+
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+from bconsole.bconsole import BConsole, BConsoleCommandSQL, JobStatus
+from bconsole.table import BTable
+
+JOBS = [
+    ['1', 'Backup1.2018-05-04_01.00.00_01', 'Backup1', 'TestClient1', 'B', 'F', 'T', '2018-05-04 01:00:00', '2018-05-04 02:00:00', '10', '1000'],
+    ['2', 'Backup2.2018-05-05_01.00.00_02', 'Backup2', 'TestClient2', 'B', 'I', 'R', '2018-05-05 01:00:00', None, '5', '500'],
+]
+
+JOB2_FINISHED = ['2', 'Backup2.2018-05-05_01.00.00_02', 'Backup2', 'TestClient2', 'B', 'I', 'T', '2018-05-05 01:00:00', '2018-05-05 03:00:00', '20', '2000']
+TEST_JOB = {'jobid': 1, 'starttime': None, 'jobstatus': 'T', 'jobfiles': 10, 'jobbytes': 1000, 'type': 'B', 'level': 'F'}
+JOB4_ZERO_DATES = ['4', 'Backup2.2018-05-07_01.00.00_04', 'Backup2', 'TestClient2', 'B', 'F', 'C', '0000-00-00 00:00:00', '0000-00-00 00:00:00', '0', '0']
+JOB3 = ['3', 'Backup1.2018-05-06_01.00.00_03', 'Backup1', 'TestClient1', 'B', 'I', 'E', '2018-05-06 01:00:00', '2018-05-06 01:10:00', '0', '0']
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestBJobCatalogMirror(unittest.TestCase):
+    def setUp(self):
+        self.queries = []
+        self.answers = [JOBS, [JOB2_FINISHED, JOB3]]
+        test = self
+
+        def run(command):
+            test.queries.append(command.query)
+            return [list(row) for row in test.answers.pop(0)]
+
+        patcher = patch.object(BConsoleCommandSQL, 'run', run)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.console = BConsole('127.0.0.1', 9101, 'dirpassword12345', None)
+        self.mirror = self.console.useCatalogMirror(max_staleness=60)
+        self.mirror.clock = self.clock = FakeClock()
+        self.addCleanup(self.console.close)
+
+    def test_reads_within_staleness(self):
+        job = self.console.getJobStatus(1)
+        self.assertEqual(job, JobStatus({'jobid': 1, 'starttime': datetime(2018, 5, 4, 1, 0), 'jobstatus': 'T', 'jobfiles': 10, 'jobbytes': 1000, 'type': 'B', 'level': 'F'}))
+        self.assertFalse(self.console.getJobStatus('2').isFinished())
+        self.assertEqual([job.id for job in self.console.getJobs(client='TestClient1')], [1])
+        self.assertEqual(len(self.queries), 1)
+        self.assertIn("Job.JobId > 0", self.queries[0])
+
+    def test_incremental_sync(self):
+        self.mirror.sync()
+        self.clock.now += 61
+        self.assertTrue(self.console.getJobStatus(2).isSuccess())
+        self.assertEqual(len(self.queries), 2)
+        # newer jobs, jobs finished since the last sync and unfinished jobs
+        self.assertIn("Job.JobId > 2", self.queries[1])
+        self.assertIn("Job.EndTime >= '2018-05-04 02:00:00'", self.queries[1])
+        self.assertIn("Job.JobId IN (2)", self.queries[1])
+        self.assertEqual([job.id for job in self.console.getJobs(status='T')], [2, 1])
+        self.assertEqual([job.id for job in self.console.getJobs(since=datetime(2018, 5, 5), limit=1)], [3])
+
+    def test_zero_dates(self):
+        self.answers = [[JOB4_ZERO_DATES], [JOB3]]
+        job = self.mirror.getJob(4)
+        self.assertEqual((job['starttime'], job['endtime']), (None, None))
+        self.assertEqual([job.id for job in self.console.getJobs(client='TestClient2')], [4])
+        self.clock.now += 61
+        self.mirror.sync()
+        # zero end time is stored as NULL, otherwise every job would match "Job.EndTime >= '0000-00-00 00:00:00'"
+        self.assertNotIn("Job.EndTime >=", self.queries[1])
+
+
+class TestBConsoleCommandSQL(unittest.TestCase):
+    def test_output(self):
+        command = BConsoleCommandSQL(None, 'SELECT 1, NULL, 3', None, columns=3)
+        self.assertEqual(command.getCommandText(), '.sql query="SELECT 1, NULL, 3"')
+        with patch.object(BConsoleCommandSQL, '_session') as session:
+            # every value is followed by a tab, the last one too
+            session.return_value.__enter__.return_value.iterCmd.return_value = iter(['Using Catalog "DefaultCatalog"\n1\t*None*', '\t3\t\n4\t\t6\t\n'])
+            self.assertEqual(command.run(), [['1', None, '3'], ['4', '', '6']])
+
+    def test_single_column(self):
+        command = BConsoleCommandSQL(None, 'SELECT JobId FROM Job', None, columns=1)
+        with patch.object(BConsoleCommandSQL, '_session') as session:
+            session.return_value.__enter__.return_value.iterCmd.return_value = iter(['Using Catalog "DefaultCatalog"\n5\t\n7\t\n'])
+            self.assertEqual(command.run(), [['5'], ['7']])
+
+    def test_wrong_width(self):
+        command = BConsoleCommandSQL(None, 'SELECT 1, 2, 3', None, columns=3)
+        with patch.object(BConsoleCommandSQL, '_session') as session:
+            session.return_value.__enter__.return_value.iterCmd.return_value = iter(['1\t2\t\n'])
+            with self.assertRaises(RuntimeError):
+                command.run()
+
+    def test_jobs_list_isnt_modified(self):
+        console = BConsole('127.0.0.1', 9101, 'dirpassword12345', None)
+        table = BTable(list(TEST_JOB))
+        table.rows = [tuple(dict(TEST_JOB, jobid=jobid).values()) for jobid in (1, 3, 2)]
+        with patch.object(BConsole, '_run', return_value=[table]):
+            self.assertEqual([job.id for job in console.getJobs()], [3, 2, 1])
+        # the answer may be shared with concurrent callers
+        self.assertEqual(table.column('jobid'), [1, 3, 2])
@@ -0,0 +1,176 @@
+
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+from bconsole.cli import main, readConfig, readCommands, parseAnswer, BBatchRunner
+from bconsole.replay import BSessionRecorder, DIRECTION_SEND, DIRECTION_RECEIVE, DIRECTION_SIGNAL
+from bconsole.tests.test_bconsole import TEST_DIR_HOST, TEST_VERSION, TEST_VERSION_ANSWER, CMD_JOBSTATUS_OUT, CMD_CLIENTSTATUS_OUT
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BCONSOLE_CONF = '''
+#
+# Bacula User Agent (or Console) Configuration File
+#
+Director {
+  Name = dev-dir
+  DIRport = 9102
+  address = backup.example.com
+  Password = "dirpassword12345"
+}
+'''
+
+COMMANDS = '''
+# read-only commands are pipelined
+version
+list jobs client=TestClient1
+
+status client=TestClient1
+'''
+
+
+LIST_JOBS_BAD_DATE = '''+-------+---------------+---------------------+------+-------+----------+----------+-----------+
+| jobid | name          | starttime           | type | level | jobfiles | jobbytes | jobstatus |
++-------+---------------+---------------------+------+-------+----------+----------+-----------+
+|     6 | BackupClient1 | 2018-13-05 08:13:07 | B    | F     |        0 |        0 | C         |
++-------+---------------+---------------------+------+-------+----------+----------+-----------+
+'''
+
+
+class FakeReader:
+    signal = -1
+
+
+class FakeBrokenSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed = 0
+        self.reader = FakeReader()
+
+    def send(self, cmd):
+        if cmd == 'status dir':
+            raise ConnectionResetError("Connection reset by peer")
+        self.sent.append(cmd)
+
+    def receive(self, decode=True):
+        return None
+
+    def close(self):
+        self.closed += 1
+
+
+class FakePromptSocket:
+    '''answers every command with the scripted frames, an int is a signal'''
+    def __init__(self, answers):
+        self.answers = answers
+        self.frames = []
+        self.sent = []
+        self.reader = FakeReader()
+
+    def send(self, cmd):
+        self.sent.append(cmd)
+        self.frames.extend(self.answers[cmd])
+
+    def receive(self, decode=True):
+        frame = self.frames.pop(0)
+        if isinstance(frame, int):
+            self.reader.signal = frame
+            return None
+        return frame
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        for name in os.listdir(self.tmp):
+            os.unlink(os.path.join(self.tmp, name))
+        os.rmdir(self.tmp)
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def test_config(self):
+        self.assertEqual(readConfig(self.write('bconsole.conf', BCONSOLE_CONF)), ('backup.example.com', 9102, 'dirpassword12345'))
+
+    def test_commands(self):
+        self.assertEqual(list(readCommands(COMMANDS.splitlines())), ['version', 'list jobs client=TestClient1', 'status client=TestClient1'])
+
+    def test_parse_answer(self):
+        self.assertEqual(parseAnswer('version', '1000 OK: 102 dev-dir Version: 7.4.7 (16 March 2017)\n'), {'version': '7.4.7'})
+        self.assertIsNone(parseAnswer('messages', 'You have no messages.\n'))
+
+    def test_parse_error(self):
+        with self.assertRaises(ValueError):
+            parseAnswer('list jobs', LIST_JOBS_BAD_DATE)
+
+    def test_pipelined_replay(self):
+        commands = list(readCommands(COMMANDS.splitlines())) + ['list jobs']
+        answers = [TEST_VERSION_ANSWER.encode('utf8'), CMD_JOBSTATUS_OUT, CMD_CLIENTSTATUS_OUT, LIST_JOBS_BAD_DATE.encode('utf8')]
+        recording = os.path.join(self.tmp, 'session.bcrp')
+        with BSessionRecorder(recording) as recorder:
+            for cmd, answer in zip(commands, answers):
+                recorder.record(1, DIRECTION_SEND, cmd.encode('utf8'))
+                recorder.record(1, DIRECTION_RECEIVE, answer)
+                if cmd == 'version':
+                    # the director notifies about queued messages before the end of the answer
+                    recorder.record(1, DIRECTION_SIGNAL, signal=-17)
+                recorder.record(1, DIRECTION_SIGNAL, signal=-1)
+        output = os.path.join(self.tmp, 'results.jsonl')
+        self.assertEqual(main(['--replay', recording, '-f', self.write('commands.txt', '\n'.join(commands)), '-o', output]), 0)
+        with open(output) as f:
+            results = [json.loads(line) for line in f]
+        self.assertEqual([result['command'] for result in results], commands)
+        self.assertEqual(results[0]['data'], {'version': TEST_VERSION})
+        rows = results[1]['data']['tables'][0]['rows']
+        self.assertEqual((rows[0]['jobid'], rows[0]['starttime']), (5, '2018-05-05T08:13:07'))
+        self.assertEqual(results[2]['data']['version'], TEST_VERSION)
+        # answer which can't be parsed is written as text, the batch goes on
+        self.assertEqual(results[3]['text'], LIST_JOBS_BAD_DATE)
+        self.assertIn('parse_error', results[3])
+
+    def test_errors(self):
+        dir = FakeBrokenSocket()
+        output = io.StringIO()
+        failed = BBatchRunner(dir, output).run(['version', 'status dir', 'delete volume=Vol1'])
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(failed, 2)
+        self.assertEqual([result['command'] for result in results], ['version', 'status dir', 'delete volume=Vol1'])
+        # pipelined "version" was in flight when the connection broke
+        self.assertEqual(results[0]['error'], "Connection reset by peer")
+        self.assertEqual(results[2]['text'], '')
+        self.assertEqual(dir.sent, ['version', 'delete volume=Vol1'])
+
+    def test_prompt(self):
+        dir = FakePromptSocket({
+            'cancel jobid=7': [b'Confirm cancel of 1 Job (yes/no): ', -27],
+            'yes': [b'JobId 7: Job marked to be canceled.\n', -1],
+            'version': [TEST_VERSION_ANSWER.encode('utf8'), -1],
+        })
+        output = io.StringIO()
+        self.assertEqual(BBatchRunner(dir, output, raw=True).run(['cancel jobid=7', 'yes', 'version']), 0)
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertTrue(results[0]['prompt'])
+        self.assertEqual(results[1]['text'], 'JobId 7: Job marked to be canceled.\n')
+        self.assertNotIn('prompt', results[1])
+        self.assertEqual(dir.sent, ['cancel jobid=7', 'yes', 'version'])
+
+    def test_lazy_imports(self):
+        # parsers and features are loaded by the commands which use them
+        code = "import sys, bconsole.cli; print(' '.join(sorted(m for m in sys.modules if m.startswith('bconsole.'))))"
+        modules = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, check=True, cwd=ROOT_DIR).stdout.decode().split()
+        self.assertEqual(modules, ['bconsole.bconsole', 'bconsole.cli', 'bconsole.forksafe', 'bconsole.scheduler'])
+
+    def test_missing_password(self):
+        with patch.dict(os.environ, {}, clear=True), patch('sys.stderr', new=io.StringIO()):
+            with self.assertRaises(SystemExit):
+                main(['-H', TEST_DIR_HOST, '-f', self.write('commands.txt', COMMANDS)])
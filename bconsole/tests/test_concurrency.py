@@ -0,0 +1,268 @@
+
+import multiprocessing
+import os
+import pickle
+import tempfile
+import socket
+import socketserver
+import threading
+import unittest
+from struct import pack, unpack
+from unittest.mock import patch
+from bconsole.bconsole import BSocket, BConsole, BSocketConfig, DEFAULT_RESOLVER_CACHE, BSocketWallet, JobStatus, BConsoleCommandRestore
+from bconsole.fanout import BCall, fanOut
+from bconsole.replay import BSessionRecorder, iterRecords, DIRECTION_SEND
+from bconsole.tests.test_bconsole import (FakeBaculaStateMachine, STATES, answerSignal, getFakeChallengeString, DIR_TEST_PASSWORD, TEST_USER_AGENT,
+                                          TEST_VERSION, TEST_VERSION_ANSWER, TEST_JOB_STATUS)
+
+THREADS = 16
+ITERATIONS = 20
+
+
+class FakeDirectorHandler(socketserver.BaseRequestHandler):
+    '''
+        One director connection driven by the test state machine: after authentication a prompt
+        of a dialog ends with BNET_SUB_PROMPT and a finished command with BNET_EOD (see answerSignal)
+    '''
+    def __read(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def handle(self):
+        self.server.connections.add(self.request)
+        statem = FakeBaculaStateMachine('AUTH0', STATES)
+        while True:
+            header = self.__read(4)
+            if header is None:
+                return
+            size = unpack("!i", header)[0]
+            message = self.__read(size) if size > 0 else b''
+            if message is None or message == b'quit':
+                return
+            self.server.commands += 1
+            try:
+                answer = statem.next(message)
+            except Exception:
+                return
+            if isinstance(answer, str):
+                answer = answer.encode('utf8')
+            data = pack("!i", len(answer)) + answer
+            if not statem.currentState.startswith('AUTH'):
+                data += pack("!i", answerSignal(statem))
+            self.request.sendall(data)
+
+
+class FakeDirector(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeDirectorHandler)
+        self.commands = 0
+        self.connections = set()
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def dropConnections(self):
+        '''closes all client connections as the restarted director does'''
+        for connection in list(self.connections):
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.connections.clear()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def runThreads(count, worker):
+    errors = []
+
+    def run(number):
+        try:
+            worker(number)
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(number,)) for number in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    return errors
+
+
+@patch.object(BSocket, '_BSocket__getChallengeString', getFakeChallengeString)
+class TestConcurrency(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.director = FakeDirector()
+        cls.host, cls.port = cls.director.server_address
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.director.stop()
+
+    def setUp(self):
+        self.console = BConsole(self.host, self.port, DIR_TEST_PASSWORD, TEST_USER_AGENT, pool_size=4, coalesce=False)
+
+    def tearDown(self):
+        self.console.close()
+
+    def test_threads_share_console(self):
+        def worker(number):
+            for i in range(ITERATIONS):
+                if (number + i) % 3 == 0:
+                    self.assertEqual(self.console.getVersion()['director_version'], TEST_VERSION)
+                elif (number + i) % 3 == 1:
+                    self.assertEqual(self.console.getJobStatus(5), JobStatus(TEST_JOB_STATUS))
+                else:
+                    self.assertEqual(self.console.getClientStatusInfo('TestClient1').version, TEST_VERSION)
+
+        self.assertEqual(runThreads(THREADS, worker), [])
+
+    def test_prompt(self):
+        dir = BSocket(BSocketWallet(DIR_TEST_PASSWORD, self.host, self.port), config=BSocketConfig(read_timeout=5))
+        try:
+            self.assertEqual(dir.cmd('cancel jobid=7'), 'Confirm cancel of 1 Job (yes/no):')
+            self.assertTrue(dir.isAtPrompt())
+            self.assertIn('marked to be canceled', dir.cmd('yes'))
+            self.assertEqual(dir.cmd('version'), TEST_VERSION_ANSWER)
+        finally:
+            dir.close()
+
+    def test_shared_socket(self):
+        dir = BSocket(BSocketWallet(DIR_TEST_PASSWORD, self.host, self.port))
+
+        def worker(number):
+            for i in range(ITERATIONS):
+                self.assertEqual(dir.cmd('version'), TEST_VERSION_ANSWER)
+                self.assertIn('RestoreJob', dir.cmd('list jobid=5'))
+
+        try:
+            self.assertEqual(runThreads(8, worker), [])
+        finally:
+            dir.close()
+
+    def test_dropped_idle_session(self):
+        self.assertEqual(self.console.getVersion()['director_version'], TEST_VERSION)
+        self.director.dropConnections()
+        # the idle session is reconnected instead of answering from the closed connection
+        self.assertEqual(self.console.getVersion()['director_version'], TEST_VERSION)
+        self.assertEqual(self.console.getJobStatus(5), JobStatus(TEST_JOB_STATUS))
+
+    def test_dropped_connection(self):
+        dir = BSocket(BSocketWallet(DIR_TEST_PASSWORD, self.host, self.port))
+        try:
+            self.assertEqual(dir.cmd('version'), TEST_VERSION_ANSWER)
+            self.director.dropConnections()
+            with self.assertRaises(ConnectionError):
+                dir.cmd('version')
+            self.assertIsNone(dir.socket)
+            self.assertFalse(dir.isAuthenticated)
+            self.assertEqual(dir.cmd('version'), TEST_VERSION_ANSWER)
+        finally:
+            dir.close()
+
+    def test_restore_defaults(self):
+        command = BConsoleCommandRestore(self.console.wallet, 'RestoreFromClient1', 'RestoreToClient1', '/tmp/restore', None, TEST_USER_AGENT)
+        command.excludeFromRestore.append('/opt/DATA1/exclude1')
+        other = BConsoleCommandRestore(self.console.wallet, 'RestoreFromClient1', 'RestoreToClient1', '/tmp/restore', None, TEST_USER_AGENT)
+        self.assertEqual((other.filesToRestore, other.excludeFromRestore), ([], []))
+
+    def test_fan_out_threads(self):
+        calls = [BCall('getJobStatus', 5) for _ in range(20)] + [BCall('cancelJobs')] + [BCall('getVersion') for _ in range(20)]
+        results = fanOut(self.console, calls, max_workers=8)
+        self.assertEqual([result.call for result in results], calls)
+        self.assertTrue(all(result.result == JobStatus(TEST_JOB_STATUS) for result in results[:20]))
+        self.assertIsInstance(results[20].error, ValueError)
+        self.assertTrue(all(result.result['director_version'] == TEST_VERSION for result in results[21:]))
+
+    @unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), "fork start method isn't available")
+    def test_fan_out_processes(self):
+        calls = [BCall('getVersion') for _ in range(6)] + [BCall('getJobs', client='TestClient1')]
+        results = fanOut(self.console, calls, max_workers=2, processes=True, mp_context=multiprocessing.get_context('fork'))
+        self.assertTrue(all(result.isSuccess() for result in results), results)
+        self.assertEqual(results[-1].result, [JobStatus(TEST_JOB_STATUS)])
+
+    def test_fan_out_config(self):
+        console = BConsole(self.host, self.port, DIR_TEST_PASSWORD, TEST_USER_AGENT, config=BSocketConfig(read_timeout=5, compression='zlib'))
+        with patch('bconsole.fanout.ProcessPoolExecutor') as executor:
+            fanOut(console, [], processes=True)
+        # process workers get the console config, it survives pickling for spawned workers
+        config = pickle.loads(pickle.dumps(executor.call_args[1]['initargs'][2]))
+        self.assertEqual((config.readTimeout, config.compression), (5, 'zlib'))
+        self.assertIs(config.resolver, DEFAULT_RESOLVER_CACHE)
+
+    def test_iterator_finalized_in_other_thread(self):
+        dir = BSocket(BSocketWallet(DIR_TEST_PASSWORD, self.host, self.port))
+        answer = dir.iterCmd('version')
+        self.assertEqual(next(answer), TEST_VERSION_ANSWER)
+        self.assertEqual(runThreads(1, lambda number: answer.close()), [])
+
+        def worker(number):
+            # the lock isn't left owned by the thread which started the iterator
+            self.assertTrue(dir.lock.acquire(blocking=False))
+            dir.lock.release()
+
+        self.assertEqual(runThreads(1, worker), [])
+        dir.abort()
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "os.fork isn't available")
+    def test_fork_recorder(self):
+        fd, path = tempfile.mkstemp(suffix='.bcrp')
+        os.close(fd)
+        self.addCleanup(os.unlink, path)
+        recorder = BSessionRecorder(path)
+        recorder.record(1, DIRECTION_SEND, b'version')
+        pid = os.fork()
+        if pid == 0:
+            # the child doesn't record and doesn't write the frames buffered in the parent once more
+            recorder.record(2, DIRECTION_SEND, b'status dir')
+            recorder.close()
+            os._exit(0)
+        os.waitpid(pid, 0)
+        recorder.record(1, DIRECTION_SEND, b'list jobs')
+        recorder.close()
+        with open(path, 'rb') as f:
+            records = list(iterRecords(f.read()))
+        self.assertEqual([bytes(record.payload) for record in records], [b'version', b'list jobs'])
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "os.fork isn't available")
+    def test_fork(self):
+        session = self.console.pool.acquire()
+        self.assertEqual(session.cmd('version'), TEST_VERSION_ANSWER)
+        self.console.pool.release(session)
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                # the inherited connection is dropped, the child connects own session
+                if session.socket is None and self.console.getVersion()['director_version'] == TEST_VERSION:
+                    code = 0
+            finally:
+                os._exit(code)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.WEXITSTATUS(status), 0)
+        # the parent session wasn't touched by the child
+        self.assertTrue(session.isAuthenticated)
+        self.assertIs(self.console.pool.acquire(), session)
+        self.assertEqual(session.cmd('version'), TEST_VERSION_ANSWER)
+        self.console.pool.release(session)
+
+    def test_inherited_socket_without_fork_hook(self):
+        dir = BSocket(BSocketWallet(DIR_TEST_PASSWORD, self.host, self.port))
+        self.assertEqual(dir.cmd('version'), TEST_VERSION_ANSWER)
+        inherited = dir.socket
+        # as if the process was forked without os.register_at_fork
+        dir._BSocket__pid = -1
+        self.assertEqual(dir.cmd('version'), TEST_VERSION_ANSWER)
+        self.assertIsNot(dir.socket, inherited)
+        dir.close()
@@ -0,0 +1,54 @@
+
+import unittest
+from unittest.mock import patch
+from bconsole.bconsole import BConsole, BConsoleCommandEstimate
+from bconsole.estimate import EstimateParser
+
+ESTIMATE_OUT = b'''Using Catalog "DefaultCatalog"
+Connecting to Client TestClient1 at 192.168.0.10:9102
+drwxr-xr-x   2 root     root             4096 2018-05-05 08:13:07  /etc/
+-rw-r--r--   1 root     root             1234 2018-05-05 08:13:07  /etc/passwd
+-rw-r--r--   1 root     root              766 2018-05-05 08:13:07  /etc/group
+-rw-------   1 postgres postgres    104857600 2018-05-05 08:13:07  /var/lib/pgsql/data/base/1/1259
+-rw-------   1 postgres postgres     52428800 2018-05-05 08:13:07  /var/lib/pgsql/data/base/1/1260
+-rw-r--r--   1 root     root          1048576 2018-05-05 08:13:07  /var/log/messages
+lrwxrwxrwx   1 root     root                7 2018-05-05 08:13:07  /bin
+-rw-r--r--   1 user     user               10 2018-05-05 08:13:07  /home/user/\xff\xfe name with  spaces
+2000 OK estimate files=8 bytes=158,336,986
+'''
+
+
+class TestEstimateParser(unittest.TestCase):
+    def parse(self, chunk_size, **kwargs):
+        parser = EstimateParser(**kwargs)
+        for i in range(0, len(ESTIMATE_OUT), chunk_size):
+            parser.feed(ESTIMATE_OUT[i:i + chunk_size])
+        return parser.close()
+
+    def test_totals(self):
+        summary = self.parse(13)
+        self.assertEqual(summary.files, 8)
+        self.assertEqual(summary.directories, 1)
+        self.assertEqual(summary.bytes, 1234 + 766 + 104857600 + 52428800 + 1048576 + 10)
+        # the listing totals match the director numbers: bytes of regular files only
+        self.assertEqual((summary.directorFiles, summary.directorBytes), (8, summary.bytes))
+        self.assertEqual(summary.topDirectories[:3], [('/var/lib/pgsql', 157286400, 2), ('/var/log', 1048576, 1), ('/etc', 2000, 2)])
+        self.assertEqual(summary.as_dict(), self.parse(4096).as_dict())
+
+    def test_top_and_depth(self):
+        summary = self.parse(4096, top=1, depth=1)
+        self.assertEqual(summary.topDirectories, [('/var', 158334976, 3)])
+
+    def test_console(self):
+        commands = []
+
+        def iterCmd(cmd, decode=True):
+            commands.append((cmd, decode))
+            yield ESTIMATE_OUT
+
+        console = BConsole('127.0.0.1', 9101, 'dirpassword12345', None)
+        with patch.object(BConsoleCommandEstimate, '_session') as session:
+            session.return_value.__enter__.return_value.iterCmd = iterCmd
+            summary = console.estimate('BackupClient1', client='TestClient1', level='Full')
+        self.assertEqual(commands, [('estimate job=BackupClient1 client=TestClient1 level=Full listing', False)])
+        self.assertEqual(summary.files, 8)
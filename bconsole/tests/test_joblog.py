@@ -0,0 +1,100 @@
+
+import unittest
+import gzip
+import io
+import os
+import tempfile
+from unittest.mock import patch
+from bconsole.bconsole import BConsole, BConsoleCommandStream
+from bconsole.joblog import BLogIndexer, BLogWriter
+
+JOBLOG_OUT = b'''           time: 2018-05-05 08:13:07
+        logtext: dev-dir JobId 5: Start Restore Job RestoreJob.2018-05-05_08.13.05_03
+
+           time: 2018-05-05 08:13:08
+        logtext: TestClient1-fd JobId 5: Warning: Cannot stat /opt/DATA1/\xff\xfe: ERR=No such file or directory
+
+           time: 2018-05-05 08:13:09
+        logtext: dev-dir JobId 5: Error: Bacula dev-dir 7.4.7 (16Mar17): Restore Error
+           time: 2018-05-05 08:13:10
+        logtext: dev-sd JobId 5: Fatal error: read.c:123 Read error
+           time: 2018-05-05 08:13:11
+        logtext: dev-dir JobId 5: Bacula dev-dir 7.4.7 (16Mar17):
+  FD Errors:              0
+  SD Errors:              0
+  Non-fatal FD errors:    0
+  Termination:            *** Restore Error ***'''
+
+
+class TestBLogIndexer(unittest.TestCase):
+    def index(self, chunk_size):
+        indexer = BLogIndexer()
+        lines = []
+        for i in range(0, len(JOBLOG_OUT), chunk_size):
+            lines.extend(indexer.feed(JOBLOG_OUT[i:i + chunk_size]))
+        lines.extend(indexer.close())
+        return indexer.index, lines
+
+    def test_offsets(self):
+        index, lines = self.index(7)
+        self.assertEqual(lines, JOBLOG_OUT.split(b'\n'))
+        self.assertEqual(index.size, len(JOBLOG_OUT))
+        self.assertEqual(index.counts, {'fatal': 1, 'error': 1, 'warning': 1})
+        self.assertEqual([entry.severity for entry in index.entries], ['warning', 'error', 'fatal'])
+        for entry in index.entries:
+            self.assertTrue(JOBLOG_OUT[entry.offset:].startswith(b'        logtext:'))
+            self.assertEqual(entry.jobId, 5)
+        self.assertEqual(index.entries[0].lineNumber, 4)
+        self.assertEqual(len(index.errors()), 2)
+        self.assertEqual(index.as_dict(), self.index(4096)[0].as_dict())
+
+
+class TestBLogWriter(unittest.TestCase):
+    def test_gzip_file_object(self):
+        output = io.BytesIO()
+        with BLogWriter(output, 'gzip') as writer:
+            writer.write(JOBLOG_OUT)
+        self.assertEqual(gzip.decompress(output.getvalue()), JOBLOG_OUT)
+        self.assertFalse(output.closed)
+
+    def test_unknown_compression(self):
+        with self.assertRaises(ValueError):
+            BLogWriter(io.BytesIO(), 'zip')
+
+
+class TestStreamJobLog(unittest.TestCase):
+    def setUp(self):
+        self.commands = []
+        test = self
+
+        def run(command):
+            test.commands.append(command.cmd)
+            for i in range(0, len(JOBLOG_OUT), 100):
+                yield JOBLOG_OUT[i:i + 100]
+
+        patcher = patch.object(BConsoleCommandStream, 'run', run)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.console = BConsole('127.0.0.1', 9101, 'dirpassword12345', None)
+
+    def test_stream_to_path(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'job5.log.xz')
+            index = self.console.streamJobLog(5, path, compression='xz')
+            import lzma
+            with lzma.open(path) as f:
+                self.assertEqual(f.read(), JOBLOG_OUT)
+        self.assertEqual(self.commands, ['llist joblog jobid=5'])
+        self.assertEqual(index.counts['error'], 1)
+
+    def test_messages(self):
+        output = io.BytesIO()
+        index = self.console.streamMessages(output)
+        self.assertEqual(output.getvalue(), JOBLOG_OUT)
+        self.assertEqual(self.commands, ['messages'])
+        self.assertEqual(len(index.entries), 3)
+
+    def test_iterator(self):
+        lines = list(self.console.iterJobLog(5))
+        self.assertEqual(len(lines), len(JOBLOG_OUT.split(b'\n')))
+        self.assertIn('�', lines[4])
@@ -0,0 +1,125 @@
+
+import unittest
+from contextlib import contextmanager
+from bconsole.monitor import JobThroughputMonitor, JobThroughput
+from bconsole.bconsole import BSessionPool, BSocketWallet
+from bconsole.scheduler import BCommandScheduler, BSchedulerTimeoutError, PRIORITY_BULK
+
+DIR_STATUS_OUT = '''dev-dir Version: 9.4.2 (04 February 2019) x86_64-pc-linux-gnu redhat
+Daemon started 05-Feb-19 10:00, conf reloaded 05-Feb-2019 10:00:00
+
+Running Jobs:
+Console connected at 05-Feb-19 10:05
+ JobId  Type Level     Files     Bytes  Name              Status
+======================================================================
+    12  Back Full      {files}    {bytes} BackupClient1     is running
+    13  Rest Full          0         0  RestoreJob        is running
+====
+'''
+
+CLIENT_STATUS_OUT = '''TestClient1-fd Version: 9.4.2 (04 February 2019)  x86_64-pc-linux-gnu redhat
+Daemon started 05-Feb-19 10:00. Jobs: run=12 running=1.
+
+Running Jobs:
+JobId 12 Job BackupClient1.2019-02-05_10.00.00_03 is running.
+    Full Backup Job started: 05-Feb-19 10:00
+    Files={files} Bytes={bytes} AveBytes/sec=1,000 LastBytes/sec=1,000 Errors=0
+====
+'''
+
+
+class FakeSession:
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.commands = []
+
+    def iterCmd(self, cmd):
+        self.commands.append(cmd)
+        template = DIR_STATUS_OUT if cmd == 'status dir' else CLIENT_STATUS_OUT
+        yield template.format(files=self.files, bytes=self.bytes)
+
+
+class FakePool:
+    def __init__(self):
+        self.dir = FakeSession()
+        self.acquired = 0
+        self.priorities = []
+
+    @contextmanager
+    def session(self, priority=None, timeout=None):
+        self.acquired += 1
+        self.priorities.append(priority)
+        yield self.dir
+
+
+class FakeConsole:
+    def __init__(self):
+        self.pool = FakePool()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestJobThroughputMonitor(unittest.TestCase):
+    def setUp(self):
+        self.console = FakeConsole()
+        self.clock = FakeClock()
+        self.monitor = JobThroughputMonitor(self.console, clients=['TestClient1'], min_interval=5, window=3, stall_time=20, clock=self.clock)
+
+    def step(self, seconds, files, bytes):
+        self.clock.now += seconds
+        self.console.pool.dir.files = files
+        self.console.pool.dir.bytes = bytes
+        return self.monitor.sample()
+
+    def test_rates(self):
+        self.step(0, 0, 0)
+        self.step(10, 100, 10000)
+        self.step(10, 300, 30000)
+        job = self.monitor.rates()[12]
+        self.assertEqual(job.bytesRate(), 1500)
+        self.assertEqual(job.filesRate(), 15)
+        self.assertEqual(job.lastBytesRate(), 2000)
+        self.assertEqual(job.eta(60000), 20)
+        self.assertEqual(set(self.monitor.rates()), {12, 13})
+        # the ring buffer keeps only last samples
+        self.step(10, 400, 40000)
+        self.assertEqual(len(job.samples), 3)
+        self.assertEqual(job.bytesRate(), 1500)
+
+    def test_min_interval(self):
+        self.assertTrue(self.step(0, 0, 0))
+        self.assertFalse(self.step(1, 10, 100))
+        self.assertEqual(self.console.pool.dir.commands, ['status dir', 'status client=TestClient1'])
+        self.assertEqual(self.console.pool.acquired, 1)
+        self.assertEqual(self.console.pool.priorities, [PRIORITY_BULK])
+
+    def test_stall(self):
+        self.step(0, 10, 1000)
+        self.step(10, 10, 1000)
+        self.assertEqual(self.monitor.stalled(), [])
+        self.step(10, 10, 1000)
+        self.assertEqual(sorted(job.id for job in self.monitor.stalled()), [12, 13])
+        self.step(10, 20, 2000)
+        self.assertEqual([job.id for job in self.monitor.stalled()], [13])
+
+    def test_admission(self):
+        # sampling session counts against max_concurrency of the console scheduler
+        scheduler = BCommandScheduler(max_concurrency=1, default_timeout=0.05)
+        self.console.pool = BSessionPool(BSocketWallet('password'), scheduler=scheduler)
+        with scheduler.admit():
+            with self.assertRaises(BSchedulerTimeoutError):
+                self.monitor.sample()
+        self.assertEqual(scheduler.metrics.as_dict()['bulk']['timeouts'], 1)
+
+    def test_single_sample(self):
+        job = JobThroughput(1)
+        job.add(0, 100, 1)
+        self.assertIsNone(job.bytesRate())
+        self.assertIsNone(job.eta(1000))
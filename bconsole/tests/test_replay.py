@@ -0,0 +1,107 @@
+
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from bconsole.bconsole import BSocket, BSocketConfig, BSocketWallet
+from bconsole.replay import BSessionRecorder, iterRecords, replaySession, redact, DIRECTION_SEND, DIRECTION_RECEIVE, DIRECTION_SIGNAL, BReplayDivergedError
+from bconsole.tests.test_bconsole import FakeBaculaServerSocket, getFakeChallengeString, TEST_DIR_HOST, TEST_DIR_PORT, DIR_TEST_PASSWORD, TEST_VERSION_ANSWER
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 0.5
+        return self.now
+
+
+@patch.object(BSocket, '_BSocket__getChallengeString', getFakeChallengeString)
+@patch('socket.socket', new=FakeBaculaServerSocket)
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.bcrp')
+        os.close(fd)
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def record(self, *commands):
+        with BSessionRecorder(self.path, clock=FakeClock()) as recorder:
+            config = BSocketConfig(recorder=recorder)
+            with BSocket(BSocketWallet(DIR_TEST_PASSWORD, TEST_DIR_HOST, TEST_DIR_PORT), config=config) as dir:
+                return [dir.cmd(command) for command in commands]
+
+    def test_recording(self):
+        self.assertEqual(self.record('version'), [TEST_VERSION_ANSWER])
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        records = list(iterRecords(data))
+        self.assertEqual(
+            [(record.direction, record.session) for record in records],
+            [(DIRECTION_SEND, 1), (DIRECTION_RECEIVE, 1), (DIRECTION_SIGNAL, 1), (DIRECTION_SEND, 1)]
+        )
+        self.assertEqual(bytes(records[1].payload).decode('utf8'), TEST_VERSION_ANSWER)
+        self.assertEqual(records[2].signal, -1)
+        self.assertEqual(bytes(records[3].payload), b'quit')
+        # authentication isn't recorded
+        self.assertNotIn(b'auth', data)
+        self.assertNotIn(b'cram-md5', data)
+
+    def test_large_session_ids(self):
+        with BSessionRecorder(self.path) as recorder:
+            recorder.record(70000, DIRECTION_SEND, b'version')
+            recorder.record(70000, DIRECTION_RECEIVE, TEST_VERSION_ANSWER.encode('utf8'))
+            recorder.record(70000, DIRECTION_SIGNAL, signal=-1)
+        with replaySession(self.path, session=70000, strict=True) as dir:
+            self.assertEqual(dir.cmd('version'), TEST_VERSION_ANSWER)
+
+    def test_recorder_errors(self):
+        with BSessionRecorder(self.path) as recorder:
+            config = BSocketConfig(recorder=recorder)
+            with BSocket(BSocketWallet(DIR_TEST_PASSWORD, TEST_DIR_HOST, TEST_DIR_PORT), config=config) as dir:
+                # e.g. the disk is full, the command still gets its answer
+                with patch.object(BSessionRecorder, 'record', side_effect=OSError("No space left on device")), \
+                     self.assertLogs('BSocket', 'WARNING'):
+                    self.assertEqual(dir.cmd('version'), TEST_VERSION_ANSWER)
+
+    def test_redaction(self):
+        self.assertEqual(redact(b'label storage=File password="a b" pool=Default'), b'label storage=File password=*** pool=Default')
+        self.assertEqual(redact(b'setdebug level=100 key=abc'), b'setdebug level=100 key=***')
+
+    def test_replay(self):
+        answers = self.record('version', 'list jobs client=TestClient1')
+        with replaySession(self.path, strict=True) as dir:
+            self.assertEqual([dir.cmd('version'), dir.cmd('list jobs client=TestClient1')], answers)
+
+    def test_replay_signals(self):
+        with BSessionRecorder(self.path) as recorder:
+            recorder.record(7, DIRECTION_SEND, b'.jobs')
+            recorder.record(7, DIRECTION_RECEIVE, b'BackupJob\n')
+            recorder.record(7, DIRECTION_SIGNAL, signal=-1)
+            recorder.record(7, DIRECTION_SEND, b'.pools')
+            recorder.record(7, DIRECTION_RECEIVE, b'Default\n')
+            recorder.record(7, DIRECTION_RECEIVE, b'Scratch\n')
+            recorder.record(7, DIRECTION_SIGNAL, signal=-17)
+            recorder.record(7, DIRECTION_SIGNAL, signal=-1)
+        with replaySession(self.path, session=7, strict=True) as dir:
+            self.assertEqual(dir.cmd('.jobs'), 'BackupJob\n')
+            self.assertEqual(dir.cmd('.pools'), 'Default\nScratch\n')
+
+    def test_replay_diverged(self):
+        self.record('version')
+        with replaySession(self.path, strict=True) as dir:
+            with self.assertRaises(BReplayDivergedError):
+                dir.cmd('status dir')
+        with replaySession(self.path) as dir:
+            self.assertEqual(dir.cmd('status dir'), TEST_VERSION_ANSWER)
+
+    def test_replay_speed(self):
+        self.record('version')
+        start = time.monotonic()
+        with replaySession(self.path, speed=5.0) as dir:
+            dir.cmd('version')
+        # the answer was recorded 0.5s after the command
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
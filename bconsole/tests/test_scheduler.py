@@ -0,0 +1,98 @@
+
+import unittest
+import threading
+import time
+from bconsole.scheduler import (BCommandScheduler, TokenBucket, BSchedulerQueueFullError, BSchedulerTimeoutError,
+    PRIORITY_INTERACTIVE, PRIORITY_RESTORE_CONTROL, PRIORITY_BULK)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestBCommandScheduler(unittest.TestCase):
+    def waitQueued(self, scheduler, count):
+        for _ in range(200):
+            if scheduler.queued() == count:
+                return
+            time.sleep(0.01)
+        self.fail("commands weren't queued")
+
+    def test_priority_order(self):
+        scheduler = BCommandScheduler(max_concurrency=1)
+        order = []
+
+        def worker(priority, name):
+            with scheduler.admit(priority):
+                order.append(name)
+
+        with scheduler.admit(PRIORITY_INTERACTIVE):
+            threads = []
+            for priority, name in ((PRIORITY_BULK, 'bulk1'), (PRIORITY_RESTORE_CONTROL, 'restore'), (PRIORITY_BULK, 'bulk2'), (PRIORITY_INTERACTIVE, 'interactive')):
+                thread = threading.Thread(target=worker, args=(priority, name))
+                thread.start()
+                threads.append(thread)
+                self.waitQueued(scheduler, len(threads))
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order, ['interactive', 'restore', 'bulk1', 'bulk2'])
+        metrics = scheduler.metrics.as_dict()
+        self.assertEqual(metrics['bulk']['admitted'], 2)
+        self.assertEqual(metrics['interactive']['admitted'], 2)
+
+    def test_queue_full(self):
+        scheduler = BCommandScheduler(max_concurrency=1, queue_size=1)
+
+        def worker():
+            with scheduler.admit(PRIORITY_BULK):
+                pass
+
+        with scheduler.admit():
+            thread = threading.Thread(target=worker)
+            thread.start()
+            self.waitQueued(scheduler, 1)
+            with self.assertRaises(BSchedulerQueueFullError):
+                with scheduler.admit(PRIORITY_BULK):
+                    pass
+            # other classes have their own queues
+            with self.assertRaises(BSchedulerTimeoutError):
+                with scheduler.admit(PRIORITY_INTERACTIVE, timeout=0.01):
+                    pass
+        thread.join()
+        self.assertEqual(scheduler.active, 0)
+        self.assertEqual(scheduler.metrics.as_dict()['bulk']['rejected'], 1)
+        self.assertEqual(scheduler.metrics.as_dict()['interactive']['timeouts'], 1)
+
+    def test_deadline(self):
+        scheduler = BCommandScheduler(max_concurrency=1, default_timeout=0.05)
+        with scheduler.admit():
+            start = time.monotonic()
+            with self.assertRaises(BSchedulerTimeoutError):
+                with scheduler.admit():
+                    pass
+            self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        self.assertEqual(scheduler.queued(), 0)
+        with scheduler.admit():
+            self.assertEqual(scheduler.active, 1)
+        self.assertEqual(scheduler.active, 0)
+
+    def test_token_bucket(self):
+        clock = FakeClock()
+        bucket = TokenBucket(2, burst=2, clock=clock)
+        self.assertEqual(bucket.take(), 0)
+        self.assertEqual(bucket.take(), 0)
+        self.assertEqual(bucket.take(), 0.5)
+        clock.now += 0.5
+        self.assertEqual(bucket.take(), 0)
+
+    def test_rate_limit(self):
+        scheduler = BCommandScheduler(max_concurrency=10, rate=20, burst=1)
+        start = time.monotonic()
+        for _ in range(3):
+            with scheduler.admit():
+                pass
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
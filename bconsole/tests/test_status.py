@@ -0,0 +1,143 @@
+
+import unittest
+from datetime import datetime
+from bconsole.status import ClientStatusParser, StorageStatusParser, DirectorStatusParser, parseSize
+
+CLIENT_STATUS_OUT = '''Connecting to Client TestClient1 at 192.168.0.10:9102
+
+TestClient1-fd Version: 9.4.2 (04 February 2019)  x86_64-pc-linux-gnu redhat
+Daemon started 05-Feb-19 10:00. Jobs: run=12 running=1.
+ Heap: heap=135,168 smbytes=1,234 max_bytes=2,345 bufs=12 max_bufs=34
+ Sizes: boffset_t=8 size_t=8 debug=0 trace=0 mode=0,0 bwlimit=0kB/s
+
+Running Jobs:
+JobId 12 Job BackupClient1.2019-02-05_10.00.00_03 is running.
+    Full Backup Job started: 05-Feb-19 10:00
+    Files=1,234 Bytes=123,456,789 AveBytes/sec=1,234,567 LastBytes/sec=2,345,678 Errors=0
+    Bwlimit=0 ReadBytes=123,456,789
+    Files: Examined=1,234 Backed up=1,234
+    Processing file: /usr/lib/libfoo.so
+    SDReadSeqNo=6 fd=5 SDtls=0
+Director connected at: 05-Feb-19 10:05
+====
+
+Terminated Jobs:
+ JobId  Level    Files      Bytes   Status   Finished        Name
+===================================================================
+     1  Full         12    1.234 M  OK       04-Feb-19 10:00 BackupClient1
+     2  Incr          0         0   Error    04-Feb-19 11:00 BackupClient1
+     3                5     81,788  OK -- with warnings 04-Feb-19 12:00 RestoreJob
+====
+'''
+
+CLIENT_STATUS_ERROR_OUT = '''Connecting to Client TestClient2 at 192.168.0.11:9102
+Failed to connect to Client TestClient2.
+====
+'''
+
+STORAGE_STATUS_OUT = '''Connecting to Storage daemon File1 at 192.168.0.20:9103
+
+dev-sd Version: 9.4.2 (04 February 2019) x86_64-pc-linux-gnu redhat
+Daemon started 05-Feb-19 10:00. Jobs: run=1, running=1.
+
+Running Jobs:
+Writing: Full Backup job BackupClient1 JobId=12 Volume="Vol-0001"
+    pool="File" device="FileChgr1-Dev1" (/tmp)
+    spooling=0 despooling=0 despool_wait=0
+    Files=1,234 Bytes=123,456,789 AveBytes/sec=1,234,567 LastBytes/sec=2,345,678
+    FDReadSeqNo=12 in_msg=34 out_msg=5 fd=6
+====
+
+Terminated Jobs:
+ JobId  Level    Files      Bytes   Status   Finished        Name
+===================================================================
+     1  Full         12    1.234 G  OK       04-Feb-19 10:00 BackupClient1
+====
+'''
+
+DIRECTOR_STATUS_OUT = '''dev-dir Version: 7.4.7 (16 March 2017) x86_64-pc-linux-gnu redhat
+Daemon started 05-Feb-19 10:00, conf reloaded 05-Feb-2019 10:00:00
+ Jobs: run=1, running=1 mode=0,0
+ Heap: heap=1,234 smbytes=2,345 max_bytes=3,456 bufs=12 max_bufs=34
+
+Scheduled Jobs:
+Level          Type     Pri  Scheduled          Job Name           Volume
+===================================================================================
+Incremental    Backup    10  06-Feb-19 23:05    BackupClient1      Vol-0001
+Full           Backup    11  07-Feb-19 23:10    BackupCatalog
+====
+
+Running Jobs:
+Console connected at 05-Feb-19 10:05
+ JobId  Type Level     Files     Bytes  Name              Status
+======================================================================
+    12  Back Full      1,234    123.4 M BackupClient1     is running
+====
+
+Terminated Jobs:
+ JobId  Level    Files      Bytes   Status   Finished        Name
+===================================================================
+     1  Full         12    1.234 M  OK       04-Feb-19 10:00 BackupClient1
+====
+'''
+
+
+class TestStatusParsers(unittest.TestCase):
+    def parse(self, parser, text, chunk_size=None):
+        if chunk_size is None:
+            parser.feed(text)
+        else:
+            for i in range(0, len(text), chunk_size):
+                parser.feed(text[i:i + chunk_size])
+        return parser.close()
+
+    def test_size(self):
+        self.assertEqual(parseSize('81,788'), 81788)
+        self.assertEqual(parseSize('1.234 M'), 1234000)
+        self.assertEqual(parseSize('0'), 0)
+
+    def test_client_status(self):
+        status = self.parse(ClientStatusParser(), CLIENT_STATUS_OUT)
+        self.assertTrue(status.isRunning())
+        self.assertEqual(status.name, 'TestClient1-fd')
+        self.assertEqual(status.version, '9.4.2')
+        self.assertEqual(status.started, datetime(2019, 2, 5, 10, 0))
+        self.assertEqual((status.jobsRun, status.jobsRunning), (12, 1))
+        self.assertEqual(len(status.running), 1)
+        job = status.running[0]
+        self.assertEqual((job.id, job.level, job.type), (12, 'Full', 'Backup'))
+        self.assertEqual((job.files, job.bytes, job.rate, job.lastrate, job.errors), (1234, 123456789, 1234567, 2345678, 0))
+        self.assertEqual(job.processing, '/usr/lib/libfoo.so')
+        self.assertEqual([j.id for j in status.terminated], [1, 2, 3])
+        self.assertEqual(status.terminated[0].bytes, 1234000)
+        self.assertFalse(status.terminated[1].isSuccess())
+        self.assertEqual(status.terminated[2].level, None)
+        self.assertEqual(status.terminated[2].status, 'OK -- with warnings')
+
+    def test_incremental_feed(self):
+        self.assertEqual(
+            self.parse(ClientStatusParser(), CLIENT_STATUS_OUT).as_dict(),
+            self.parse(ClientStatusParser(), CLIENT_STATUS_OUT, chunk_size=7).as_dict()
+        )
+
+    def test_client_connection_error(self):
+        status = self.parse(ClientStatusParser(), CLIENT_STATUS_ERROR_OUT)
+        self.assertFalse(status.isRunning())
+        self.assertFalse(status.connected)
+
+    def test_storage_status(self):
+        status = self.parse(StorageStatusParser(), STORAGE_STATUS_OUT)
+        self.assertEqual(status.version, '9.4.2')
+        job = status.running[0]
+        self.assertEqual((job.id, job.name, job.status, job.volume, job.device), (12, 'BackupClient1', 'Writing', 'Vol-0001', 'FileChgr1-Dev1'))
+        self.assertEqual((job.bytes, job.rate), (123456789, 1234567))
+        self.assertEqual(status.terminated[0].bytes, 1234000000)
+
+    def test_director_status(self):
+        status = self.parse(DirectorStatusParser(), DIRECTOR_STATUS_OUT)
+        self.assertEqual(status.version, '7.4.7')
+        self.assertEqual((status.jobsRun, status.jobsRunning), (1, 1))
+        self.assertEqual([(j.name, j.priority, j.volume) for j in status.scheduled], [('BackupClient1', 10, 'Vol-0001'), ('BackupCatalog', 11, None)])
+        job = status.running[0]
+        self.assertEqual((job.id, job.type, job.level, job.files, job.bytes, job.name, job.status), (12, 'Back', 'Full', 1234, 123400000, 'BackupClient1', 'is running'))
+        self.assertEqual(len(status.terminated), 1)
@@ -0,0 +1,57 @@
+
+import unittest
+from datetime import datetime
+from bconsole.table import BTableParser, JOB_COLUMN_CONVERTERS, parseCatalogDate
+
+LIST_JOBS_OUT = '''Automatically selected Catalog: DefaultCatalog
+Using Catalog "DefaultCatalog"
++-------+------------+---------------------+------+-------+----------+-------------+-----------+
+| jobid | name       | starttime           | type | level | jobfiles | jobbytes    | jobstatus |
++-------+------------+---------------------+------+-------+----------+-------------+-----------+
+|     5 | RestoreJob | 2018-05-05 08:13:07 | R    |       |        5 | 843,432,234 | f         |
+|     6 | Backup|Job |                     | B    | F     |        0 |           0 | C         |
++-------+------------+---------------------+------+-------+----------+-------------+-----------+
+You have messages.
++---------+-----------+
+| mediaid | volumename|
++---------+-----------+
+|       1 | Vol-0001  |
++---------+-----------+
+'''
+
+
+class TestBTableParser(unittest.TestCase):
+    def test_tables(self):
+        jobs, volumes = BTableParser().parse(LIST_JOBS_OUT)
+        self.assertEqual(jobs.columns, ['jobid', 'name', 'starttime', 'type', 'level', 'jobfiles', 'jobbytes', 'jobstatus'])
+        self.assertEqual(len(jobs), 2)
+        # empty cells and "|" inside values don't shift columns
+        self.assertEqual(jobs.records()[0]['level'], '')
+        self.assertEqual(jobs.records()[0]['jobfiles'], '5')
+        self.assertEqual(jobs.records()[1]['name'], 'Backup|Job')
+        self.assertEqual(jobs.records()[1]['jobstatus'], 'C')
+        self.assertEqual(volumes.records(), [{'mediaid': '1', 'volumename': 'Vol-0001'}])
+
+    def test_converters(self):
+        jobs = BTableParser(JOB_COLUMN_CONVERTERS).parse(LIST_JOBS_OUT)[0]
+        self.assertEqual(jobs.column('jobid'), [5, 6])
+        self.assertEqual(jobs.column('jobbytes'), [843432234, 0])
+        self.assertEqual(jobs.column('starttime'), [datetime(2018, 5, 5, 8, 13, 7), None])
+
+    def test_zero_date(self):
+        self.assertIsNone(parseCatalogDate('0000-00-00 00:00:00'))
+        self.assertIsNone(parseCatalogDate('0000-00-00'))
+        jobs = BTableParser(JOB_COLUMN_CONVERTERS).parse(LIST_JOBS_OUT.replace('2018-05-05 08:13:07', '0000-00-00 00:00:00'))[0]
+        self.assertEqual(jobs.column('starttime'), [None, None])
+
+    def test_incremental_feed(self):
+        parser = BTableParser()
+        for i in range(0, len(LIST_JOBS_OUT), 5):
+            parser.feed(LIST_JOBS_OUT[i:i + 5])
+        tables = parser.close()
+        self.assertEqual([t.records() for t in tables], [t.records() for t in BTableParser().parse(LIST_JOBS_OUT)])
+
+    def test_multibyte_row(self):
+        # the director pads cells by bytes, so the row is shorter than the border in characters
+        text = '+------+--------+\n| id   | name   |\n+------+--------+\n|    1 | тест |\n+------+--------+\n'
+        self.assertEqual(BTableParser().parse(text)[0].records(), [{'id': '1', 'name': 'тест'}])
@@ -0,0 +1,88 @@
+
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+from bconsole.bconsole import BSocket, BConsole
+from bconsole.volumes import VolumeListParser, VolumeProgressParser, formatSlots
+from bconsole.tests.test_bconsole import (FakeBaculaServerSocket, getFakeChallengeString, TEST_DIR_HOST, TEST_DIR_PORT, DIR_TEST_PASSWORD,
+                                          TEST_USER_AGENT, CMD_LIST_VOLUMES_OUT, CMD_UPDATE_SLOTS_OUT)
+
+
+class TestVolumeParsers(unittest.TestCase):
+    def parse(self, chunk_size, pool=None):
+        parser = VolumeListParser(pool)
+        text = CMD_LIST_VOLUMES_OUT.decode('utf8')
+        for i in range(0, len(text), chunk_size):
+            parser.feed(text[i:i + chunk_size])
+        return parser.close()
+
+    def test_slots(self):
+        self.assertEqual(formatSlots([7, 1, 3, 2]), '1-3,7')
+        self.assertEqual(formatSlots('1-10'), '1-10')
+
+    def test_progress(self):
+        parser = VolumeProgressParser()
+        text = CMD_UPDATE_SLOTS_OUT.decode('utf8')
+        events = parser.feed(text[:150]) + parser.feed(text[150:]) + parser.close()
+        self.assertEqual(
+            [(event.kind, event.volume, event.slot) for event in events],
+            [('slots', None, 24), ('uptodate', 'A00001L6', None), ('updated', 'A00002L6', 2), ('notfound', 'A00009L6', 3)]
+        )
+
+    def test_inventory(self):
+        inventory = self.parse(37)
+        self.assertEqual(len(inventory), 4)
+        self.assertEqual(inventory.pools, ['Default', 'Scratch'])
+        self.assertEqual(inventory.records(), self.parse(65536).records())
+        volume = inventory.volume('A00001L6')
+        self.assertEqual((volume['pool'], volume['volbytes'], volume['slot'], volume['inchanger']), ('Default', 2500000000, 1, True))
+        self.assertIsNone(inventory.volume('A00004L6')['lastwritten'])
+        self.assertEqual(inventory.inChangerVolumes(), ['A00001L6', 'A00002L6', 'A00004L6'])
+
+    def test_pool_usage(self):
+        usage = self.parse(4096).poolUsage()
+        self.assertEqual(usage['Default']['volumes'], 3)
+        self.assertEqual(usage['Default']['bytes'], 2500000000 + 64512 + 1000)
+        self.assertEqual(usage['Default']['statuses'], {'Full': 1, 'Append': 1, 'Purged': 1})
+        self.assertEqual(usage['Scratch']['in_changer'], 1)
+
+    def test_recycle_candidates(self):
+        inventory = self.parse(4096)
+        # A00001L6 was written 2017-01-05 with one year retention
+        now = datetime(2018, 5, 5).timestamp()
+        self.assertEqual(inventory.recycleCandidates(now=now), ['A00003L6', 'A00001L6'])
+        self.assertEqual(inventory.recycleCandidates(now=datetime(2017, 6, 1).timestamp()), ['A00003L6'])
+        self.assertEqual(inventory.recycleCandidates(now=now, in_changer=True), ['A00001L6'])
+        self.assertEqual(inventory.recycleCandidates(pool='Scratch', now=now), [])
+
+
+@patch.object(BSocket, '_BSocket__getChallengeString', getFakeChallengeString)
+@patch('socket.socket', new=FakeBaculaServerSocket)
+class TestVolumeOperations(unittest.TestCase):
+    def setUp(self):
+        self.console = BConsole(TEST_DIR_HOST, TEST_DIR_PORT, DIR_TEST_PASSWORD, TEST_USER_AGENT)
+
+    def tearDown(self):
+        self.console.close()
+
+    def test_list_volumes(self):
+        inventory = self.console.listVolumes()
+        self.assertEqual(inventory.names, ['A00001L6', 'A00002L6', 'A00003L6', 'A00004L6'])
+
+    def test_update_slots(self):
+        events = list(self.console.updateSlots('Autochanger', slots=[1, 2, 3]))
+        self.assertEqual([event.kind for event in events], ['slots', 'uptodate', 'updated', 'notfound'])
+
+    def test_label_barcodes(self):
+        events = self.console.labelBarcodes('Autochanger', 'Default', slots='4-5')
+        self.assertEqual(
+            [(event.kind, event.volume, event.answer) for event in events],
+            [('prompt', None, 'yes'), ('prompt', None, '1'), ('labeling', 'A00004L6', None), ('labeled', 'A00004L6', None),
+             ('labeling', 'A00005L6', None), ('failed', 'A00005L6', None)]
+        )
+
+    def test_unknown_pool(self):
+        with self.assertRaises(RuntimeError):
+            list(self.console.labelBarcodes('Autochanger', 'Archive'))
+        # the session in the middle of the dialog isn't reused
+        self.assertEqual(self.console.getVersion()['director_version'], '7.4.7')
@@ -0,0 +1,264 @@
+# Autochanger progress events and columnar volume inventory ("update slots", "label barcodes", "list volumes")
+
+import re
+import sys
+import time
+from array import array
+from .status import parseNumber
+from .table import BTableParser, parseCatalogDate
+
+# volume statuses which keep data, they can be recycled after the retention period
+RECYCLABLE_STATUSES = ('Full', 'Used')
+
+
+def formatSlots(slots):
+    '''[1, 2, 3, 7] -> "1-3,7", strings are passed as is'''
+    if isinstance(slots, str):
+        return slots
+    ranges = []
+    for slot in sorted(set(slots)):
+        if ranges and ranges[-1][1] == slot - 1:
+            ranges[-1][1] = slot
+        else:
+            ranges.append([slot, slot])
+    return ','.join(str(start) if start == end else "{}-{}".format(start, end) for start, end in ranges)
+
+
+class VolumeEvent:
+    '''
+        kind - "slots" (slot is the number of slots), "updated", "uptodate", "notfound", "labeling",
+               "labeled", "exists", "failed" or "prompt" (message is the prompt, answer is what was sent)
+    '''
+    def __init__(self, kind, volume=None, slot=None, message=None, answer=None):
+        self.kind = kind
+        self.volume = volume
+        self.slot = slot
+        self.message = message
+        self.answer = answer
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+    def __repr__(self):
+        return "VolumeEvent({kind!r}, volume={volume!r}, slot={slot!r})".format(**self.__dict__)
+
+
+class VolumeProgressParser:
+    '''
+        Incremental parser of autochanger dialogs, feed() returns events of the complete lines of the chunk
+    '''
+    EVENTS = (
+        ('slots', re.compile(r'Device "(?P<device>.+?)" has (?P<slot>\d+) slots')),
+        ('updated', re.compile(r'Catalog record for Volume "(?P<volume>.+?)" updated to reference slot (?P<slot>\d+)')),
+        ('uptodate', re.compile(r'Catalog record for Volume "(?P<volume>.+?)" is up to date')),
+        ('notfound', re.compile(r'Volume "(?P<volume>.+?)" not found in catalog\. Slot=(?P<slot>\d+)')),
+        ('labeling', re.compile(r'Sending label command for Volume "(?P<volume>.+?)" Slot (?P<slot>\d+)')),
+        ('labeled', re.compile(r'Catalog record for Volume "(?P<volume>.+?)", Slot (?P<slot>\d+) successfully created')),
+        ('exists', re.compile(r'Media record for Volume "(?P<volume>.+?)" already exists')),
+        ('failed', re.compile(r'Label command failed for Volume "?(?P<volume>[^"\s]+?)"?\.?\s*$')),
+    )
+
+    def __init__(self):
+        self.counts = {}
+        self.__tail = ''
+
+    def feed(self, chunk):
+        lines = (self.__tail + chunk).split('\n')
+        self.__tail = lines.pop()
+        return self.__parseLines(lines)
+
+    def close(self):
+        lines = [self.__tail] if self.__tail else []
+        self.__tail = ''
+        return self.__parseLines(lines)
+
+    def __parseLines(self, lines):
+        events = []
+        for line in lines:
+            for kind, regexp in self.EVENTS:
+                mres = regexp.search(line)
+                if mres is not None:
+                    groups = mres.groupdict()
+                    slot = groups.get('slot')
+                    events.append(VolumeEvent(kind, groups.get('volume'), int(slot) if slot is not None else None, line.strip()))
+                    self.counts[kind] = self.counts.get(kind, 0) + 1
+                    break
+        return events
+
+
+class VolumeInventory:
+    '''
+        Columnar inventory of volumes: every attribute is kept in its own array, pool, status and media
+        type names are stored once. Totals per pool and recycle candidates are computed over the arrays
+        without building a record per volume.
+        lastWritten - unix time, 0 for never written volumes
+    '''
+    def __init__(self):
+        self.pools = []
+        self.names = []
+        self.mediaIds = array('q')
+        self.poolIds = array('l')
+        self.statuses = []
+        self.mediaTypes = []
+        self.enabled = array('b')
+        self.bytes = array('q')
+        self.files = array('q')
+        self.retention = array('q')
+        self.recycle = array('b')
+        self.slots = array('l')
+        self.inChanger = array('b')
+        self.lastWritten = array('d')
+        self.__poolIds = {}
+        self.__index = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __poolId(self, pool):
+        pool_id = self.__poolIds.get(pool)
+        if pool_id is None:
+            pool_id = self.__poolIds[pool] = len(self.pools)
+            self.pools.append(pool)
+        return pool_id
+
+    @staticmethod
+    def __number(value):
+        return parseNumber(value) if value else 0
+
+    @staticmethod
+    def __timestamp(value):
+        date = parseCatalogDate(value) if value else None
+        return date.timestamp() if date is not None else 0.0
+
+    def add(self, record, pool=None):
+        '''adds volume from "list volumes" record (dict of column name -> text)'''
+        number = self.__number
+        name = record['volumename']
+        self.__index[name] = len(self.names)
+        self.names.append(name)
+        self.mediaIds.append(number(record.get('mediaid')))
+        self.poolIds.append(self.__poolId(pool))
+        self.statuses.append(sys.intern(record.get('volstatus', '')))
+        self.mediaTypes.append(sys.intern(record.get('mediatype', '')))
+        self.enabled.append(record.get('enabled', '1') in ('1', 'yes', 'Enabled'))
+        self.bytes.append(number(record.get('volbytes')))
+        self.files.append(number(record.get('volfiles')))
+        self.retention.append(number(record.get('volretention')))
+        self.recycle.append(record.get('recycle', '0') in ('1', 'yes'))
+        self.slots.append(number(record.get('slot')))
+        self.inChanger.append(record.get('inchanger', '0') in ('1', 'yes'))
+        self.lastWritten.append(self.__timestamp(record.get('lastwritten')))
+
+    def row(self, index):
+        return {
+            'mediaid': self.mediaIds[index],
+            'volumename': self.names[index],
+            'pool': self.pools[self.poolIds[index]],
+            'volstatus': self.statuses[index],
+            'enabled': bool(self.enabled[index]),
+            'volbytes': self.bytes[index],
+            'volfiles': self.files[index],
+            'volretention': self.retention[index],
+            'recycle': bool(self.recycle[index]),
+            'slot': self.slots[index],
+            'inchanger': bool(self.inChanger[index]),
+            'mediatype': self.mediaTypes[index],
+            'lastwritten': self.lastWritten[index] or None
+        }
+
+    def volume(self, name):
+        index = self.__index.get(name)
+        return self.row(index) if index is not None else None
+
+    def records(self):
+        return [self.row(index) for index in range(len(self.names))]
+
+    def inChangerVolumes(self):
+        return [name for name, in_changer in zip(self.names, self.inChanger) if in_changer]
+
+    def poolUsage(self):
+        '''returns {pool: {"volumes", "bytes", "files", "in_changer", "statuses": {status: count}}}'''
+        usage = {pool: {'volumes': 0, 'bytes': 0, 'files': 0, 'in_changer': 0, 'statuses': {}} for pool in self.pools}
+        pools = self.pools
+        for pool_id, status, size, files, in_changer in zip(self.poolIds, self.statuses, self.bytes, self.files, self.inChanger):
+            totals = usage[pools[pool_id]]
+            totals['volumes'] += 1
+            totals['bytes'] += size
+            totals['files'] += files
+            totals['in_changer'] += in_changer
+            totals['statuses'][status] = totals['statuses'].get(status, 0) + 1
+        return usage
+
+    def recycleCandidates(self, pool=None, now=None, in_changer=False):
+        '''
+            returns names of enabled volumes with recycle flag which can be reused: purged ones first,
+            then full/used volumes with expired retention; older volumes first in both groups
+        '''
+        if now is None:
+            now = time.time()
+        pool_id = self.__poolIds.get(pool, -1) if pool is not None else None
+        candidates = []
+        for index, status in enumerate(self.statuses):
+            if not self.enabled[index] or not self.recycle[index]:
+                continue
+            if pool_id is not None and self.poolIds[index] != pool_id:
+                continue
+            if in_changer and not self.inChanger[index]:
+                continue
+            last_written = self.lastWritten[index]
+            if status == 'Purged':
+                candidates.append((0, last_written, self.names[index]))
+            elif status in RECYCLABLE_STATUSES and last_written and last_written + self.retention[index] <= now:
+                candidates.append((1, last_written, self.names[index]))
+        candidates.sort()
+        return [name for _, _, name in candidates]
+
+
+class VolumeListParser:
+    '''
+        Incremental parser of "list volumes" output into VolumeInventory. Rows are moved to the
+        inventory as soon as they are parsed. "Pool: X" lines before the tables set the pool of
+        the following rows, pool is used for output without them ("list volumes pool=X").
+    '''
+    RE_POOL = re.compile(r'^Pool: (.+?)\s*$')
+
+    def __init__(self, pool=None):
+        self.pool = pool
+        self.inventory = VolumeInventory()
+        self.__tables = BTableParser()
+        self.__tail = ''
+
+    def feed(self, chunk):
+        lines = (self.__tail + chunk).split('\n')
+        self.__tail = lines.pop()
+        self.__parseLines(lines)
+
+    def close(self):
+        if self.__tail:
+            self.__parseLines([self.__tail])
+            self.__tail = ''
+        self.__tables.close()
+        self.__collect()
+        return self.inventory
+
+    def __parseLines(self, lines):
+        start = 0
+        for i, line in enumerate(lines):
+            mres = self.RE_POOL.match(line)
+            if mres is not None:
+                self.__feedTables(lines[start:i])
+                self.pool = mres.group(1)
+                start = i + 1
+        self.__feedTables(lines[start:])
+
+    def __feedTables(self, lines):
+        if lines:
+            self.__tables.feed('\n'.join(lines) + '\n')
+            self.__collect()
+
+    def __collect(self):
+        for table in self.__tables.tables:
+            columns = table.columns
+            for row in table.rows:
+                self.inventory.add(dict(zip(columns, row)), self.pool)
+            del table.rows[:]
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# Compares bytes on the wire and receive CPU cost of plain and compressed director frames
+# usage: python benchmarks/bench_compression.py [rows]
+
+import os
+import sys
+import time
+import zlib
+from struct import pack
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bconsole.bconsole import BFrameReader, BNET_COMPRESSED, HAS_LZ4
+
+ROW = "| {:>7,} | BackupClient{:<5} | 2018-05-05 08:13:07 | B    | F     | {:>8,} | {:>18,} | T         |\n"
+FRAME_SIZE = 65536
+
+
+class Stream:
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.position = 0
+
+    def recv_into(self, view):
+        chunk = self.data[self.position:self.position + min(len(view), 65536)]
+        view[:len(chunk)] = chunk
+        self.position += len(chunk)
+        return len(chunk)
+
+
+def makeFrames(text, compress=None):
+    data = bytearray()
+    for i in range(0, len(text), FRAME_SIZE):
+        payload = text[i:i + FRAME_SIZE]
+        if compress is None:
+            data += pack("!i", len(payload)) + payload
+        else:
+            payload = compress(payload)
+            data += pack("!i", len(payload) | BNET_COMPRESSED) + payload
+    data += pack("!i", -1)
+    return bytes(data)
+
+
+def receive(data, compression):
+    reader = BFrameReader(Stream(data).recv_into, compression=compression)
+    start = time.perf_counter()
+    while reader.read() is not None:
+        pass
+    return time.perf_counter() - start
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    text = ''.join(ROW.format(i, i % 1000, i * 3, i * 1000) for i in range(rows)).encode('utf8')
+    codecs = [('plain', None, None), ('zlib', 'zlib', lambda payload: zlib.compress(payload, 1))]
+    if HAS_LZ4:
+        import lz4.block
+        codecs.append(('lz4', 'lz4', lambda payload: lz4.block.compress(payload, store_size=False)))
+    else:
+        print("lz4 package isn't installed, lz4 is skipped")
+    print("payload: {:.1f} MB in {} KB frames".format(len(text) / 1024 / 1024, FRAME_SIZE // 1024))
+    print("{:<8} {:>12} {:>8} {:>12}".format('codec', 'wire MB', 'ratio', 'receive s'))
+    for name, compression, compress in codecs:
+        data = makeFrames(text, compress)
+        elapsed = min(receive(data, compression) for _ in range(3))
+        print("{:<8} {:>12.2f} {:>8.2f} {:>12.3f}".format(name, len(data) / 1024 / 1024, len(text) / len(data), elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# Replays a recorded director session as fast as possible and reports per-command time
+# usage: python benchmarks/bench_replay.py [recording.bcrp] [rounds]
+# without a recording a synthetic "list jobs" session is generated
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bconsole.replay import BSessionRecorder, iterRecords, replaySession, DIRECTION_SEND, DIRECTION_RECEIVE, DIRECTION_SIGNAL
+from bconsole.table import BTableParser, JOB_COLUMN_CONVERTERS
+
+ROW = "| {:>7,} | BackupClient{:<5} | 2018-05-05 08:13:07 | B    | F     | {:>8,} | {:>18,} | T         |\n"
+HEADER = (
+    "+---------+-------------------+---------------------+------+-------+----------+--------------------+-----------+\n"
+    "| jobid   | name              | starttime           | type | level | jobfiles | jobbytes           | jobstatus |\n"
+    "+---------+-------------------+---------------------+------+-------+----------+--------------------+-----------+\n"
+)
+
+
+def makeRecording(path, rows=100000, frame_size=65536):
+    text = (HEADER + ''.join(ROW.format(i, i % 1000, i * 3, i * 1000) for i in range(rows)) + HEADER[:112]).encode('utf8')
+    with BSessionRecorder(path) as recorder:
+        recorder.record(1, DIRECTION_SEND, b'list jobs')
+        for i in range(0, len(text), frame_size):
+            recorder.record(1, DIRECTION_RECEIVE, text[i:i + frame_size])
+        recorder.record(1, DIRECTION_SIGNAL, signal=-1)
+
+
+def commands(path):
+    with open(path, 'rb') as f:
+        records = list(iterRecords(f.read()))
+    session = records[0].session if records else None
+    return [bytes(record.payload).decode('utf8') for record in records if record.session == session and record.direction == DIRECTION_SEND]
+
+
+def replay(path, cmds):
+    timings = []
+    with replaySession(path) as dir:
+        for cmd in cmds:
+            start = time.perf_counter()
+            parser = BTableParser(JOB_COLUMN_CONVERTERS)
+            for chunk in dir.iterCmd(cmd):
+                parser.feed(chunk)
+            rows = sum(len(table) for table in parser.close())
+            timings.append((cmd, rows, time.perf_counter() - start))
+    return timings
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else None
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    generated = path is None
+    if generated:
+        fd, path = tempfile.mkstemp(suffix='.bcrp')
+        os.close(fd)
+        makeRecording(path)
+    try:
+        cmds = commands(path)
+        best = {}
+        for _ in range(rounds):
+            for cmd, rows, elapsed in replay(path, cmds):
+                best[cmd] = min(best.get(cmd, (rows, elapsed)), (rows, elapsed), key=lambda item: item[1])
+        print("{:<40} {:>10} {:>10}".format('command', 'rows', 'best s'))
+        for cmd, (rows, elapsed) in best.items():
+            print("{:<40} {:>10} {:>10.3f}".format(cmd[:40], rows, elapsed))
+    finally:
+        if generated:
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
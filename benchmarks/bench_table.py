@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# Compares table parsers on a synthetic "list jobs" answer
+# usage: python benchmarks/bench_table.py [rows]
+
+import os
+import sys
+import time
+from datetime import datetime
+from operator import attrgetter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bconsole.bconsole import JobStatus
+from bconsole.table import BTableParser, JOB_COLUMN_CONVERTERS
+
+HEADER = "| jobid   | name              | starttime           | type | level | jobfiles | jobbytes           | jobstatus |"
+ROW = "| {:>7,} | BackupClient{:<5} | 2018-05-05 08:13:07 | B    | F     | {:>8,} | {:>18,} | T         |"
+
+
+def legacyParseTable(table_text):
+    '''BConsoleCommand._parseTable before the fixed-width parser'''
+    head = []
+    data = []
+    for line in table_text.splitlines():
+        if line.startswith('|'):
+            row_data = [v.rstrip().lstrip() for v in line.split('|') if v != '']
+            if not head:
+                head = row_data
+            else:
+                data.append(dict(zip(head, row_data)))
+    return data
+
+
+def legacyConvert(rows):
+    for row in rows:
+        row['jobid'] = int(row['jobid'].replace(',', ''))
+        row['jobfiles'] = int(row['jobfiles'].replace(',', ''))
+        row['jobbytes'] = int(row['jobbytes'].replace(',', ''))
+    return rows
+
+
+def legacyGetJobs(text):
+    '''BConsole.getJobs over dicts: conversion as in getJobStatus, sort, JobStatus per dict'''
+    jobs = legacyConvert(legacyParseTable(text))
+    for job in jobs:
+        job['starttime'] = datetime.strptime(job['starttime'], "%Y-%m-%d %H:%M:%S")
+    jobs = sorted(jobs, key=lambda job: job['jobid'], reverse=True)
+    return [JobStatus(job) for job in jobs]
+
+
+def getJobs(text):
+    '''BConsole.getJobs: BConsoleCommandJobList tables, JobStatus.fromTable, sort'''
+    jobs = []
+    for table in BTableParser(JOB_COLUMN_CONVERTERS).parse(text):
+        jobs.extend(JobStatus.fromTable(table))
+    jobs.sort(key=attrgetter('id'), reverse=True)
+    return jobs
+
+
+def makeAnswer(rows):
+    border = "+" + "+".join("-" * len(cell) for cell in HEADER.split('|')[1:-1]) + "+"
+    body = "\n".join(ROW.format(i, i % 1000, i * 3, i * 1000) for i in range(rows))
+    return "Using Catalog \"DefaultCatalog\"\n{0}\n{1}\n{0}\n{2}\n{0}\n".format(border, HEADER, body)
+
+
+def bench(name, function, text, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print("{:<40} {:8.3f} s".format(name, best))
+    return best
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    text = makeAnswer(rows)
+    chunks = [text[i:i + 65536] for i in range(0, len(text), 65536)]
+    print("{} rows, {:.1f} MB".format(rows, len(text) / 1024 / 1024))
+
+    def streamed(_):
+        parser = BTableParser()
+        for chunk in chunks:
+            parser.feed(chunk)
+        return parser.close()
+
+    numbers = dict((column, JOB_COLUMN_CONVERTERS[column]) for column in ('jobid', 'jobfiles', 'jobbytes'))
+    legacy = bench("legacy _parseTable (dicts)", legacyParseTable, text)
+    legacy_converted = bench("legacy _parseTable + int conversion", lambda t: legacyConvert(legacyParseTable(t)), text)
+    records = bench("BTableParser records (dicts)", lambda t: BTableParser().parse(t)[0].records(), text)
+    records_converted = bench("BTableParser records + int converters", lambda t: BTableParser(numbers).parse(t)[0].records(), text)
+    rows_time = bench("BTableParser rows (tuples)", lambda t: BTableParser().parse(t), text)
+    bench("BTableParser rows, 64k chunks", streamed, text)
+    bench("BTableParser rows + int converters", lambda t: BTableParser(numbers).parse(t), text)
+    legacy_jobs = bench("legacy getJobs (dicts, strptime)", legacyGetJobs, text)
+    jobs = bench("getJobs (rows, JobStatus.fromTable)", getJobs, text)
+    print("speedup (dicts vs legacy dicts): {:.2f}x".format(legacy / records))
+    print("speedup (dicts + ints vs legacy dicts + ints): {:.2f}x".format(legacy_converted / records_converted))
+    print("tuple rows only (BTable.rows, no dicts) vs legacy dicts: {:.2f}x".format(legacy / rows_time))
+    # getJobs and cancelJobs(client=/status=) are the callers with many rows, they read tuples
+    print("speedup (getJobs vs legacy getJobs): {:.2f}x".format(legacy_jobs / jobs))
+
+
+if __name__ == '__main__':
+    main()
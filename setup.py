@@ -9,6 +9,10 @@ TESTS_REQUIRES = [
     'mock'
 ]
 
+EXTRAS_REQUIRE = {
+    'lz4': ['lz4']
+}
+
 setup(
     name='bconsole',
     version='0.6.13',
@@ -19,6 +23,10 @@ setup(
     license='GPLv3',
     packages=['bconsole'],
     tests_require=TESTS_REQUIRES,
+    extras_require=EXTRAS_REQUIRE,
+    entry_points={
+        'console_scripts': ['pybconsole = bconsole.cli:main']
+    },
     classifiers=CLASSIFIERS,
     zip_safe=False
 )